@@ -0,0 +1,83 @@
+# Purpose: Throughput (MB/s) and memory of streaming GET /books/export, against scraping GET /books eight rows at a time.
+# Run from backend/: python -m books.benchmarks.bench_export [sizes...]   (each size in its own process, on SQLite)
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from decimal import Decimal
+
+GENRES = ["Fantasy", "Sci-Fi", "Mystery", "Non-fiction", "Romance", "Horror", "History", "Poetry"]
+# Paging the whole catalog takes one request per 8 rows, so only small catalogs are paged end to end
+MAX_PAGED = 20_000
+
+def peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def seed(n, seed=7):
+    from books.model import db, Book
+
+    rng = random.Random(seed)
+    # Varied words, so gzip sees text that compresses like real descriptions rather than one repeated phrase
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9))) for _ in range(5000)]
+    db.create_all()
+    for start in range(0, n, 10_000):
+        db.session.execute(Book.__table__.insert(), [
+            {"title": f"Title {i}", "description": " ".join(rng.choices(words, k=rng.randint(40, 160))),
+             "ISBN": f"978{i:010d}", "authors": f"Author {rng.randint(1, 5000)}", "publishers": "Bench Press",
+             "format": "Paperback", "genre": rng.choice(GENRES), "price": Decimal(rng.randint(100, 9999)) / 100,
+             "quantity": rng.randint(0, 40), "url": f"/images/books/{i}.jpg"}
+            for i in range(start + 1, min(start + 10_000, n) + 1)
+        ])
+    db.session.commit()
+
+def measure(n):
+    os.environ["dbURL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'books.db')}"
+    from books.app import app
+
+    with app.app_context():
+        seed(n)
+    client = app.test_client()
+    print(f"\n{n:>9,} books   (peak RSS after seeding {peak_mb():,.0f} MB)")
+
+    for label, url, headers in [
+        ("NDJSON", "/books/export", {}),
+        ("CSV", "/books/export?format=csv", {}),
+        ("NDJSON, gzip", "/books/export", {"Accept-Encoding": "gzip"}),
+        ("CSV, 3 fields", "/books/export?format=csv&fields=title,price", {}),
+    ]:
+        before = peak_mb()
+        start = time.perf_counter()
+        res = client.get(url, headers=headers)
+        # MB/s is of the uncompressed payload; gzip output is unpacked as it arrives to count it
+        unpack = zlib.decompressobj(31) if headers else None
+        sent = size = 0
+        for chunk in res.response:
+            sent += len(chunk)
+            size += len(unpack.decompress(chunk)) if unpack else len(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<16} {size / 2**20:>8,.1f} MB in {elapsed:>6.2f} s   {size / 2**20 / elapsed:>6,.1f} MB/s   "
+              f"{n / elapsed:>9,.0f} rows/s   {sent / 2**20:>7,.1f} MB sent   peak RSS +{peak_mb() - before:,.0f} MB")
+
+    if n <= MAX_PAGED:
+        start = time.perf_counter()
+        page, rows = 1, 0
+        while True:
+            body = client.get(f"/books?page={page}&limit=8").get_json()
+            rows += len(body["data"])
+            if not body["pagination"]["has_more"]:
+                break
+            page += 1
+        elapsed = time.perf_counter() - start
+        print(f"  paging /books    {page:,} requests in {elapsed:>6.2f} s   {rows / elapsed:>9,.0f} rows/s")
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        measure(int(sys.argv[2]))
+    else:
+        for size in [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 500_000]:
+            # A fresh process per size, so peak memory belongs to that catalog
+            subprocess.run([sys.executable, "-m", "books.benchmarks.bench_export", "--child", str(size)], check=True)
@@ -0,0 +1,103 @@
+# Purpose: Build, save/load and query cost of the BM25 full-text index on description-heavy books, against an ILIKE scan.
+# Run from backend/: python -m books.benchmarks.bench_fulltext [sizes...]
+import gc
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from books.fulltext import FullTextIndex
+
+COMMON = ["the", "of", "and", "a", "in", "to", "with", "her", "his", "their", "from", "into"]
+CONSONANTS = "bcdfghjklmnprstvwz"
+VOWELS = "aeiou"
+VOCABULARY = 20_000
+
+def vocabulary(rng):
+    words = set()
+    while len(words) < VOCABULARY:
+        words.add("".join(rng.choice(CONSONANTS if i % 2 == 0 else VOWELS) for i in range(rng.randint(4, 10))))
+    return sorted(words)
+
+def synthetic_books(n, seed=7):
+    """Titles of a few words and 60-200 word descriptions, word frequencies skewed like real text."""
+    rng = random.Random(seed)
+    words = vocabulary(rng)
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+
+    def text(count):
+        picked = rng.choices(words, weights, k=count)
+        return " ".join(rng.choice(COMMON) if rng.random() < 0.3 else word for word in picked)
+
+    for book_id in range(1, n + 1):
+        yield book_id, text(rng.randint(2, 5)).title(), text(2).title(), text(rng.randint(60, 200))
+
+def rss_mb():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * 4096 / 2**20
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def run(n, queries=200):
+    rows = list(synthetic_books(n))
+    gc.collect()
+    before = rss_mb()
+
+    start = time.perf_counter()
+    index = FullTextIndex()
+    index.build(rows)
+    build_s = time.perf_counter() - start
+    gc.collect()
+    memory = rss_mb() - before
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fulltext.idx")
+        start = time.perf_counter()
+        index.save(path, fingerprint=n)
+        save_s = time.perf_counter() - start
+        size = os.path.getsize(path) / 2**20
+        start = time.perf_counter()
+        FullTextIndex().load(path, fingerprint=n)
+        load_s = time.perf_counter() - start
+
+    # Two or three words lifted from a random description, the way someone half-remembers a book
+    rng = random.Random(1)
+    terms = []
+    for _, _, _, description in rng.sample(rows, queries):
+        words = description.split()
+        i = rng.randrange(len(words) - 3)
+        terms.append(" ".join(words[i:i + rng.randint(2, 3)]))
+
+    latencies = []
+    for term in terms:
+        start = time.perf_counter()
+        index.search(term, limit=10)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    for book_id, title, authors, description in rows[:1000]:
+        index.add(book_id, title, authors, description)
+    update_us = (time.perf_counter() - start) * 1000
+
+    # What adding description to the ILIKE filter would cost: a scan over every description
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE Books (book_id INTEGER PRIMARY KEY, title TEXT, authors TEXT, description TEXT)")
+    conn.executemany("INSERT INTO Books VALUES (?, ?, ?, ?)", rows)
+    scans = []
+    for term in terms[:20]:
+        start = time.perf_counter()
+        conn.execute("SELECT book_id FROM Books WHERE description LIKE ? LIMIT 10", (f"%{term}%",)).fetchall()
+        scans.append((time.perf_counter() - start) * 1000)
+
+    print(f"\n{n:>9,} books  build {build_s:,.1f} s   index ~{memory:,.0f} MB   {len(index.postings):,} terms")
+    print(f"  saved {size:,.0f} MB in {save_s:.2f} s, loaded in {load_s:.2f} s   re-index one book {update_us:.0f} us")
+    print(f"  BM25 top-10:  p50 {percentile(latencies, 0.5):>8.2f} ms   p99 {percentile(latencies, 0.99):>8.2f} ms")
+    print(f"  LIKE scan:    p50 {percentile(scans, 0.5):>8.2f} ms   p99 {percentile(scans, 0.99):>8.2f} ms")
+
+if __name__ == "__main__":
+    for size in [int(a) for a in sys.argv[1:]] or [10_000, 100_000]:
+        run(size)
@@ -0,0 +1,72 @@
+# Purpose: Memory, build time, latency and recall of the fuzzy trigram index on misspelled queries.
+# Run from backend/: python -m books.benchmarks.bench_fuzzy [sizes...]
+import gc
+import random
+import sys
+import time
+
+from books.search import FuzzyIndex
+
+COMMON = ["the", "of", "and", "a", "in", "to", "my", "at"]
+CONSONANTS = "bcdfghjklmnprstvwz"
+VOWELS = "aeiou"
+
+def word(rng):
+    """A common word now and then, otherwise a pronounceable 4-9 letter word."""
+    if rng.random() < 0.2:
+        return rng.choice(COMMON)
+    return "".join(rng.choice(CONSONANTS if i % 2 == 0 else VOWELS) for i in range(rng.randint(4, 9)))
+
+def synthetic_books(n, seed=7):
+    rng = random.Random(seed)
+    for book_id in range(1, n + 1):
+        title = " ".join(word(rng) for _ in range(rng.randint(2, 5))).title()
+        author = f"{word(rng).title()} {word(rng).title()}"
+        yield book_id, title, author
+
+def misspell(text, rng):
+    """Drop, double or swap one letter in each word longer than three letters."""
+    words = []
+    for w in text.lower().split():
+        if len(w) > 3:
+            i = rng.randrange(1, len(w) - 1)
+            w = rng.choice([w[:i] + w[i + 1:], w[:i] + w[i] + w[i:], w[:i - 1] + w[i] + w[i - 1] + w[i + 1:]])
+        words.append(w)
+    return " ".join(words)
+
+def rss_mb():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * 4096 / 2**20
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def run(n, queries=200):
+    rows = list(synthetic_books(n))
+    gc.collect()
+    before = rss_mb()
+
+    start = time.perf_counter()
+    index = FuzzyIndex()
+    index.build(rows)
+    build_s = time.perf_counter() - start
+    gc.collect()
+    memory = rss_mb() - before
+
+    rng = random.Random(1)
+    latencies, found = [], 0
+    for book_id, title, _ in rng.sample(rows, queries):
+        term = misspell(title, rng)
+        start = time.perf_counter()
+        results = index.search(term, limit=10)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found += any(hit == book_id for hit, _ in results)
+
+    print(f"\n{n:>9,} titles  build {build_s:,.1f} s   index ~{memory:,.0f} MB   {len(index.postings):,} trigrams")
+    print(f"  misspelled title queries: p50 {percentile(latencies, 0.5):.2f} ms   "
+          f"p99 {percentile(latencies, 0.99):.2f} ms   recall@10 {found / queries:.0%}")
+
+if __name__ == "__main__":
+    for size in [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000]:
+        run(size)
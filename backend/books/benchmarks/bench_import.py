@@ -0,0 +1,64 @@
+# Purpose: Throughput and peak memory of `flask import-books` on growing feeds; flat memory means the pipeline streams.
+# Run from backend/: python -m books.benchmarks.bench_import [sizes...]
+import csv
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+GENRES = ["Fantasy", "Sci-Fi", "Mystery", "Non-fiction", "Romance", "Horror", "History", "Poetry"]
+
+def write_feed(path, n, seed=7):
+    """A CSV feed with description-sized rows, ~1% invalid prices and ~1% repeated ISBNs."""
+    rng = random.Random(seed)
+    with open(path, "w", newline="") as feed:
+        writer = csv.writer(feed)
+        writer.writerow(["title", "ISBN", "authors", "publishers", "format", "genre", "price", "quantity", "description"])
+        for i in range(1, n + 1):
+            isbn = f"978{rng.randint(1, i) if rng.random() < 0.01 else i:010d}"
+            price = "n/a" if rng.random() < 0.01 else f"{rng.randint(100, 9999) / 100:.2f}"
+            writer.writerow([
+                f"Title {i}", isbn, f"Author {rng.randint(1, 5000)}", "Feed Press", "Paperback",
+                rng.choice(GENRES), price, rng.randint(0, 40), "Lorem ipsum dolor sit amet. " * rng.randint(5, 20),
+            ])
+
+def import_one(feed, database):
+    """Run the import in this process (the child), then report its own peak RSS."""
+    os.environ["dbURL"] = f"sqlite:///{database}"
+    from books.app import app
+    from books.model import db
+
+    with app.app_context():
+        db.create_all()
+    start = time.perf_counter()
+    result = app.test_cli_runner().invoke(args=["import-books", feed, "--batch-size", "2000"])
+    elapsed = time.perf_counter() - start
+    assert result.exit_code == 0, result.output
+    summary = result.output.strip().splitlines()[-1]
+    print(f"{elapsed:.3f}\t{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f}\t{summary}")
+
+def run(n):
+    with tempfile.TemporaryDirectory() as tmp:
+        feed = os.path.join(tmp, "feed.csv")
+        write_feed(feed, n)
+        size = os.path.getsize(feed) / 2**20
+
+        # A fresh process per size, so each peak RSS belongs to one import
+        out = subprocess.run(
+            [sys.executable, "-m", "books.benchmarks.bench_import", "--child", feed, os.path.join(tmp, "books.db")],
+            check=True, capture_output=True, text=True,
+        ).stdout.strip().splitlines()[-1]
+        elapsed, peak, summary = out.split("\t")
+
+        print(f"\n{n:>9,} records ({size:,.0f} MB feed)   {n / float(elapsed):>8,.0f} records/s   peak RSS {peak} MB")
+        print(f"  {summary}")
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        import_one(*sys.argv[2:4])
+    else:
+        for size in [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 500_000]:
+            run(size)
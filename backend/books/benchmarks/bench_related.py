@@ -0,0 +1,57 @@
+# Purpose: Rebuild time and memory of the "customers also bought" index against order-history size, plus refresh and read cost.
+# Run from backend/: python -m books.benchmarks.bench_related [orders...]
+import gc
+import time
+
+import numpy as np
+
+from books.related import RelatedIndex
+
+BOOKS = 50_000
+
+def synthetic_orders(n, seed=7):
+    """(order_id, user_id, book_id) rows: ~8 orders per customer, book popularity skewed (Zipf-like)."""
+    rng = np.random.default_rng(seed)
+    users = rng.integers(1, max(2, n // 8), size=n)
+    books = np.minimum(rng.zipf(1.3, size=n), BOOKS)
+    return np.column_stack([np.arange(1, n + 1), users, books])
+
+def rss_mb():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * 4096 / 2**20
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def run(n):
+    rows = synthetic_orders(n)
+    history, new = rows[:-1000], rows[-1000:]
+    gc.collect()
+    before = rss_mb()
+
+    index = RelatedIndex(k=20)
+    start = time.perf_counter()
+    index.build(history, watermark=int(history[-1, 0]))
+    build_s = time.perf_counter() - start
+    gc.collect()
+    memory = rss_mb() - before
+
+    start = time.perf_counter()
+    index.apply(new.tolist(), watermark=n)
+    apply_ms = (time.perf_counter() - start) * 1000
+
+    latencies = []
+    for book_id in np.random.default_rng(1).integers(1, BOOKS, size=2000).tolist():
+        start = time.perf_counter()
+        index.related(book_id, 8)
+        latencies.append((time.perf_counter() - start) * 1_000_000)
+
+    print(f"\n{n:>10,} orders  build {build_s:>6.2f} s   ~{memory:,.0f} MB   {len(index.keys):,} pairs   {len(index.top):,} books")
+    print(f"  refresh with 1,000 new orders: {apply_ms:.1f} ms")
+    print(f"  read: p50 {percentile(latencies, 0.5):.1f} us   p99 {percentile(latencies, 0.99):.1f} us")
+
+if __name__ == "__main__":
+    import sys
+    for size in [int(a) for a in sys.argv[1:]] or [100_000, 1_000_000, 5_000_000]:
+        run(size)
@@ -0,0 +1,58 @@
+# Purpose: Compare catalog search through the trigram index against a LIKE '%term%' scan as the catalog grows.
+# Run from backend/: python -m books.benchmarks.bench_search [sizes...]
+import random
+import sqlite3
+import string
+import sys
+import time
+
+from books.search import SearchIndex
+
+WORDS = ["wizard", "space", "detective", "cooking", "atlas", "shadow", "river", "garden",
+         "empire", "silent", "winter", "secret", "crown", "ocean", "storm", "ember"]
+TERMS = ["wizard", "shadow riv", "9780", "ocean", "smith"]
+
+def synthetic_books(n, seed=7):
+    rng = random.Random(seed)
+    for book_id in range(1, n + 1):
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title()
+        author = "".join(rng.choice(string.ascii_lowercase) for _ in range(7)).title()
+        isbn = "978" + "".join(rng.choice(string.digits) for _ in range(10))
+        yield book_id, title, f"{author} Smith" if book_id % 9 == 0 else author, isbn
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def run(n, repeat=20):
+    rows = list(synthetic_books(n))
+
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE Books (book_id INTEGER PRIMARY KEY, title TEXT, authors TEXT, ISBN TEXT)")
+    conn.executemany("INSERT INTO Books VALUES (?, ?, ?, ?)", rows)
+
+    start = time.perf_counter()
+    index = SearchIndex()
+    index.build(rows)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    print(f"\n{n:>9,} books  (index build {build_ms:,.0f} ms)")
+    print(f"  {'term':<12} {'hits':>8} {'LIKE scan ms':>14} {'index ms':>10}")
+    for term in TERMS:
+        like = f"%{term}%"
+
+        def scan():
+            return conn.execute(
+                "SELECT book_id FROM Books WHERE title LIKE ? OR authors LIKE ? OR ISBN LIKE ?",
+                (like, like, like),
+            ).fetchall()
+
+        hits = index.search(term)
+        assert hits == {r[0] for r in scan()}, term
+        print(f"  {term:<12} {len(hits):>8,} {timed(scan, repeat):>14.3f} {timed(lambda: index.search(term), repeat):>10.3f}")
+
+if __name__ == "__main__":
+    for size in [int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000]:
+        run(size)
@@ -0,0 +1,56 @@
+# Purpose: Compare building a /books page with Book.json() + jsonify against joining cached row fragments.
+# Run from backend/: python -m books.benchmarks.bench_serialize
+import os
+import time
+from decimal import Decimal
+
+os.environ.setdefault("dbURL", "sqlite:///:memory:")
+
+from books.app import app, encode, splice  # noqa: E402
+from books.model import Book  # noqa: E402
+from flask import jsonify  # noqa: E402
+
+def synthetic_books(n):
+    books = []
+    for book_id in range(1, n + 1):
+        book = Book(
+            title=f"Synthetic Title {book_id}",
+            description="A long description of the book. " * 20,
+            ISBN=f"978{book_id:010d}",
+            authors="Author One, Author Two",
+            publishers="Pub House",
+            format="Paperback",
+            genre="Fantasy",
+            price=Decimal("19.99"),
+            quantity=book_id % 40,
+            url=f"/images/books/{book_id}.jpg",
+        )
+        book.book_id = book_id
+        books.append(book)
+    return books
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1_000_000
+
+def run(rows, repeat):
+    books = synthetic_books(rows)
+    pagination = {"page": 1, "limit": rows, "total": rows * 10, "has_more": True}
+    fragments = [encode(book.json()) for book in books]  # what the fragment cache holds when warm
+
+    def current():
+        return jsonify({"code": 200, "data": [book.json() for book in books], "pagination": pagination}).data
+
+    def joined():
+        return splice({"code": 200, "pagination": pagination}, b"[" + b",".join(fragments) + b"]")
+
+    assert current() == joined()
+    before, after = timed(current, repeat), timed(joined, repeat)
+    print(f"  {rows:>5} rows   jsonify {before:>10.1f} us   fragments {after:>8.1f} us   {before / after:>6.1f}x")
+
+if __name__ == "__main__":
+    with app.test_request_context():
+        for rows, repeat in ((8, 2000), (100, 500), (1000, 50)):
+            run(rows, repeat)
@@ -0,0 +1,70 @@
+# Purpose: Compare answering filtered /books pages with SQL (COUNT + OFFSET/LIMIT) against the NumPy catalog snapshot.
+# Run from backend/: python -m books.benchmarks.bench_snapshot [sizes...]
+import random
+import sqlite3
+import sys
+import time
+from decimal import Decimal
+
+from books.snapshot import CatalogSnapshot
+
+GENRES = ["Fantasy", "Sci-Fi", "Mystery", "Non-fiction", "Romance", "Horror", "History", "Poetry"]
+
+# (label, WHERE clause, params, snapshot filters, sort, page)
+QUERIES = [
+    ("all, page 1", "", (), {}, "id", 1),
+    ("genre", "WHERE genre = ?", ("Mystery",), {"genre": "Mystery"}, "id", 1),
+    ("price range + stock", "WHERE price >= ? AND price <= ? AND quantity > 0",
+     (10, 20), {"min_price": 10, "max_price": 20, "in_stock": True}, "id", 1),
+    ("genre by price", "WHERE genre = ?", ("Fantasy",), {"genre": "Fantasy"}, "price", 1),
+    ("deep page", "WHERE genre = ?", ("Fantasy",), {"genre": "Fantasy"}, "id", 500),
+]
+LIMIT = 8
+
+def synthetic_books(n, seed=7):
+    rng = random.Random(seed)
+    for book_id in range(1, n + 1):
+        price = Decimal(rng.randint(100, 9999)) / 100
+        yield book_id, rng.choice(GENRES), price, rng.choice([0, 0, 1, 3, 12, 40])
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def run(n, repeat=10):
+    rows = list(synthetic_books(n))
+
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE Books (book_id INTEGER PRIMARY KEY, genre TEXT, price NUMERIC, quantity INTEGER)")
+    conn.executemany("INSERT INTO Books VALUES (?, ?, ?, ?)", ((r[0], r[1], float(r[2]), r[3]) for r in rows))
+
+    start = time.perf_counter()
+    snapshot = CatalogSnapshot()
+    snapshot.build(rows)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    print(f"\n{n:>9,} books  (snapshot build {build_ms:,.0f} ms)")
+    print(f"  {'query':<22} {'total':>9} {'SQL ms':>9} {'snapshot ms':>12}")
+    for label, where, params, filters, sort, page in QUERIES:
+        order = "book_id" if sort == "id" else f"{sort}, book_id"
+        offset = (page - 1) * LIMIT
+
+        def sql():
+            total = conn.execute(f"SELECT COUNT(*) FROM Books {where}", params).fetchone()[0]
+            ids = conn.execute(
+                f"SELECT book_id FROM Books {where} ORDER BY {order} LIMIT ? OFFSET ?", params + (LIMIT, offset)
+            ).fetchall()
+            return [r[0] for r in ids], total
+
+        def vectorized():
+            return snapshot.page(filters, sort, offset=offset, limit=LIMIT)
+
+        expected = sql()
+        assert vectorized() == expected, label
+        print(f"  {label:<22} {expected[1]:>9,} {timed(sql, repeat):>9.3f} {timed(vectorized, repeat):>12.3f}")
+
+if __name__ == "__main__":
+    for size in [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000]:
+        run(size)
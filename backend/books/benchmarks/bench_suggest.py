@@ -0,0 +1,81 @@
+# Purpose: Typeahead latency of the suggest index under concurrent keystroke traffic, against a LIKE scan per keystroke.
+# Run from backend/: python -m books.benchmarks.bench_suggest [sizes...]
+import random
+import sqlite3
+import string
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from books.suggest import SuggestIndex
+
+WORDS = ["wizard", "space", "detective", "cooking", "atlas", "shadow", "river", "garden",
+         "empire", "silent", "winter", "secret", "crown", "ocean", "storm", "ember"]
+QUERIES = ["wizard", "shadow river", "silent", "978012", "ocean storm", "empire"]
+THREADS = 8
+USERS_PER_THREAD = 50
+
+def synthetic_books(n, seed=7):
+    rng = random.Random(seed)
+    for book_id in range(1, n + 1):
+        title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title()
+        author = "".join(rng.choice(string.ascii_lowercase) for _ in range(7)).title()
+        isbn = "978" + "".join(rng.choice(string.digits) for _ in range(10))
+        yield book_id, title, author, isbn, rng.randint(0, 40)
+
+def keystrokes(rng):
+    """Every prefix a user types on the way to a full query."""
+    query = rng.choice(QUERIES)
+    return [query[:i] for i in range(1, len(query) + 1)]
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def run(n):
+    rows = list(synthetic_books(n))
+
+    start = time.perf_counter()
+    index = SuggestIndex()
+    index.build(rows)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    def user(seed):
+        rng = random.Random(seed)
+        latencies = []
+        for _ in range(USERS_PER_THREAD):
+            for prefix in keystrokes(rng):
+                start = time.perf_counter()
+                index.suggest(prefix, 5)
+                latencies.append((time.perf_counter() - start) * 1_000_000)
+        return latencies
+
+    # One thread shows the index's own cost; several add lock and GIL waits
+    solo = user(THREADS)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(THREADS) as pool:
+        latencies = [l for result in pool.map(user, range(THREADS)) for l in result]
+    elapsed = time.perf_counter() - start
+
+    # What the search box did before: a GET /books search per keystroke, i.e. a COUNT(*) and a page of a LIKE scan
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE Books (book_id INTEGER PRIMARY KEY, title TEXT, authors TEXT, ISBN TEXT, quantity INTEGER)")
+    conn.executemany("INSERT INTO Books VALUES (?, ?, ?, ?, ?)", rows)
+    scans = []
+    for prefix in keystrokes(random.Random(0)):
+        like = f"%{prefix}%"
+        where = "WHERE title LIKE ? OR authors LIKE ? OR ISBN LIKE ?"
+        start = time.perf_counter()
+        conn.execute(f"SELECT COUNT(*) FROM Books {where}", (like, like, like)).fetchone()
+        conn.execute(f"SELECT book_id FROM Books {where} LIMIT 8", (like, like, like)).fetchall()
+        scans.append((time.perf_counter() - start) * 1_000_000)
+
+    print(f"\n{n:>9,} books  (index build {build_ms:,.0f} ms, {len(index.keys):,} keys)")
+    print(f"  suggest, 1 thread:     p50 {percentile(solo, 0.5):>10.1f} us   p99 {percentile(solo, 0.99):>11.1f} us")
+    print(f"  suggest, {THREADS} threads: {len(latencies) / elapsed:>10,.0f} keystrokes/s   "
+          f"p50 {percentile(latencies, 0.5):>8.1f} us   p99 {percentile(latencies, 0.99):>9.1f} us")
+    print(f"  LIKE scan, 1 thread:   p50 {percentile(scans, 0.5):>10.1f} us   p99 {percentile(scans, 0.99):>11.1f} us")
+
+if __name__ == "__main__":
+    for size in [int(a) for a in sys.argv[1:]] or [10_000, 100_000]:
+        run(size)
@@ -0,0 +1,206 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire after `ttl` seconds.
+
+    Entries can carry tags (e.g. the ids of the books in a cached page) so a write
+    can evict just the entries it affects with `invalidate(tag)`.
+    """
+
+    def __init__(self, maxsize=1024, ttl=30.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self.tagged = {}              # tag -> set of keys
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+
+            if entry[0] <= self.clock():
+                self._discard(key)
+                self.evictions += 1
+                self.misses += 1
+                return MISSING
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, tags=()):
+        with self.lock:
+            self._discard(key)
+            tags = frozenset(tags)
+            self.entries[key] = (self.clock() + self.ttl, value, tags)
+            for tag in tags:
+                self.tagged.setdefault(tag, set()).add(key)
+
+            while len(self.entries) > self.maxsize:
+                self._discard(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate(self, tag):
+        """Evict every entry carrying `tag`."""
+        with self.lock:
+            keys = self.tagged.pop(tag, ())
+            for key in list(keys):
+                self._discard(key)
+            self.evictions += len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.evictions += len(self.entries)
+            self.entries.clear()
+            self.tagged.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self.tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tagged[tag]
+
+class CatalogVersions:
+    """
+    In-process version counters for the catalog and for each book.
+
+    ETags are derived from these instead of from the payload, so a conditional
+    request can be answered before anything is loaded or serialized. The boot
+    token keeps tags from a previous process from matching after a restart.
+
+    The counters only move for writes this process makes. Writes made elsewhere
+    are caught two ways: the caller compares the database's catalog version with
+    the last one seen (`observe()`), and an epoch is `expired()` after `ttl`
+    seconds, so a write nobody announced can't keep an old tag valid for longer.
+    """
+
+    def __init__(self, ttl=None, clock=time.monotonic):
+        self.lock = threading.Lock()
+        self.boot = secrets.token_hex(4)
+        self.ttl = ttl
+        self.clock = clock
+        self.epoch = 0          # bumped by any write other than a stock change
+        self.catalog = 0        # bumped by every write
+        self.books = {}         # book_id -> stock change count within the epoch
+        self.started = clock()  # when the epoch began
+        self.database = None    # the database's catalog version last seen
+        self.checked = None     # when it was last read
+
+    def book_etag(self, book_id):
+        with self.lock:
+            return f"{self.boot}-{self.epoch}-b{book_id}.{self.books.get(book_id, 0)}"
+
+    def catalog_etag(self):
+        with self.lock:
+            return f"{self.boot}-{self.epoch}-c{self.catalog}"
+
+    def bump_book(self, book_id):
+        with self.lock:
+            self.books[book_id] = self.books.get(book_id, 0) + 1
+            self.catalog += 1
+
+    def bump_all(self):
+        with self.lock:
+            self.epoch += 1
+            self.catalog += 1
+            self.books.clear()
+            self.started = self.clock()
+
+    def expired(self):
+        with self.lock:
+            return self.ttl is not None and self.clock() - self.started >= self.ttl
+
+    def check_due(self, interval):
+        """True at most once per `interval` seconds (and always on the first call): time to read the database's version."""
+        with self.lock:
+            now = self.clock()
+            if self.checked is not None and now - self.checked < interval:
+                return False
+            self.checked = now
+            return True
+
+    def observe(self, version):
+        """Record the database's catalog version; True if it moved since it was last seen."""
+        with self.lock:
+            moved = self.database is not None and version != self.database
+            self.database = version
+            return moved
+
+    def advance(self, version):
+        """
+        Record `version`, written by this process. If it isn't the next one after the
+        last seen, someone else wrote in between, and the next `observe()` reports it.
+        """
+        with self.lock:
+            if self.database is not None and version == self.database + 1:
+                self.database = version
+
+class FragmentCache:
+    """
+    Encoded JSON for individual rows, each stored with the version token it was built from.
+    A lookup with a different token is a miss, so a row's fragment goes stale as soon as its version moves.
+    Fragments also expire after `ttl` seconds, which bounds how long a write made outside this process stays unseen.
+    """
+
+    def __init__(self, ttl=30.0, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.fragments = {}  # key -> (token, expires_at, bytes)
+
+    def __len__(self):
+        return len(self.fragments)
+
+    def get(self, key, token):
+        entry = self.fragments.get(key)
+        if entry is None or entry[0] != token:
+            return None
+        if entry[1] <= self.clock():
+            with self.lock:
+                if self.fragments.get(key) is entry:
+                    del self.fragments[key]
+            return None
+        return entry[2]
+
+    def set(self, key, token, fragment):
+        with self.lock:
+            self.fragments[key] = (token, self.clock() + self.ttl, fragment)
+
+    def clear(self):
+        with self.lock:
+            self.fragments.clear()
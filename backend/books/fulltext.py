@@ -0,0 +1,220 @@
+import functools
+import heapq
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+import threading
+from collections import Counter
+
+from .search import normalize
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his i if in into is it its of on or she so
+that the their them then there these they this to was were will with you your not no we our
+""".split())
+
+# Longest first; a suffix is only stripped when at least three letters remain
+SUFFIXES = (
+    ("ational", "ate"), ("ization", "ize"), ("iveness", "ive"), ("fulness", "ful"), ("ousness", "ous"),
+    ("ements", ""), ("ement", ""), ("ments", ""), ("ment", ""), ("ness", ""),
+    ("ings", ""), ("ing", ""), ("edly", ""), ("ies", "y"), ("ied", "y"), ("ed", ""), ("ly", ""),
+    ("sses", "ss"), ("s", ""),
+)
+
+# Title words count this many times, so a title match outranks a passing mention in a description
+TITLE_WEIGHT = 3
+K1 = 1.2
+B = 0.75
+# 2: JSON of plain lists and numbers, replacing 1 (a pickle, which runs code when loaded)
+FORMAT = 2
+
+# Text repeats a small working vocabulary, so most words have been stemmed before
+@functools.lru_cache(maxsize=65536)
+def stem(word):
+    """A light suffix-stripping stemmer: "mysteries" -> "mystery", "explored" and "explore" -> "explor"."""
+    if word.endswith(("ss", "us", "is")):
+        return sys.intern(word)
+    for suffix, replacement in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)] + replacement
+            # running -> runn -> run
+            if suffix in ("ing", "ed") and len(word) > 3 and word[-1] == word[-2] and word[-1] not in "lsz":
+                word = word[:-1]
+            break
+    # explore and explor(ed) end up the same
+    if word.endswith("e") and len(word) > 4:
+        word = word[:-1]
+    # Interned, so the posting lists and every book's term tuple share one copy of each term
+    return sys.intern(word)
+
+def tokenize(text):
+    """Normalized, stemmed terms of text, stopwords dropped, in order."""
+    return [stem(word) for word in re.findall(r"\w+", normalize(text)) if word not in STOPWORDS]
+
+class FullTextIndex:
+    """
+    BM25-ranked inverted index over Book.title, Book.authors and Book.description.
+
+    Postings map each term to {book_id: term frequency}, and document lengths are
+    kept per book, which is everything BM25 needs. A query walks its rarest terms'
+    posting lists first; once no book outside the candidates found so far could
+    still make the top `limit`, the common terms only rescore those candidates.
+
+    Books are added and removed one at a time, so the index follows catalog writes
+    without a rebuild. `save()` and `load()` persist it so a restart doesn't have
+    to re-tokenize every description.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.built = False
+            self.postings = {}  # term -> {book_id: term frequency}
+            self.lengths = {}   # book_id -> number of indexed terms
+            self.docs = {}      # book_id -> its distinct terms, so a book can be removed without a scan
+            self.total = 0      # sum of lengths, for the average document length
+            self.norms = {}     # book_id -> BM25 length normalization, against `norm_average`
+            self.norm_average = None
+
+    def build(self, rows):
+        """(Re)build from (book_id, title, authors, description) rows."""
+        with self.lock:
+            self.clear()
+            for row in rows:
+                self.add(*row)
+            self.built = True
+
+    @staticmethod
+    def terms(title, authors, description):
+        return Counter(tokenize(title) * TITLE_WEIGHT + tokenize(authors) + tokenize(description))
+
+    def add(self, book_id, title, authors, description):
+        with self.lock:
+            self.remove(book_id)
+            counts = self.terms(title, authors, description)
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[book_id] = tf
+            self.docs[book_id] = tuple(counts)
+            self.lengths[book_id] = sum(counts.values())
+            self.total += self.lengths[book_id]
+            if self.norm_average is not None:
+                self.norms[book_id] = self.norm(self.lengths[book_id], self.norm_average)
+
+    def remove(self, book_id):
+        with self.lock:
+            length = self.lengths.pop(book_id, None)
+            if length is None:
+                return
+            self.total -= length
+            self.norms.pop(book_id, None)
+            for term in self.docs.pop(book_id):
+                books = self.postings[term]
+                del books[book_id]
+                if not books:
+                    del self.postings[term]
+
+    def search(self, query, limit=10):
+        """
+        [(book_id, score)] for the `limit` best BM25 matches, best first, or None
+        when the query has no searchable terms (e.g. only stopwords).
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return None
+
+        with self.lock:
+            count = len(self.lengths)
+            if not count:
+                return []
+            norms = self.current_norms()
+
+            # Rarest terms first; each term adds at most idf * (K1 + 1) to a book's score
+            lists = sorted((books for books in map(self.postings.get, terms) if books), key=len)
+            weights = [math.log(1 + (count - len(books) + 0.5) / (len(books) + 0.5)) * (K1 + 1) for books in lists]
+
+            scores = {}
+            get = scores.get
+            for i, (books, weight) in enumerate(zip(lists, weights)):
+                if len(scores) >= limit and heapq.nlargest(limit, scores.values())[-1] > sum(weights[i:]):
+                    # No book outside the current candidates can reach the top `limit` any more,
+                    # so the remaining (long, common) lists only need to rescore the candidates
+                    for books, weight in zip(lists[i:], weights[i:]):
+                        for book_id in scores:
+                            tf = books.get(book_id)
+                            if tf:
+                                scores[book_id] += weight * tf / (tf + norms[book_id])
+                    break
+                for book_id, tf in books.items():
+                    scores[book_id] = get(book_id, 0.0) + weight * tf / (tf + norms[book_id])
+
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(book_id, score) for book_id, score in top]
+
+    @staticmethod
+    def norm(length, average):
+        return K1 * (1 - B + B * length / average)
+
+    def current_norms(self):
+        """
+        Per-book length normalization. It depends on the average length, so it is
+        recomputed once writes have moved that average by more than 1%, rather than
+        for every book on every query.
+        """
+        average = self.total / len(self.lengths)
+        if self.norm_average is None or abs(average - self.norm_average) > 0.01 * self.norm_average:
+            self.norm_average = average
+            self.norms = {book_id: self.norm(length, average) for book_id, length in self.lengths.items()}
+        return self.norms
+
+    def save(self, path, fingerprint=None):
+        """
+        Write the index to `path` atomically, tagged with a fingerprint of the catalog it was built from.
+        It is stored as JSON, so loading a file only ever reads data: a posting list is a flat
+        [book_id, tf, ...] list and `docs` is not stored, being rebuilt from the postings.
+        """
+        with self.lock:
+            state = {
+                "format": FORMAT,
+                "fingerprint": fingerprint,
+                "postings": {term: [n for pair in books.items() for n in pair] for term, books in self.postings.items()},
+                "lengths": [n for pair in self.lengths.items() for n in pair],
+            }
+            directory = os.path.dirname(os.path.abspath(path))
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, delete=False) as tmp:
+                # dumps rather than dump: one call to the C encoder instead of many small writes
+                tmp.write(json.dumps(state, separators=(",", ":")))
+            os.replace(tmp.name, path)
+
+    def load(self, path, fingerprint=None):
+        """Load an index saved by `save()`. Returns False, leaving the index unbuilt, if it's missing, malformed or doesn't match."""
+        try:
+            with open(path, encoding="utf-8") as saved:
+                state = json.load(saved)
+            # Compared as it reads back from JSON, where e.g. a tuple becomes a list
+            if state.get("format") != FORMAT or state.get("fingerprint") != json.loads(json.dumps(fingerprint)):
+                return False
+            postings, docs = {}, {}
+            for term, flat in state["postings"].items():
+                term = sys.intern(term)
+                books = postings[term] = dict(zip(flat[::2], flat[1::2]))
+                for book_id in books:
+                    docs.setdefault(book_id, []).append(term)
+            flat = state["lengths"]
+            lengths = dict(zip(flat[::2], flat[1::2]))
+        except (OSError, ValueError, TypeError, KeyError, AttributeError):
+            return False
+
+        with self.lock:
+            self.postings = postings
+            self.lengths = lengths
+            self.docs = {book_id: tuple(terms) for book_id, terms in docs.items()}
+            self.total = sum(lengths.values())
+            self.norms, self.norm_average = {}, None
+            self.built = True
+        return True
@@ -0,0 +1,199 @@
+import csv
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy.dialects import mysql, sqlite
+
+from .model import db, Book, bump_catalog_version
+
+# Columns a feed may set, with their length limits where the column has one
+COLUMNS = {
+    "title": 255, "description": None, "ISBN": 20, "authors": None, "publishers": 255,
+    "format": 50, "genre": 50, "price": None, "quantity": None, "url": None,
+}
+REQUIRED = ("title", "ISBN", "genre", "price", "quantity")
+
+class Rejected(ValueError):
+    pass
+
+def read_feed(path, kind):
+    """Yield (record number, raw dict) from a CSV (with a header row) or JSON Lines file, one record at a time."""
+    with open(path, newline="", encoding="utf-8") as feed:
+        if kind == "csv":
+            for number, raw in enumerate(csv.DictReader(feed), 1):
+                yield number, raw
+            return
+        for number, line in enumerate(feed, 1):
+            if not line.strip():
+                continue
+            try:
+                raw = json.loads(line)
+            except ValueError:
+                raw = None
+            yield number, raw if isinstance(raw, dict) else {"__invalid__": line.strip()}
+
+def clean(raw):
+    """A Books row from one feed record, or Rejected with the reason."""
+    if "__invalid__" in raw:
+        raise Rejected("not a JSON object")
+
+    row = {}
+    for column, max_length in COLUMNS.items():
+        value = raw.get(column)
+        if isinstance(value, str):
+            value = value.strip() or None
+        if value is None:
+            if column in REQUIRED:
+                raise Rejected(f"{column} is required")
+            row[column] = None
+            continue
+        if column not in ("price", "quantity"):
+            value = str(value)
+            if max_length is not None and len(value) > max_length:
+                raise Rejected(f"{column} is longer than {max_length} characters")
+        row[column] = value
+
+    # Feeds write ISBNs with and without hyphens; store them bare so duplicates are caught
+    row["ISBN"] = row["ISBN"].replace("-", "").replace(" ", "").upper()
+
+    try:
+        price = Decimal(str(row["price"]))
+    except InvalidOperation:
+        raise Rejected("price is not a number")
+    if not price.is_finite() or price < 0 or price != price.quantize(Decimal("0.01")):
+        raise Rejected("price must be a non-negative amount with at most 2 decimals")
+    row["price"] = price
+
+    quantity = row["quantity"]
+    if isinstance(quantity, bool) or not str(quantity).isdigit():
+        raise Rejected("quantity must be a non-negative integer")
+    row["quantity"] = int(quantity)
+    return row
+
+def validate(records, stats, rejects=None):
+    """Yield (number, row) for valid records; count, and optionally log, the rest."""
+    for number, raw in records:
+        try:
+            yield number, clean(raw)
+        except Rejected as e:
+            stats["rejected"] += 1
+            if rejects is not None:
+                rejects.write(json.dumps({"record": number, "reason": str(e), "data": raw}, default=str) + "\n")
+
+def batches(records, size, stats):
+    """
+    Group records into lists of `size`, keeping only the last record for each ISBN
+    in a batch. Across batches the upsert does the same, so the last record for an
+    ISBN wins throughout while memory stays bounded by the batch size.
+    """
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        by_isbn = {row["ISBN"]: (number, row) for number, row in batch}
+        stats["duplicates"] += len(batch) - len(by_isbn)
+        yield batch[-1][0], [row for _, row in by_isbn.values()]
+
+def upsert_statement():
+    """INSERT ... that updates the existing book on a duplicate ISBN (the unique ux_books_isbn index)."""
+    table = Book.__table__
+    updated = [column for column in COLUMNS if column != "ISBN"]
+    if db.engine.dialect.name == "mysql":
+        statement = mysql.insert(table)
+        return statement.on_duplicate_key_update({column: statement.inserted[column] for column in updated})
+    if db.engine.dialect.name == "sqlite":
+        statement = sqlite.insert(table)
+        return statement.on_conflict_do_update(
+            index_elements=["ISBN"], set_={column: statement.excluded[column] for column in updated}
+        )
+    raise click.ClickException(f"Upserts are not supported on {db.engine.dialect.name}.")
+
+def read_checkpoint(path, fingerprint):
+    """The last record number committed by an earlier run of the same feed, or 0."""
+    try:
+        with open(path) as saved:
+            checkpoint = json.load(saved)
+    except FileNotFoundError:
+        return 0, {}
+    if checkpoint.get("feed") != fingerprint:
+        raise click.ClickException(f"{path} belongs to a different feed; pass --restart to ignore it.")
+    return checkpoint["record"], checkpoint["stats"]
+
+def write_checkpoint(path, fingerprint, record, stats):
+    """Record progress atomically, so a crash mid-write never leaves a checkpoint that can't be read."""
+    with open(path + ".tmp", "w") as tmp:
+        json.dump({"feed": fingerprint, "record": record, "stats": stats}, tmp)
+    os.replace(path + ".tmp", path)
+
+@click.command("import-books")
+@click.argument("feed", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "kind", type=click.Choice(["csv", "jsonl"]), help="Feed format (default: from the file extension).")
+@click.option("--batch-size", default=1000, show_default=True, type=click.IntRange(min=1), help="Rows per upsert and commit.")
+@click.option("--checkpoint", help="Progress file (default: FEED.checkpoint).")
+@click.option("--restart", is_flag=True, help="Ignore an existing checkpoint and start from the first record.")
+@click.option("--rejects", type=click.Path(dir_okay=False, writable=True), help="Write rejected records to this JSON Lines file.")
+@with_appcontext
+def import_books(feed, kind, batch_size, checkpoint, restart, rejects):
+    """
+    Stream a CSV or JSON Lines publisher feed into Books, upserting on ISBN.
+
+    Records are read, validated and written one batch at a time, so memory stays
+    flat however large the feed is. Progress is checkpointed after every committed
+    batch; re-running the same command resumes after the last one.
+    """
+    kind = kind or ("jsonl" if feed.endswith((".jsonl", ".ndjson", ".json")) else "csv")
+    checkpoint = checkpoint or feed + ".checkpoint"
+    stat = os.stat(feed)
+    fingerprint = [os.path.abspath(feed), stat.st_size, int(stat.st_mtime)]
+
+    if restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    done, saved = read_checkpoint(checkpoint, fingerprint)
+    stats = {"read": 0, "imported": 0, "rejected": 0, "duplicates": 0, **saved}
+    read_before = stats["read"]
+    if done:
+        click.echo(f"Resuming after record {done:,} ({stats['imported']:,} imported so far).")
+
+    statement = upsert_statement()
+    started = time.perf_counter()
+    rejects_file = open(rejects, "a", encoding="utf-8") if rejects else None
+    try:
+        def unread():
+            for number, raw in read_feed(feed, kind):
+                if number > done:
+                    stats["read"] += 1
+                    yield number, raw
+
+        for last, rows in batches(validate(unread(), stats, rejects_file), batch_size, stats):
+            db.session.execute(statement, rows)
+            # Committed with the batch, so running books services drop their caches and indexes
+            bump_catalog_version(db.session)
+            db.session.commit()
+            stats["imported"] += len(rows)
+            write_checkpoint(checkpoint, fingerprint, last, stats)
+            elapsed = time.perf_counter() - started
+            click.echo(f"  {stats['imported']:,} imported, {stats['rejected']:,} rejected, "
+                       f"{(stats['read'] - read_before) / elapsed:,.0f} records/s", err=True)
+    except Exception:
+        db.session.rollback()
+        click.echo(f"[!] Import stopped; re-run the same command to resume from {checkpoint}.", err=True)
+        raise
+    finally:
+        if rejects_file:
+            rejects_file.close()
+
+    elapsed = time.perf_counter() - started
+    # A rejected tail after the last batch is still progress; then the checkpoint has served its purpose
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    click.echo(
+        f"Imported {stats['imported']:,} books ({stats['duplicates']:,} duplicate ISBNs merged), "
+        f"rejected {stats['rejected']:,}, read {stats['read']:,} records; {elapsed:.1f} s "
+        f"({(stats['read'] - read_before) / max(elapsed, 1e-9):,.0f} records/s this run)."
+    )
@@ -17,20 +17,58 @@ class Book(db.Model):
     quantity = db.Column(db.Integer, nullable=False)
     url = db.Column(db.Text, nullable=True)
 
-    def json(self):
-        return {
-            "book_id": self.book_id,
-            "title": self.title,
-            "description": self.description,
-            "ISBN": self.ISBN,
-            "authors": self.authors,
-            "publishers": self.publishers,
-            "format": self.format,
-            "genre": self.genre,
-            "price": self.price,
-            "quantity": self.quantity,
-            "url": self.url,
-        }
+    # Composite indexes behind ?sort= with and without a genre filter, so sorted pages are
+    # read in index order instead of sorted per request; see database/migrations/001_books_sort_indexes.sql
+    __table_args__ = (
+        db.Index("ix_books_genre_price", "genre", "price", "book_id"),
+        db.Index("ix_books_genre_title", "genre", "title", "book_id"),
+        db.Index("ix_books_genre_book", "genre", "book_id"),
+        db.Index("ix_books_price", "price", "book_id"),
+        db.Index("ix_books_title", "title", "book_id"),
+        # One entry per ISBN; see database/migrations/002_hot_query_indexes.sql
+        db.Index("ux_books_isbn", "ISBN", unique=True),
+    )
+
+    # Keys of json(), in order; also the names accepted by ?fields=
+    FIELDS = (
+        "book_id", "title", "description", "ISBN", "authors", "publishers",
+        "format", "genre", "price", "quantity", "url",
+    )
+
+    def json(self, fields=FIELDS):
+        # Only touch the requested attributes so unloaded columns are never lazy-loaded
+        return {field: getattr(self, field) for field in fields}
     
     def __repr__(self): # pragma: no cover
-        return f"<Book {self.book_id} - {self.title}>"
\ No newline at end of file
+        return f"<Book {self.book_id} - {self.title}>"
+
+# One row, bumped with every catalog write other than a stock change, by this service and by
+# other processes (the importer, other replicas), so each books process can tell its caches and
+# indexes are out of date; see database/migrations/005_catalog_version.sql
+catalog_version = db.Table(
+    "CatalogVersion",
+    db.Column("id", db.Integer, primary_key=True, autoincrement=False),
+    db.Column("version", db.BigInteger, nullable=False),
+)
+
+def read_catalog_version(session):
+    return session.execute(db.select(catalog_version.c.version).where(catalog_version.c.id == 1)).scalar() or 0
+
+def bump_catalog_version(session):
+    """Increment the catalog version within the session's transaction; returns the new version."""
+    bumped = session.execute(
+        db.update(catalog_version).where(catalog_version.c.id == 1).values(version=catalog_version.c.version + 1)
+    )
+    if bumped.rowcount == 0:
+        # Databases created without the migrations have no row yet
+        session.execute(db.insert(catalog_version).values(id=1, version=1))
+    return read_catalog_version(session)
+
+# The orders service's table, in the same database; read only, for "customers also bought"
+orders = db.Table(
+    "Orders",
+    db.Column("order_id", db.Integer, primary_key=True),
+    db.Column("book_id", db.Integer, nullable=False),
+    db.Column("user_id", db.Integer, nullable=False),
+    db.Column("status", db.String(20), nullable=False),
+)
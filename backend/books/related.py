@@ -0,0 +1,188 @@
+import heapq
+import threading
+
+import numpy as np
+
+SHIFT = 32
+MASK = (1 << SHIFT) - 1
+
+# Baskets bigger than this (resellers, test accounts) would add basket^2 pairs and say little about taste
+MAX_BASKET = 200
+# Pairs generated per vectorized step while building, which bounds the build's peak memory
+BUILD_CHUNK = 2_000_000
+# Incremental counts are folded back into the arrays once there are this many
+MERGE_AT = 100_000
+
+def pack(high, low):
+    return (np.asarray(high, dtype=np.int64) << SHIFT) | np.asarray(low, dtype=np.int64)
+
+class RelatedIndex:
+    """
+    "Customers also bought": per-book top-k of the books most often bought by the
+    same customers, from completed orders.
+
+    Co-purchase counts are a sparse book x book matrix held as two NumPy arrays:
+    sorted (book << 32 | other) keys and their counts. It is built by generating
+    every pair within each customer's basket in vectorized chunks and counting
+    them with np.unique. Each book's top k is then precomputed, so a read is one
+    dict lookup.
+
+    `apply()` folds in newly completed orders without a rebuild: new pairs go to
+    a small overlay of counts, each affected book's top k is re-ranked from its
+    old top k plus the pairs that changed, and the overlay is merged into the
+    arrays once it grows large.
+    """
+
+    def __init__(self, k=20):
+        self.k = k
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.built = False
+            self.keys = np.empty(0, dtype=np.int64)     # sorted book << 32 | other
+            self.counts = np.empty(0, dtype=np.int64)
+            self.extra = {}                              # book -> {other: count} not yet in the arrays
+            self.baskets = np.empty(0, dtype=np.int64)  # sorted user << 32 | book
+            self.new_baskets = {}                        # user -> books added since the build
+            self.top = {}                                # book -> [(other, count)], best first
+            self.watermark = 0                           # every order up to this id has been settled
+            self.seen = set()                            # completed orders above the watermark already counted
+
+    def build(self, orders, watermark=0):
+        """(Re)build from (order_id, user_id, book_id) rows of completed orders."""
+        rows = np.array(list(orders), dtype=np.int64).reshape(-1, 3)
+        baskets = np.unique(pack(rows[:, 1], rows[:, 2]))
+        keys, counts = self.count_pairs(baskets)
+
+        with self.lock:
+            self.clear()
+            self.keys, self.counts, self.baskets = keys, counts, baskets
+            self.top = self.top_k(keys, counts)
+            self.watermark = watermark
+            self.seen = {int(order_id) for order_id in rows[:, 0] if order_id > watermark}
+            self.built = True
+
+    @staticmethod
+    def count_pairs(baskets):
+        """Sorted pair keys and counts for every ordered pair of distinct books sharing a basket."""
+        users, books = baskets >> SHIFT, baskets & MASK
+        starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]]) if len(users) else np.empty(0, dtype=np.int64)
+        sizes = np.diff(np.r_[starts, len(users)])
+        keep = (sizes >= 2) & (sizes <= MAX_BASKET)
+        starts, sizes = starts[keep], sizes[keep]
+
+        parts_keys, parts_counts = [], []
+        pairs = sizes * sizes
+        first = 0
+        while first < len(sizes):
+            # As many whole baskets as fit in one chunk
+            last = first + max(1, int(np.searchsorted(np.cumsum(pairs[first:]), BUILD_CHUNK, side="right")))
+            size, start, n = sizes[first:last], starts[first:last], pairs[first:last]
+            group = np.repeat(np.arange(len(size)), n)
+            offset = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+            i = start[group] + offset // size[group]
+            j = start[group] + offset % size[group]
+            distinct = i != j
+            chunk_keys, chunk_counts = np.unique(pack(books[i[distinct]], books[j[distinct]]), return_counts=True)
+            parts_keys.append(chunk_keys)
+            parts_counts.append(chunk_counts)
+            first = last
+
+        if not parts_keys:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return RelatedIndex.merge(np.concatenate(parts_keys), np.concatenate(parts_counts))
+
+    @staticmethod
+    def merge(keys, counts):
+        """Sum the counts of equal keys; the result is sorted by key."""
+        keys, inverse = np.unique(keys, return_inverse=True)
+        return keys, np.bincount(inverse, weights=counts, minlength=len(keys)).astype(np.int64)
+
+    def top_k(self, keys, counts):
+        books, others = keys >> SHIFT, keys & MASK
+        # By book, then most bought together, then lowest id
+        order = np.lexsort((others, -counts, books))
+        books, others, counts = books[order], others[order], counts[order]
+        starts = np.flatnonzero(np.r_[True, books[1:] != books[:-1]]) if len(books) else []
+        ends = np.r_[starts[1:], len(books)] if len(books) else []
+        top = {}
+        for start, end in zip(starts, ends):
+            end = min(end, start + self.k)
+            top[int(books[start])] = list(zip(others[start:end].tolist(), counts[start:end].tolist()))
+        return top
+
+    def basket(self, user_id):
+        low = np.searchsorted(self.baskets, user_id << SHIFT)
+        high = np.searchsorted(self.baskets, (user_id + 1) << SHIFT)
+        return set((self.baskets[low:high] & MASK).tolist()) | self.new_baskets.get(user_id, set())
+
+    def pair_count(self, book_id, other):
+        """Times the two books were bought together, arrays and overlay combined."""
+        key = (book_id << SHIFT) | other
+        index = int(np.searchsorted(self.keys, key))
+        count = int(self.counts[index]) if index < len(self.keys) and self.keys[index] == key else 0
+        return count + self.extra.get(book_id, {}).get(other, 0)
+
+    def apply(self, orders, watermark):
+        """
+        Count newly completed (order_id, user_id, book_id) orders, skipping ones
+        already counted, then move the watermark. Returns how many were new.
+        """
+        with self.lock:
+            changed = {}  # book -> others whose count with it went up
+            new = 0
+            for order_id, user_id, book_id in orders:
+                if order_id <= self.watermark or order_id in self.seen:
+                    continue
+                self.seen.add(order_id)
+                new += 1
+                basket = self.basket(user_id)
+                if book_id in basket:
+                    continue
+                if len(basket) < MAX_BASKET:
+                    for other in basket:
+                        for a, b in ((book_id, other), (other, book_id)):
+                            counts = self.extra.setdefault(a, {})
+                            counts[b] = counts.get(b, 0) + 1
+                            changed.setdefault(a, set()).add(b)
+                self.new_baskets.setdefault(user_id, set()).add(book_id)
+
+            # Counts only go up, so a book outside the old top k can only have entered it if its count changed
+            for book_id, others in changed.items():
+                candidates = {other for other, _ in self.top.get(book_id, [])} | others
+                counts = [(other, self.pair_count(book_id, other)) for other in candidates]
+                self.top[book_id] = heapq.nsmallest(self.k, counts, key=lambda item: (-item[1], item[0]))
+
+            self.watermark = max(self.watermark, watermark)
+            self.seen = {order_id for order_id in self.seen if order_id > self.watermark}
+            if sum(len(counts) for counts in self.extra.values()) >= MERGE_AT:
+                self.fold()
+            return new
+
+    def fold(self):
+        """Merge the overlay counts and new baskets into the arrays."""
+        extra_keys = [(a << SHIFT) | b for a, counts in self.extra.items() for b in counts]
+        extra_counts = [count for counts in self.extra.values() for count in counts.values()]
+        self.keys, self.counts = self.merge(
+            np.concatenate([self.keys, np.array(extra_keys, dtype=np.int64)]),
+            np.concatenate([self.counts, np.array(extra_counts, dtype=np.int64)]),
+        )
+        new_baskets = [(user_id << SHIFT) | book_id for user_id, books in self.new_baskets.items() for book_id in books]
+        self.baskets = np.union1d(self.baskets, np.array(new_baskets, dtype=np.int64))
+        self.extra, self.new_baskets = {}, {}
+
+    def related(self, book_id, limit):
+        """[(book_id, times bought together)] for up to `limit` books, most often first."""
+        with self.lock:
+            return self.top.get(book_id, [])[:limit]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "built": self.built,
+                "books": len(self.top),
+                "pairs": len(self.keys) + sum(len(counts) for counts in self.extra.values()),
+                "watermark": self.watermark,
+            }
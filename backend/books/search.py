@@ -0,0 +1,179 @@
+import math
+import re
+import threading
+import unicodedata
+
+GRAM = 3
+
+def normalize(text):
+    """Lower-case and strip accents so matching behaves like the case/accent-insensitive ILIKE it replaces."""
+    if not text:
+        return ""
+    if text.isascii():
+        # Nothing to strip, and casefold() is lower() for ASCII
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+def grams(text):
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+class SearchIndex:
+    """
+    In-memory trigram index over Book.title, Book.authors and Book.ISBN.
+
+    A search term is split into its trigrams and the posting lists are intersected,
+    smallest first. The surviving candidates are then checked for the full substring,
+    so the result is exactly the set of rows `ILIKE '%term%'` would match on any of
+    the three columns.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.built = False
+            self.fields = {}    # book_id -> (title, authors, ISBN), normalized
+            self.postings = {}  # trigram -> set of book_id
+
+    def build(self, rows):
+        """(Re)build from (book_id, title, authors, ISBN) rows."""
+        with self.lock:
+            self.clear()
+            for row in rows:
+                self.add(*row)
+            self.built = True
+
+    def add(self, book_id, title, authors, isbn):
+        with self.lock:
+            self.remove(book_id)
+            fields = (normalize(title), normalize(authors), normalize(isbn))
+            self.fields[book_id] = fields
+            for gram in set().union(*(grams(f) for f in fields)):
+                self.postings.setdefault(gram, set()).add(book_id)
+
+    def remove(self, book_id):
+        with self.lock:
+            fields = self.fields.pop(book_id, None)
+            if fields is None:
+                return
+            for gram in set().union(*(grams(f) for f in fields)):
+                ids = self.postings.get(gram)
+                if ids is not None:
+                    ids.discard(book_id)
+                    if not ids:
+                        del self.postings[gram]
+
+    def search(self, term):
+        """
+        Return the set of matching book ids, or None when the index can't answer
+        (not built yet, term shorter than a trigram, or LIKE wildcards in the term).
+        """
+        term = normalize(term)
+        if not self.built or len(term) < GRAM or "%" in term or "_" in term:
+            return None
+
+        with self.lock:
+            lists = []
+            for gram in grams(term):
+                ids = self.postings.get(gram)
+                if not ids:
+                    return set()
+                lists.append(ids)
+
+            lists.sort(key=len)
+            candidates = set(lists[0])
+            for ids in lists[1:]:
+                candidates &= ids
+                if not candidates:
+                    return candidates
+
+            return {
+                book_id for book_id in candidates
+                if any(term in field for field in self.fields[book_id])
+            }
+
+def word_grams(text):
+    """pg_trgm-style trigrams: each word padded with two spaces in front and one behind."""
+    found = set()
+    for word in re.findall(r"\w+", text):
+        padded = f"  {word} "
+        found.update(padded[i:i + GRAM] for i in range(len(padded) - GRAM + 1))
+    return found
+
+class FuzzyIndex:
+    """
+    Trigram similarity index over Book.title and Book.authors for misspelled searches.
+
+    A book scores the share of the query's word trigrams it contains, so "hary poter"
+    still scores 0.82 against "Harry Potter". Candidates come from the posting lists
+    of the query's rarest trigrams only: a book reaching `threshold` must share at
+    least one of them, which keeps very common trigrams ("  t", "the") out of
+    candidate generation. Each candidate is then scored exactly.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.built = False
+            self.texts = {}     # book_id -> normalized "title authors"
+            self.sizes = {}     # book_id -> number of distinct word trigrams
+            self.postings = {}  # word trigram -> set of book_id
+
+    def build(self, rows):
+        """(Re)build from (book_id, title, authors) rows."""
+        with self.lock:
+            self.clear()
+            for row in rows:
+                self.add(*row)
+            self.built = True
+
+    def add(self, book_id, title, authors):
+        with self.lock:
+            self.remove(book_id)
+            text = f"{normalize(title)} {normalize(authors)}"
+            have = word_grams(text)
+            self.texts[book_id] = text
+            self.sizes[book_id] = len(have)
+            for gram in have:
+                self.postings.setdefault(gram, set()).add(book_id)
+
+    def remove(self, book_id):
+        with self.lock:
+            text = self.texts.pop(book_id, None)
+            if text is None:
+                return
+            del self.sizes[book_id]
+            for gram in word_grams(text):
+                ids = self.postings.get(gram)
+                if ids is not None:
+                    ids.discard(book_id)
+                    if not ids:
+                        del self.postings[gram]
+
+    def search(self, term, threshold=0.5, limit=None):
+        """[(book_id, score)] scoring at least `threshold`, best first (ties: closer overall match, then book_id)."""
+        wanted = word_grams(normalize(term))
+        if not wanted:
+            return []
+
+        with self.lock:
+            # Any book sharing `need` trigrams must share one of the len - need + 1 rarest
+            need = math.ceil(threshold * len(wanted))
+            lists = sorted((self.postings.get(gram, set()) for gram in wanted), key=len)
+            candidates = set().union(*lists[:len(wanted) - need + 1])
+
+            scored = []
+            for book_id in candidates:
+                shared = sum(book_id in ids for ids in lists)
+                if shared >= need:
+                    union = len(wanted) + self.sizes[book_id] - shared
+                    scored.append((-shared / len(wanted), -shared / union, book_id))
+
+        scored.sort()
+        return [(book_id, -score) for score, _, book_id in scored[:limit]]
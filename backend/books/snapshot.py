@@ -0,0 +1,157 @@
+import math
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - snapshot mode is optional
+    np = None
+
+class CatalogSnapshot:
+    """
+    Columnar copy of the fields the catalog filters on, held as NumPy arrays.
+
+    Rows are stored in book_id order: ids, price in integer cents, genre as a
+    category code and quantity. Each sort key has a precomputed permutation (and
+    its inverse, the rank of every row), so a filtered, sorted page is a boolean
+    mask, one gather and a slice rather than a SQL round trip.
+
+    Stock changes are applied in place with `set_quantity`; any other write should
+    `clear()` the snapshot so it is rebuilt on next use. Reads go through `page()`,
+    which holds the lock so a rebuild is never seen half swapped.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.changes = 0  # writes seen, so a build that raced one can be discarded
+        self.clear()
+
+    @staticmethod
+    def available():
+        return np is not None
+
+    def clear(self):
+        with self.lock:
+            self.changes += 1
+            self.built = False
+            self.ids = None
+            self.cents = None
+            self.genres = {}  # genre -> category code
+            self.codes = None
+            self.quantity = None
+            self.orders = {}  # sort name -> positions in ascending (key, book_id) order
+            self.ranks = {}   # sort name -> rank of each position in that order
+
+    def build(self, rows, orders=None):
+        """
+        (Re)build from (book_id, genre, price, quantity) rows in book_id order.
+        `orders` maps extra sort names to book ids already in that order (e.g. title
+        order as the database collates it); price and id orders are derived here.
+        """
+        changes = self.changes
+        rows = list(rows)
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        cents = np.fromiter((int(row[2] * 100) for row in rows), dtype=np.int64, count=len(rows))
+        quantity = np.fromiter((row[3] for row in rows), dtype=np.int64, count=len(rows))
+
+        genres = {genre: code for code, genre in enumerate(sorted({row[1] for row in rows}))}
+        codes = np.fromiter((genres[row[1]] for row in rows), dtype=np.int32, count=len(rows))
+
+        sort_orders = {
+            "id": np.arange(len(rows)),
+            # lexsort sorts by the last key first, so this is (price, book_id)
+            "price": np.lexsort((ids, cents)),
+        }
+        for name, book_ids in (orders or {}).items():
+            sort_orders[name] = np.searchsorted(ids, np.fromiter(book_ids, dtype=np.int64))
+
+        ranks = {}
+        for name, order in sort_orders.items():
+            rank = np.empty(len(rows), dtype=np.int64)
+            rank[order] = np.arange(len(rows))
+            ranks[name] = rank
+
+        with self.lock:
+            if changes != self.changes:
+                # The catalog moved while the rows were being read; leave it to the next request
+                return
+            self.ids, self.cents, self.quantity = ids, cents, quantity
+            self.genres, self.codes = genres, codes
+            self.orders, self.ranks = sort_orders, ranks
+            self.built = True
+
+    def __len__(self):
+        return 0 if self.ids is None else len(self.ids)
+
+    def position(self, book_id):
+        index = int(np.searchsorted(self.ids, book_id))
+        if index < len(self.ids) and self.ids[index] == book_id:
+            return index
+        return None
+
+    def set_quantity(self, book_id, quantity):
+        """Apply a stock change in place. An unknown book means the snapshot is stale, so drop it."""
+        with self.lock:
+            self.changes += 1
+            if not self.built:
+                return
+            index = self.position(book_id)
+            if index is not None:
+                self.quantity[index] = quantity
+                return
+        self.clear()
+
+    def page(self, filters, sort="id", descending=False, after=None, offset=0, limit=8):
+        """
+        Return (book_ids, total) for the rows matching `filters` in `sort` order: up
+        to `limit` ids starting `offset` rows in, or right after the book `after`,
+        plus the number of rows matched overall. None if the snapshot isn't built
+        or `after` isn't in it.
+        """
+        with self.lock:
+            if not self.built:
+                return None
+            return self.select(self.mask(**filters), sort, descending, after, offset, limit)
+
+    def mask(self, genre=None, min_price=None, max_price=None, in_stock=False, book_ids=None):
+        """Boolean mask of the rows matching every given filter."""
+        mask = np.ones(len(self.ids), dtype=bool)
+
+        if genre:
+            code = self.genres.get(genre)
+            if code is None:
+                return np.zeros(len(self.ids), dtype=bool)
+            mask &= self.codes == code
+
+        # Rounded before ceil/floor so e.g. 9.99 * 100 = 998.999... still means 999 cents
+        if min_price is not None:
+            mask &= self.cents >= math.ceil(round(min_price * 100, 6))
+        if max_price is not None:
+            mask &= self.cents <= math.floor(round(max_price * 100, 6))
+        if in_stock:
+            mask &= self.quantity > 0
+        if book_ids is not None:
+            mask &= np.isin(self.ids, np.fromiter(book_ids, dtype=np.int64, count=len(book_ids)))
+
+        return mask
+
+    def select(self, mask, sort="id", descending=False, after=None, offset=0, limit=8):
+        order = self.orders[sort]
+        matched = np.flatnonzero(mask) if sort == "id" else order[mask[order]]
+        if descending:
+            matched = matched[::-1]
+
+        start = offset
+        if after is not None:
+            index = self.position(after)
+            if index is None:
+                return None
+            rank = self.ranks[sort]
+            if descending:
+                start = int(np.searchsorted(-rank[matched], -rank[index], side="right"))
+            else:
+                start = int(np.searchsorted(rank[matched], rank[index], side="right"))
+
+        return self.ids[matched[start:start + limit]].tolist(), len(matched)
+
+    def stats(self):
+        return {"built": self.built, "size": len(self)}
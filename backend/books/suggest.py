@@ -0,0 +1,139 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+
+from .search import normalize
+
+KIND_ORDER = {"title": 0, "author": 1, "isbn": 2}
+
+class SuggestIndex:
+    """
+    Sorted prefix array over normalized titles, author names and ISBNs for typeahead.
+
+    Every key a book can be found by is kept in one sorted list: each word-start
+    suffix of the title ("wizard of oz", "of oz", "oz") and of each comma-separated
+    author ("l. frank baum", "frank baum", "baum"), and the ISBN. The keys starting with a prefix form one contiguous range,
+    found with two bisects. Matches are ranked by stock, so books that can actually
+    be bought come first, and reported once per book.
+
+    A narrow prefix ranks its range directly. A broad one ("w") would mean ranking
+    most of the catalog, so instead books are walked in stock order until `limit`
+    of them match; the broader the prefix, the sooner that happens. Either way a
+    keystroke costs about sqrt(limit * books) steps at worst.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.built = False
+            self.keys = []      # sorted (key, book_id, kind) tuples
+            self.by_stock = []  # sorted (-quantity, title, book_id), the ranking order
+            self.books = {}     # book_id -> {"title", "authors", "quantity", "keys"}
+
+    def build(self, rows):
+        """(Re)build from (book_id, title, authors, ISBN, quantity) rows."""
+        with self.lock:
+            self.clear()
+            keys = []
+            for book_id, title, authors, isbn, quantity in rows:
+                book_keys = self.keys_for(book_id, title, authors, isbn)
+                self.books[book_id] = {"title": title, "authors": authors, "quantity": quantity, "keys": book_keys}
+                keys.extend(book_keys)
+            keys.sort()
+            self.keys = keys
+            self.by_stock = sorted(self.rank_key(book_id) for book_id in self.books)
+            self.built = True
+
+    @staticmethod
+    def keys_for(book_id, title, authors, isbn):
+        keys = set()
+        names = [(title, "title")] + [(author, "author") for author in (authors or "").split(",")]
+        for name, kind in names:
+            words = normalize(name).split()
+            for i in range(len(words)):
+                keys.add((" ".join(words[i:]), book_id, kind))
+        if isbn:
+            keys.add((normalize(isbn), book_id, "isbn"))
+        return keys
+
+    def rank_key(self, book_id):
+        book = self.books[book_id]
+        return (-book["quantity"], book["title"], book_id)
+
+    def add(self, book_id, title, authors, isbn, quantity):
+        with self.lock:
+            self.remove(book_id)
+            book_keys = self.keys_for(book_id, title, authors, isbn)
+            self.books[book_id] = {"title": title, "authors": authors, "quantity": quantity, "keys": book_keys}
+            for key in book_keys:
+                insort(self.keys, key)
+            insort(self.by_stock, self.rank_key(book_id))
+
+    def remove(self, book_id):
+        with self.lock:
+            if book_id not in self.books:
+                return
+            self.discard(self.by_stock, self.rank_key(book_id))
+            for key in self.books.pop(book_id)["keys"]:
+                self.discard(self.keys, key)
+
+    def set_stock(self, book_id, quantity):
+        with self.lock:
+            book = self.books.get(book_id)
+            if book is None or book["quantity"] == quantity:
+                return
+            self.discard(self.by_stock, self.rank_key(book_id))
+            book["quantity"] = quantity
+            insort(self.by_stock, self.rank_key(book_id))
+
+    @staticmethod
+    def discard(items, item):
+        index = bisect_left(items, item)
+        if index < len(items) and items[index] == item:
+            del items[index]
+
+    def suggest(self, prefix, limit=5):
+        """Up to `limit` suggestions for keys starting with `prefix`, most stock first, one per book."""
+        prefix = " ".join(normalize(prefix).split())
+        if not prefix:
+            return []
+
+        with self.lock:
+            start = bisect_left(self.keys, (prefix,))
+            end = bisect_left(self.keys, (prefix + "\uffff",), start)
+            if (end - start) ** 2 > limit * len(self.books):
+                top = self.walk_by_stock(prefix, limit)
+            else:
+                top = self.rank_range(start, end, limit)
+            return [self.suggestion(book_id, kind) for book_id, kind in top]
+
+    def rank_range(self, start, end, limit):
+        # A book's best match is its title, then an author, then its ISBN
+        matched = {}
+        for _, book_id, kind in self.keys[start:end]:
+            if book_id not in matched or KIND_ORDER[kind] < KIND_ORDER[matched[book_id]]:
+                matched[book_id] = kind
+        return [(book_id, matched[book_id]) for book_id in heapq.nsmallest(limit, matched, key=self.rank_key)]
+
+    def walk_by_stock(self, prefix, limit):
+        top = []
+        for _, _, book_id in self.by_stock:
+            kinds = [kind for key, _, kind in self.books[book_id]["keys"] if key.startswith(prefix)]
+            if kinds:
+                top.append((book_id, min(kinds, key=KIND_ORDER.get)))
+                if len(top) == limit:
+                    break
+        return top
+
+    def suggestion(self, book_id, kind):
+        book = self.books[book_id]
+        return {
+            "book_id": book_id,
+            "title": book["title"],
+            "authors": book["authors"],
+            "quantity": book["quantity"],
+            "match": kind,
+        }
@@ -5,8 +5,12 @@ import pytest
 
 # Ensure the app reads an in-memory DB before import
 os.environ["dbURL"] = "sqlite:///:memory:"
+# Tests fold new orders into the related-books index themselves
+os.environ["BOOKS_RELATED_REFRESH"] = "0"
+# Every request checks the catalog version, so writes made behind the app's back show up at once
+os.environ["BOOKS_VERSION_POLL"] = "0"
 
-from books.app import app as flask_app  # noqa: E402
+from books.app import app as flask_app, search_index, fuzzy_index, suggest_index, fulltext_index, related_index, catalog_changed  # noqa: E402
 from books.model import db, Book        # noqa: E402
 
 
@@ -86,3 +90,9 @@ def client():
 
         db.session.remove()
         db.drop_all()
+        search_index.clear()
+        fuzzy_index.clear()
+        suggest_index.clear()
+        fulltext_index.clear()
+        related_index.clear()
+        catalog_changed()
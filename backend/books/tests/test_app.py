@@ -392,6 +392,12 @@ def test_decrement_invalid_quantities(client):
                    content_type="application/json")
     assert r.status_code == 400
 
+    # bool (an int subclass)
+    r = client.put(f"/books/{bid}/decrement",
+                   data=json.dumps({"quantity_ordered": True}),
+                   content_type="application/json")
+    assert r.status_code == 400
+
 
 @pytest.mark.integration
 def test_decrement_not_found(client):
@@ -419,4 +425,1245 @@ def test_decrement_conflict_and_success(client):
                    content_type="application/json")
     assert r.status_code == 200
     after_qty = r.get_json()["data"]["quantity"]
-    assert after_qty == sci["quantity"] - 2
\ No newline at end of file
+    assert after_qty == sci["quantity"] - 2
+
+@pytest.mark.integration
+@pytest.mark.parametrize("sort", ["id", "price", "-price", "title", "newest"])
+def test_get_books_cursor_walks_every_row_once(client, sort):
+    seen = []
+    res = client.get(f"/books?cursor=&sort={sort}&limit=2")
+    while True:
+        assert res.status_code == 200
+        body = res.get_json()
+        seen.extend(body["data"])
+        assert "total" not in body["pagination"]
+        if not body["pagination"]["has_more"]:
+            assert body["pagination"]["next_cursor"] is None
+            break
+        res = client.get(f"/books?cursor={body['pagination']['next_cursor']}&limit=2")
+
+    ids = [b["book_id"] for b in seen]
+    assert sorted(ids) == [1, 2, 3, 4, 5]
+    if sort in ("price", "-price"):
+        prices = [float(b["price"]) for b in seen]
+        assert prices == sorted(prices, reverse=sort == "-price")
+    if sort == "newest":
+        assert ids == [5, 4, 3, 2, 1]
+    if sort == "title":
+        titles = [b["title"] for b in seen]
+        assert titles == sorted(titles)
+
+
+@pytest.mark.integration
+def test_get_books_cursor_with_filters_and_count(client):
+    res = client.get("/books?cursor=&genre=Non-fiction&limit=1&count=exact")
+    body = res.get_json()
+    assert res.status_code == 200
+    assert len(body["data"]) == 1
+    assert body["pagination"]["total"] == 2
+    assert body["pagination"]["has_more"] is True
+
+    nxt = body["pagination"]["next_cursor"]
+    res = client.get(f"/books?cursor={nxt}&genre=Non-fiction&limit=1")
+    body = res.get_json()
+    assert len(body["data"]) == 1
+    assert body["data"][0]["genre"] == "Non-fiction"
+    assert body["pagination"]["has_more"] is False
+
+
+@pytest.mark.integration
+def test_get_books_invalid_cursor(client):
+    res = client.get("/books?cursor=not-a-cursor")
+    assert res.status_code == 400
+    assert res.get_json()["message"] == "Invalid cursor."
+
+    for limit in (0, -1):
+        res = client.get(f"/books?cursor=&limit={limit}")
+        assert res.status_code == 400
+        assert res.get_json()["message"] == "limit must be at least 1."
+
+
+@pytest.mark.unit
+def test_search_index_matches_substrings_across_columns():
+    from books.search import SearchIndex
+
+    index = SearchIndex()
+    assert index.search("wizard") is None  # not built yet
+
+    index.build([
+        (1, "The Wizard of Oz", "L. Frank Baum", "111"),
+        (2, "Deep Space", "A. Nova", "222"),
+        (3, "Détective Tales", "J. Doe", "333WZ"),
+    ])
+    assert index.search("WIZARD") == {1}
+    assert index.search("izard of o") == {1}
+    assert index.search("detective") == {3}   # accent-insensitive
+    assert index.search("333w") == {3}
+    assert index.search("space nova") == set()  # never spans two columns
+    assert index.search("zzz") == set()
+    assert index.search("wz") is None          # too short for a trigram
+    assert index.search("wiz%rd") is None      # LIKE wildcard
+
+    index.add(2, "Deep Wizardry", "A. Nova", "222")
+    assert index.search("wizard") == {1, 2}
+    index.remove(1)
+    assert index.search("wizard") == {2}
+
+
+@pytest.mark.integration
+def test_search_index_follows_orm_writes(client):
+    from books.model import db
+
+    assert len(client.get("/books?search=atlas").get_json()["data"]) == 1
+
+    book = db.session.get(Book, 5)
+    book.title = "Premium Globe"
+    db.session.add(Book(
+        title="Pocket Atlas", description=None, ISBN="666", authors="Carto C",
+        publishers=None, format=None, genre="Non-fiction", price=Decimal("5.00"),
+        quantity=1, url=None,
+    ))
+    db.session.commit()
+
+    titles = {b["title"] for b in client.get("/books?search=atlas").get_json()["data"]}
+    assert titles == {"Pocket Atlas"}
+
+    # A rolled-back change never reaches the index or the caches
+    book = db.session.get(Book, 1)
+    book.title = "The Atlas of Oz"
+    db.session.flush()
+    db.session.rollback()
+    titles = {b["title"] for b in client.get("/books?search=atlas").get_json()["data"]}
+    assert titles == {"Pocket Atlas"}
+
+
+@pytest.mark.integration
+def test_broad_search_falls_back_to_scan(client, monkeypatch):
+    import books.app as app_module
+    from sqlalchemy import event as sa_event
+    from books.model import db
+
+    monkeypatch.setattr(app_module, "MAX_SEARCH_IDS", 0)
+    statements = []
+    capture = lambda conn, cursor, statement, *args: statements.append(statement)
+    sa_event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        res = client.get("/books?search=tal")
+    finally:
+        sa_event.remove(db.engine, "before_cursor_execute", capture)
+
+    titles = {b["title"] for b in res.get_json()["data"]}
+    assert titles == {"Detective Tales"}
+    assert any("LIKE" in s.upper() for s in statements)
+
+
+@pytest.mark.integration
+def test_get_book_facets(client):
+    res = client.get("/books/facets")
+    assert res.status_code == 200
+    data = res.get_json()["data"]
+    assert data["total"] == 5
+    assert data["genres"] == [
+        {"genre": "Non-fiction", "count": 2},
+        {"genre": "Fantasy", "count": 1},
+        {"genre": "Mystery", "count": 1},
+        {"genre": "Sci-Fi", "count": 1},
+    ]
+    assert float(data["price"]["min"]) == 4.00
+    assert float(data["price"]["max"]) == 99.99
+    assert data["histogram"] == [
+        {"min": 0, "max": 10, "count": 3},
+        {"min": 10, "max": 20, "count": 1},
+        {"min": 90, "max": 100, "count": 1},
+    ]
+
+
+@pytest.mark.integration
+def test_get_book_facets_with_filters_and_empty(client):
+    data = client.get("/books/facets?min_price=5&bucket_size=50").get_json()["data"]
+    assert data["total"] == 4
+    assert data["histogram"] == [
+        {"min": 0, "max": 50, "count": 3},
+        {"min": 50, "max": 100, "count": 1},
+    ]
+
+    data = client.get("/books/facets?search=atlas").get_json()["data"]
+    assert data["genres"] == [{"genre": "Non-fiction", "count": 1}]
+
+    data = client.get("/books/facets?genre=Nope").get_json()["data"]
+    assert data == {"total": 0, "genres": [], "price": {"min": None, "max": None}, "histogram": []}
+
+
+@pytest.mark.integration
+def test_get_book_facets_cached_until_decrement(client):
+    import books.app as app_module
+
+    client.get("/books/facets?genre=Sci-Fi")
+    assert len(app_module.facet_cache) == 1
+
+    client.put("/books/2/decrement",
+               data=json.dumps({"quantity_ordered": 1}),
+               content_type="application/json")
+    assert len(app_module.facet_cache) == 0
+
+
+@pytest.mark.unit
+def test_get_book_facets_exception_path(monkeypatch, client):
+    import books.app as app_module
+
+    def boom(*_, **__):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(app_module.db.session, "query", boom, raising=True)
+
+    r = client.get("/books/facets")
+    assert r.status_code == 500
+    assert "An error occurred" in r.get_json()["message"]
+
+
+@pytest.mark.unit
+def test_ttl_cache_lru_ttl_and_tags():
+    from books.cache import TTLCache, MISSING
+
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+
+    cache.set("a", 1, tags=["x"])
+    cache.set("b", 2, tags=["x", "y"])
+    assert cache.get("a") == 1            # "a" is now most recently used
+    cache.set("c", 3)                     # evicts "b"
+    assert cache.get("b") is MISSING
+    assert "a" in cache and "c" in cache
+
+    cache.invalidate("x")                 # only "a" is still tagged "x"
+    assert cache.get("a") is MISSING
+    assert cache.get("c") == 3
+
+    now[0] = 11.0                         # past the TTL
+    assert cache.get("c") is MISSING
+
+    assert cache.stats() == {
+        "size": 0, "maxsize": 2, "ttl": 10,
+        "hits": 2, "misses": 3, "evictions": 3,
+    }
+
+
+@pytest.mark.integration
+def test_catalog_cache_serves_repeat_reads_and_evicts_on_decrement(client, monkeypatch):
+    import books.app as app_module
+
+    before = app_module.catalog_cache.stats()
+    first = client.get("/books?genre=Sci-Fi").get_json()
+    other = client.get("/books?genre=Mystery").get_json()
+    client.get("/books/2")
+
+    # Repeat reads are served without touching the database
+    def boom(*_, **__):
+        raise RuntimeError("db hit")
+    monkeypatch.setattr(app_module.db.session, "get", boom, raising=True)
+    monkeypatch.setattr(app_module.db.session, "execute", boom, raising=True)
+    assert client.get("/books?genre=Sci-Fi").get_json() == first
+    assert client.get("/books/2").status_code == 200
+    monkeypatch.undo()
+
+    stats = client.get("/books/cache/stats").get_json()["data"]
+    assert stats["catalog"]["hits"] - before["hits"] == 1
+    assert stats["catalog"]["misses"] - before["misses"] == 2
+    assert stats["fragments"]["size"] == 2
+
+    # Decrementing book 2 only evicts entries that contain it
+    client.put("/books/2/decrement",
+               data=json.dumps({"quantity_ordered": 1}),
+               content_type="application/json")
+    assert client.get("/books?genre=Sci-Fi").get_json()["data"][0]["quantity"] == 4
+    assert client.get("/books/2").get_json()["data"]["quantity"] == 4
+    assert client.get("/books?genre=Mystery").get_json() == other
+
+    stats = client.get("/books/cache/stats").get_json()["data"]["catalog"]
+    assert stats["hits"] - before["hits"] == 2
+    assert stats["misses"] - before["misses"] == 3
+
+
+@pytest.mark.integration
+def test_get_book_by_id_etag_and_304(client, monkeypatch):
+    import books.app as app_module
+
+    r = client.get("/books/2")
+    etag = r.headers["ETag"]
+    assert r.status_code == 200 and etag
+
+    # Matching tag: empty 304 without loading or serializing the book
+    def boom(*_, **__):
+        raise RuntimeError("db hit")
+    monkeypatch.setattr(app_module.db.session, "get", boom, raising=True)
+    monkeypatch.setattr(app_module.catalog_cache, "get", boom, raising=True)
+    r = client.get("/books/2", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.data == b""
+    assert r.headers["ETag"] == etag
+    monkeypatch.undo()
+
+    # Another book's stock change leaves the tag alone; this book's changes it
+    client.put("/books/3/decrement", json={"quantity_ordered": 1})
+    assert client.get("/books/2", headers={"If-None-Match": etag}).status_code == 304
+
+    client.put("/books/2/decrement", json={"quantity_ordered": 1})
+    r = client.get("/books/2", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+    assert r.get_json()["data"]["quantity"] == 4
+
+
+@pytest.mark.integration
+def test_get_books_etag_changes_with_stock(client):
+    r = client.get("/books?genre=Fantasy")
+    etag = r.headers["ETag"]
+    assert client.get("/books?genre=Fantasy", headers={"If-None-Match": etag}).status_code == 304
+
+    client.put("/books/4/decrement", json={"quantity_ordered": 1})
+    r = client.get("/books?genre=Fantasy", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+
+
+@pytest.mark.integration
+def test_etags_follow_writes_made_by_other_processes(client):
+    import books.app as app_module
+    from books.model import db, catalog_version
+
+    r = client.get("/books/1")
+    etag = r.headers["ETag"]
+    client.get("/books?search=wizard")
+    assert app_module.search_index.built
+
+    # Another replica edits the book and bumps the catalog version, as every catalog writer does
+    with db.engine.begin() as connection:
+        connection.execute(Book.__table__.update().where(Book.__table__.c.book_id == 1).values(price=Decimal("1.00")))
+        connection.execute(catalog_version.update().values(version=catalog_version.c.version + 1))
+    # The fixture's app context keeps one session across requests; a real request starts with a fresh one
+    db.session.expire_all()
+    r = client.get("/books/1", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["ETag"] != etag
+    assert r.get_json()["data"]["price"] == "1.00"
+    # Indexes built from the old catalog are dropped too
+    assert not app_module.search_index.built
+
+    # A write nobody announced (manual SQL): the tag still expires with the cache TTL, with the bodies cached under it
+    etag = client.get("/books/1").headers["ETag"]
+    with db.engine.begin() as connection:
+        connection.execute(Book.__table__.update().where(Book.__table__.c.book_id == 1).values(price=Decimal("2.00")))
+    db.session.expire_all()
+    assert client.get("/books/1", headers={"If-None-Match": etag}).status_code == 304
+    app_module.versions.started -= app_module.CACHE_TTL
+    r = client.get("/books/1", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.get_json()["data"]["price"] == "2.00"
+
+
+@pytest.mark.integration
+def test_own_catalog_writes_bump_the_database_version(client):
+    import books.app as app_module
+    from books.model import db, read_catalog_version
+
+    client.get("/books?search=wizard")
+    before = read_catalog_version(db.session)
+    book = db.session.get(Book, 2)
+    book.title = "Deep Space II"
+    db.session.commit()
+    assert read_catalog_version(db.session) == before + 1
+
+    # This process already applied its own write, so its indexes are kept and updated in place
+    assert client.get("/books?search=space ii").get_json()["data"][0]["title"] == "Deep Space II"
+    assert app_module.search_index.built
+
+
+@pytest.mark.integration
+def test_get_books_batch(client):
+    client.get("/books/3")  # one of them comes from the cache
+
+    r = client.post("/books/batch", json={"book_ids": [5, 3, 999, 5, 1]})
+    assert r.status_code == 200
+    body = r.get_json()
+    assert [b["book_id"] for b in body["data"]] == [5, 3, 1]
+    assert body["missing"] == [999]
+    assert body["data"][1] == client.get("/books/3").get_json()["data"]
+    assert set(body["data"][0].keys()) == set(client.get("/books/5").get_json()["data"].keys())
+
+
+@pytest.mark.integration
+@pytest.mark.parametrize("payload", [
+    None,
+    {},
+    {"book_ids": []},
+    {"book_ids": "1,2"},
+    {"book_ids": [1, "2"]},
+    {"book_ids": [True]},
+    {"book_ids": list(range(101))},
+    [{"book_ids": [1]}],
+])
+def test_get_books_batch_invalid(client, payload):
+    r = client.post("/books/batch", json=payload)
+    assert r.status_code == 400
+    assert r.get_json()["code"] == 400
+
+    r = client.post("/books/batch", data="book_ids=1", content_type="text/plain")
+    assert r.status_code == 400
+
+
+@pytest.mark.unit
+def test_get_books_batch_exception_path(monkeypatch, client):
+    import books.app as app_module
+
+    class DummyQuery:
+        def filter(self, *_, **__): raise RuntimeError("boom")
+
+    class DummyBook:
+        query = DummyQuery()
+
+    monkeypatch.setattr(app_module, "Book", DummyBook, raising=False)
+
+    r = client.post("/books/batch", json={"book_ids": [1]})
+    assert r.status_code == 500
+    assert "An error occurred" in r.get_json()["message"]
+
+
+@pytest.mark.integration
+def test_decrement_concurrent_orders_never_oversell(client, tmp_path, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from sqlalchemy import create_engine
+    import books.app as app_module
+    from books.model import db
+
+    # The in-memory fixture DB is one shared connection; give each thread a real connection instead
+    engine = create_engine(f"sqlite:///{tmp_path / 'books.db'}", connect_args={"timeout": 30})
+    monkeypatch.setitem(db.engines, None, engine)
+    db.session.remove()
+    db.create_all()
+    db.session.add(Book(title="Hot Book", ISBN="999", genre="Fantasy", price=Decimal("5.00"), quantity=25))
+    db.session.commit()
+    book_id = db.session.query(Book.book_id).scalar()
+
+    def order(_):
+        with app_module.app.test_client() as c:
+            return c.put(f"/books/{book_id}/decrement", json={"quantity_ordered": 2}).status_code
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        statuses = list(pool.map(order, range(40)))
+
+    assert statuses.count(200) == 12
+    assert statuses.count(409) == 28
+    db.session.remove()
+    assert db.session.get(Book, book_id).quantity == 1
+
+    db.session.remove()
+    engine.dispose()
+
+
+@pytest.mark.integration
+def test_decrement_many_all_or_nothing(client):
+    # Sci-Fi (2) has 5, Cooking (4) has 10, Detective (3) has 1
+    r = client.post("/books/decrement", json={"items": [
+        {"book_id": 4, "quantity_ordered": 3},
+        {"book_id": 2, "quantity_ordered": 1},
+        {"book_id": 4, "quantity_ordered": 2},
+    ]})
+    assert r.status_code == 200
+    results = r.get_json()["data"]
+    assert [(x["book_id"], x["quantity_ordered"], x["code"]) for x in results] == [(2, 1, 200), (4, 5, 200)]
+    assert results[0]["data"]["quantity"] == 4
+    assert results[1]["data"]["quantity"] == 5
+    assert client.get("/books/4").get_json()["data"]["quantity"] == 5
+
+    # One bad line: nothing changes, every line gets a reason
+    r = client.post("/books/decrement", json={"items": [
+        {"book_id": 2, "quantity_ordered": 1},
+        {"book_id": 3, "quantity_ordered": 2},
+        {"book_id": 999, "quantity_ordered": 1},
+    ]})
+    assert r.status_code == 409
+    results = r.get_json()["data"]
+    assert [(x["book_id"], x["code"]) for x in results] == [(2, 200), (3, 409), (999, 404)]
+    assert client.get("/books/2").get_json()["data"]["quantity"] == 4
+    assert client.get("/books/3").get_json()["data"]["quantity"] == 1
+
+
+@pytest.mark.integration
+@pytest.mark.parametrize("payload", [
+    None,
+    {"items": []},
+    {"items": {"book_id": 1, "quantity_ordered": 1}},
+    {"items": [{"book_id": 1}]},
+    {"items": [{"book_id": 1, "quantity_ordered": 0}]},
+    {"items": [{"book_id": "1", "quantity_ordered": 1}]},
+    {"items": [{"book_id": 1, "quantity_ordered": True}]},
+    {"items": [{"book_id": True, "quantity_ordered": 1}]},
+    [{"book_id": 1, "quantity_ordered": 1}],
+])
+def test_decrement_many_invalid(client, payload):
+    r = client.post("/books/decrement", json=payload)
+    assert r.status_code == 400
+    assert client.get("/books/1").get_json()["data"]["quantity"] == 3
+
+    r = client.post("/books/decrement", data="not json", content_type="application/json")
+    assert r.status_code == 400
+
+
+@pytest.mark.unit
+def test_decrement_many_commit_exception(monkeypatch, client):
+    import books.app as app_module
+
+    def boom():
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(app_module.db.session, "commit", boom, raising=True)
+
+    r = client.post("/books/decrement", json={"items": [{"book_id": 1, "quantity_ordered": 1}]})
+    assert r.status_code == 500
+    assert "An error occurred" in r.get_json()["message"]
+
+
+@pytest.mark.unit
+def test_book_json_with_fields_only_reads_those_attributes():
+    b = Book(title="Untitled", ISBN="000", genre="Fantasy", price=Decimal("1.00"), quantity=0)
+    b.book_id = 1
+    assert b.json(("book_id", "title")) == {"book_id": 1, "title": "Untitled"}
+
+
+@pytest.mark.integration
+def test_get_books_sparse_fieldset_skips_unrequested_columns(client):
+    from sqlalchemy import event as sa_event
+    from books.model import db
+
+    statements = []
+    def capture(conn, cursor, statement, *_):
+        statements.append(statement)
+    sa_event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        res = client.get("/books?fields=title,price,bogus&limit=2")
+        cursor_res = client.get("/books?cursor=&sort=price&fields=title&limit=2")
+    finally:
+        sa_event.remove(db.engine, "before_cursor_execute", capture)
+
+    for r in (res, cursor_res):
+        assert r.status_code == 200
+    assert all(set(b.keys()) == {"book_id", "title", "price"} for b in res.get_json()["data"])
+    assert all(set(b.keys()) == {"book_id", "title"} for b in cursor_res.get_json()["data"])
+    assert cursor_res.get_json()["pagination"]["next_cursor"]
+
+    selects = [s for s in statements if "FROM" in s and "count" not in s.lower()]
+    assert selects and all("description" not in s for s in selects)
+
+    # No valid names -> full rows
+    full = client.get("/books?fields=bogus").get_json()["data"]
+    assert "description" in full[0]
+
+    # Just book_id is still an explicit projection
+    ids = client.get("/books?fields=book_id&limit=2").get_json()["data"]
+    assert ids == [{"book_id": 1}, {"book_id": 2}]
+    assert client.get("/books/3?fields=book_id").get_json()["data"] == {"book_id": 3}
+
+
+@pytest.mark.integration
+def test_get_book_by_id_sparse_fieldset(client):
+    r = client.get("/books/3?fields=title,quantity")
+    assert r.get_json()["data"] == {"book_id": 3, "title": "Detective Tales", "quantity": 1}
+
+    # Projection of an already cached full row
+    client.get("/books/2")
+    r = client.get("/books/2?fields=genre")
+    assert r.get_json()["data"] == {"book_id": 2, "genre": "Sci-Fi"}
+
+    assert client.get("/books/999?fields=title").status_code == 404
+
+
+@pytest.mark.integration
+def test_list_responses_match_plain_jsonify(client):
+    import books.app as app_module
+    from books.model import db
+
+    body = client.get("/books?limit=3").data
+    with app_module.app.test_request_context():
+        books = db.session.query(Book).filter(Book.book_id.in_([1, 2, 3])).all()
+        expected = app_module.jsonify({
+            "code": 200,
+            "data": [b.json() for b in books],
+            "pagination": {"page": 1, "limit": 3, "total": 5, "has_more": True},
+        }).data
+    assert body == expected
+
+    # A stock change refreshes just that book's fragment
+    client.put("/books/1/decrement", json={"quantity_ordered": 1})
+    data = client.get("/books?limit=3").get_json()["data"]
+    assert [b["quantity"] for b in data] == [2, 5, 1]
+
+
+@pytest.mark.unit
+def test_catalog_snapshot_masks_and_orders():
+    from books.snapshot import CatalogSnapshot
+
+    snap = CatalogSnapshot()
+    snap.build(
+        [
+            (1, "Fantasy", Decimal("9.99"), 3),
+            (2, "Sci-Fi", Decimal("14.50"), 0),
+            (4, "Fantasy", Decimal("4.00"), 1),
+            (7, "Fantasy", Decimal("9.99"), 2),
+        ],
+        orders={"title": [7, 2, 1, 4]}
+    )
+
+    assert snap.page({"genre": "Fantasy"}) == ([1, 4, 7], 3)
+    assert snap.page({"genre": "Horror"}) == ([], 0)
+    assert snap.page({"min_price": 9.99, "max_price": 14.5}) == ([1, 2, 7], 3)
+    assert snap.page({"in_stock": True}, sort="price") == ([4, 1, 7], 3)
+    assert snap.page({"book_ids": {2, 7}}, sort="title") == ([7, 2], 2)
+
+    # Offsets, cursors (right after a book) and descending order
+    assert snap.page({}, sort="price", offset=1, limit=2) == ([1, 7], 4)
+    assert snap.page({}, sort="price", after=1) == ([7, 2], 4)
+    assert snap.page({}, sort="price", descending=True, after=7) == ([1, 4], 4)
+    assert snap.page({}, after=3) is None
+
+    # Stock changes apply in place; an unknown book drops the snapshot
+    snap.set_quantity(2, 5)
+    assert snap.page({"in_stock": True}) == ([1, 2, 4, 7], 4)
+    snap.set_quantity(99, 1)
+    assert snap.built is False and snap.page({}) is None
+
+    # A write that lands while rows are being read discards the build
+    def racing_rows():
+        yield (1, "Fantasy", Decimal("9.99"), 3)
+        snap.clear()
+
+    snap.build(racing_rows())
+    assert snap.built is False
+
+
+@pytest.fixture()
+def snapshot_mode(monkeypatch):
+    import books.app as app_module
+    monkeypatch.setattr(app_module, "SNAPSHOT_MODE", True)
+    app_module.catalog_changed()
+    yield app_module
+    app_module.catalog_changed()
+
+
+@pytest.mark.integration
+def test_snapshot_mode_matches_sql(client, monkeypatch):
+    import books.app as app_module
+
+    queries = [
+        "/books",
+        "/books?limit=2&page=2",
+        "/books?genre=Non-fiction",
+        "/books?min_price=5&max_price=15&limit=1&page=2",
+        "/books?search=wiz",
+        "/books?search=de&genre=Mystery",
+        "/books?in_stock=1&fields=title,quantity",
+        "/books?cursor=&sort=price&limit=2&count=exact",
+        "/books?cursor=&sort=title&limit=2&fields=title",
+        "/books?cursor=&sort=-price&limit=2",
+        "/books?sort=-price&limit=2&page=2",
+        "/books?sort=newest&genre=Non-fiction",
+        "/books?sort=title&in_stock=1&fields=title",
+    ]
+
+    def fetch_all():
+        pages = []
+        for url in queries:
+            body = client.get(url).get_json()
+            pages.append(body)
+            # Follow cursors to the end so seeking is compared too
+            while body["pagination"].get("next_cursor"):
+                body = client.get(url.replace("cursor=", f"cursor={body['pagination']['next_cursor']}", 1)).get_json()
+                pages.append(body)
+        return pages
+
+    via_sql = fetch_all()
+    monkeypatch.setattr(app_module, "SNAPSHOT_MODE", True)
+    app_module.catalog_changed()
+
+    assert fetch_all() == via_sql
+    assert app_module.catalog_snapshot.built
+
+
+@pytest.mark.integration
+def test_snapshot_follows_stock_changes(client, snapshot_mode):
+    assert len(client.get("/books?in_stock=1").get_json()["data"]) == 5
+
+    # Book 3 sells out: it leaves ?in_stock listings without the snapshot being rebuilt
+    client.put("/books/3/decrement", json={"quantity_ordered": 1})
+    assert snapshot_mode.catalog_snapshot.built
+    data = client.get("/books?in_stock=1").get_json()["data"]
+    assert [b["book_id"] for b in data] == [1, 2, 4, 5]
+    assert client.get("/books?in_stock=1&genre=Mystery").get_json()["data"] == []
+
+    client.post("/books/decrement", json={"items": [{"book_id": 5, "quantity_ordered": 2}]})
+    data = client.get("/books?in_stock=true").get_json()["data"]
+    assert [b["book_id"] for b in data] == [1, 2, 4]
+
+    stats = client.get("/books/cache/stats").get_json()["data"]["snapshot"]
+    assert stats == {"enabled": True, "built": True, "size": 5}
+
+
+@pytest.mark.integration
+def test_fragments_expire_so_outside_writes_show_up(client, monkeypatch):
+    import time
+    import books.app as app_module
+    from sqlalchemy import text
+    from books.model import db
+
+    assert client.get("/books/1").get_json()["data"]["quantity"] == 3
+
+    # A write that bypasses this process's hooks (manual restock, another replica)
+    db.session.execute(text("UPDATE Books SET quantity = 99 WHERE book_id = 1"))
+    db.session.commit()
+    assert client.get("/books/1").get_json()["data"]["quantity"] == 3
+
+    client.get("/books")
+
+    # Once the ttl has passed, both the fragment and the cached page are reloaded
+    later = time.monotonic() + app_module.CACHE_TTL + 1
+    monkeypatch.setattr(app_module.book_fragments, "clock", lambda: later)
+    monkeypatch.setattr(app_module.catalog_cache, "clock", lambda: later)
+    assert client.get("/books/1").get_json()["data"]["quantity"] == 99
+    assert client.get("/books").get_json()["data"][0]["quantity"] == 99
+
+
+@pytest.mark.integration
+def test_get_books_count_modes(client, monkeypatch):
+    import books.app as app_module
+    from sqlalchemy import event as sa_event
+    from books.model import db
+
+    statements = []
+    capture = lambda conn, cursor, statement, *args: statements.append(statement)
+
+    def counted(url):
+        statements.clear()
+        sa_event.listen(db.engine, "before_cursor_execute", capture)
+        try:
+            body = client.get(url).get_json()
+        finally:
+            sa_event.remove(db.engine, "before_cursor_execute", capture)
+        return body["pagination"], sum("count(" in s.lower() for s in statements)
+
+    # none: no COUNT(*), has_more from the extra row
+    pg, counts = counted("/books?limit=2&count=none")
+    assert pg == {"page": 1, "limit": 2, "has_more": True} and counts == 0
+    pg, counts = counted("/books?limit=2&page=3&count=none")
+    assert pg["has_more"] is False and counts == 0
+
+    # estimate: the cached facets for the same filters already hold the total
+    client.get("/books/facets?genre=Non-fiction")
+    pg, counts = counted("/books?genre=Non-fiction&limit=1&count=estimate")
+    assert pg == {"page": 1, "limit": 1, "total": 2, "total_estimated": False, "has_more": True}
+    assert counts == 0
+
+    # estimate on an unfiltered listing uses table statistics
+    monkeypatch.setattr(app_module, "table_rows", lambda: 1000)
+    pg, counts = counted("/books?limit=2&count=estimate")
+    assert pg["total"] == 1000 and pg["total_estimated"] is True and counts == 0
+
+    # Without either, estimate counts; unknown modes keep the default
+    pg, counts = counted("/books?genre=Mystery&count=estimate")
+    assert pg["total"] == 1 and counts == 1
+    pg, _ = counted("/books?count=bogus")
+    assert pg["total"] == 5
+
+    # Cursor mode accepts the same values
+    pg, counts = counted("/books?cursor=&limit=2&count=estimate")
+    assert pg["total"] == 1000 and counts == 0
+
+
+@pytest.mark.unit
+def test_suggest_index_prefixes_and_ranking():
+    from books.suggest import SuggestIndex
+
+    index = SuggestIndex()
+    index.build([
+        (1, "The Wizard of Oz", "L. Frank Baum", "111", 3),
+        (2, "Wizards Abroad", "Ann Émile, Bo Wiz", "222", 9),
+        (3, "Deep Space", "A. Nova", "9780001", 0),
+    ])
+
+    # Word starts inside titles, authors (accents folded) and ISBNs all match
+    assert [s["book_id"] for s in index.suggest("WIZ")] == [2, 1]
+    assert index.suggest("wiz")[0]["match"] == "title"
+    assert index.suggest("emi") == [
+        {"book_id": 2, "title": "Wizards Abroad", "authors": "Ann Émile, Bo Wiz", "quantity": 9, "match": "author"}
+    ]
+    assert [s["book_id"] for s in index.suggest("978")] == [3]
+    assert [s["book_id"] for s in index.suggest("of  oz")] == [1]
+    assert index.suggest("") == [] and index.suggest("zzz") == []
+    assert len(index.suggest("w", limit=1)) == 1
+
+    # Stock changes re-rank (also for memoized short prefixes); writes update the keys
+    assert [s["book_id"] for s in index.suggest("w")] == [2, 1]
+    index.set_stock(1, 50)
+    assert [s["book_id"] for s in index.suggest("w")] == [1, 2]
+    index.add(3, "Wizard Space", "A. Nova", "9780001", 0)
+    assert [s["book_id"] for s in index.suggest("wizard")] == [1, 2, 3]
+    assert index.suggest("deep") == []
+    index.remove(1)
+    assert [s["book_id"] for s in index.suggest("wizard")] == [2, 3]
+
+
+@pytest.mark.integration
+def test_get_book_suggestions(client):
+    from books.model import db
+
+    res = client.get("/books/suggest?q=de")
+    assert res.status_code == 200
+    # Deep Space (5 in stock) before Detective Tales (1)
+    assert [s["title"] for s in res.get_json()["data"]] == ["Deep Space", "Detective Tales"]
+
+    client.put("/books/2/decrement", json={"quantity_ordered": 5})
+    titles = [s["title"] for s in client.get("/books/suggest?q=de").get_json()["data"]]
+    assert titles == ["Detective Tales", "Deep Space"]
+
+    book = db.session.get(Book, 4)
+    book.title = "Delicious Budget Cooking"
+    db.session.commit()
+    titles = [s["title"] for s in client.get("/books/suggest?q=de&limit=1").get_json()["data"]]
+    assert titles == ["Delicious Budget Cooking"]
+
+    assert client.get("/books/suggest").get_json()["data"] == []
+    assert client.get("/books/suggest?q=atl&limit=0").get_json()["data"][0]["book_id"] == 5
+
+
+@pytest.mark.unit
+def test_fuzzy_index_scores_misspellings():
+    from books.search import FuzzyIndex
+
+    index = FuzzyIndex()
+    index.build([
+        (1, "Harry Potter and the Philosopher's Stone", "J. K. Rowling"),
+        (2, "Happy Days", "Someone Else"),
+        (3, "The Potter's Wheel", "Harriet Stone"),
+    ])
+
+    results = index.search("hary poter")
+    assert [book_id for book_id, _ in results] == [1, 3]
+    assert results[0][1] == pytest.approx(9 / 11)
+    assert index.search("hary poter", threshold=0.8) == results[:1]
+
+    # Authors count too; a lower threshold lets weaker matches through, best first
+    assert [book_id for book_id, _ in index.search("rowlin")] == [1]
+    assert [book_id for book_id, _ in index.search("potter stone", threshold=0.3)] == [3, 1]
+    assert index.search("zzzz") == [] and index.search("") == []
+
+    index.remove(1)
+    assert [book_id for book_id, _ in index.search("hary poter")] == [3]
+    index.add(2, "Harry Potter", None)
+    assert [book_id for book_id, _ in index.search("hary poter")] == [2, 3]
+
+
+@pytest.mark.integration
+def test_get_books_fuzzy_search(client):
+    from books.model import db
+
+    assert client.get("/books?search=wizzard").get_json()["data"] == []
+
+    body = client.get("/books?search=wizzard%20of%20oz&fuzzy=1").get_json()
+    assert [b["title"] for b in body["data"]] == ["The Wizard of Oz"]
+    assert body["pagination"]["total"] == 1
+
+    # Results are ordered by similarity, not by id
+    db.session.add(Book(
+        title="Wizard", description=None, ISBN="777", authors="Nobody",
+        publishers=None, format=None, genre="Fantasy", price=Decimal("3.00"),
+        quantity=1, url=None,
+    ))
+    db.session.commit()
+    titles = [b["title"] for b in client.get("/books?search=wizard&fuzzy=1").get_json()["data"]]
+    assert titles == ["Wizard", "The Wizard of Oz"]
+
+    # Combines with the other filters
+    assert client.get("/books?search=wizzard&fuzzy=1&max_price=5").get_json()["data"][0]["title"] == "Wizard"
+
+
+@pytest.mark.unit
+def test_fulltext_index_ranks_with_bm25(tmp_path):
+    from books.fulltext import FullTextIndex, tokenize
+
+    assert tokenize("The Mysteries of the exploring Crews") == ["mystery", "explor", "crew"]
+
+    index = FullTextIndex()
+    index.build([
+        (1, "Dune", "Frank Herbert", "A desert planet, its spice and the people who explore it."),
+        (2, "Sand", "Someone", "Desert after desert: stories of deserts and the dunes between them."),
+        (3, "Desert", "Nobody", "A novel."),
+        (4, "Cooking", "Chef", None),
+    ])
+
+    # Title words weigh more than description words; more mentions rank higher
+    assert [book_id for book_id, _ in index.search("deserts")] == [3, 2, 1]
+    assert [book_id for book_id, _ in index.search("explored planets")] == [1]
+    assert [book_id for book_id, _ in index.search("desert", limit=1)] == [3]
+    assert index.search("the of and") is None and index.search("zebra") == []
+
+    index.remove(3)
+    assert [book_id for book_id, _ in index.search("desert")] == [2, 1]
+    index.add(4, "Cooking in the Desert", "Chef", None)
+    assert 4 in [book_id for book_id, _ in index.search("desert")]
+
+    # A saved index is only reused for the catalog it was built from
+    path = tmp_path / "fulltext.idx"
+    index.save(path, fingerprint=(3, 4))
+    loaded = FullTextIndex()
+    assert not loaded.load(path, fingerprint=(3, 5)) and not loaded.built
+    assert not loaded.load(tmp_path / "missing.idx", fingerprint=(3, 4))
+    assert loaded.load(path, fingerprint=(3, 4)) and loaded.built
+    assert loaded.search("desert") == index.search("desert")
+    loaded.remove(4)
+    assert [book_id for book_id, _ in loaded.search("desert")] == [2, 1]
+
+    # The file is plain data; anything else, such as a pickle from an older version, is ignored
+    import pickle
+    path.write_bytes(pickle.dumps({"format": 1, "fingerprint": (3, 4)}))
+    assert not FullTextIndex().load(path, fingerprint=(3, 4))
+    path.write_text('{"format": 2, "fingerprint": [3, 4], "postings": []}')
+    assert not FullTextIndex().load(path, fingerprint=(3, 4))
+
+
+@pytest.mark.integration
+def test_get_books_fulltext_search(client, tmp_path, monkeypatch):
+    import books.app as app_mod
+    from books.model import db
+
+    # Descriptions aren't part of ?search=, but are of ?q=
+    assert client.get("/books?search=galaxies").get_json()["data"] == []
+    body = client.get("/books?q=galaxy").get_json()
+    assert [b["title"] for b in body["data"]] == ["Deep Space"]
+    assert body["pagination"]["total"] == 1
+
+    # Ordered by relevance; combines with the other filters
+    book = db.session.get(Book, 3)
+    book.description = "Mysteries, mysteries and more mysteries."
+    db.session.commit()
+    db.session.add(Book(
+        title="A Fantasy Mystery", description="One mystery.", ISBN="777", authors="Nobody",
+        publishers=None, format=None, genre="Fantasy", price=Decimal("3.00"), quantity=1, url=None,
+    ))
+    db.session.commit()
+    titles = [b["title"] for b in client.get("/books?q=mystery").get_json()["data"]]
+    assert titles == ["A Fantasy Mystery", "Detective Tales"]
+    assert [b["book_id"] for b in client.get("/books?q=mystery&genre=Mystery").get_json()["data"]] == [3]
+    assert len(client.get("/books?q=the").get_json()["data"]) == 6
+
+    # Deleted books drop out
+    db.session.delete(db.session.get(Book, 6))
+    db.session.commit()
+    assert [b["book_id"] for b in client.get("/books?q=mystery").get_json()["data"]] == [3]
+
+    # Saved to BOOKS_FTS_PATH, reloaded while the catalog is unchanged, discarded once it changes
+    path = tmp_path / "fulltext.idx"
+    monkeypatch.setattr(app_mod, "FULLTEXT_PATH", str(path))
+    app_mod.fulltext_index.clear()
+    assert client.get("/books?q=atlas").get_json()["data"][0]["book_id"] == 5
+    assert path.exists()
+
+    app_mod.fulltext_index.clear()
+    monkeypatch.setattr(app_mod.fulltext_index, "build", lambda rows: pytest.fail("rebuilt"))
+    assert client.get("/books?q=recipes").get_json()["data"][0]["book_id"] == 4
+    monkeypatch.undo()
+
+    monkeypatch.setattr(app_mod, "FULLTEXT_PATH", str(path))
+    db.session.get(Book, 4).description = "Nothing about food."
+    db.session.commit()
+    assert not path.exists()
+    assert client.get("/books?q=recipes").get_json()["data"] == []
+
+
+@pytest.mark.integration
+def test_get_books_page_sort(client):
+    def ids(url):
+        return [b["book_id"] for b in client.get(url).get_json()["data"]]
+
+    # Prices: 1 = 9.99, 2 = 14.50, 3 = 7.25, 4 = 4.00, 5 = 99.99
+    assert ids("/books?sort=price") == [4, 3, 1, 2, 5]
+    assert ids("/books?sort=-price") == [5, 2, 1, 3, 4]
+    assert ids("/books?sort=title") == [4, 2, 3, 5, 1]
+    assert ids("/books?sort=newest") == [5, 4, 3, 2, 1]
+    assert ids("/books?sort=-price&limit=2&page=2") == [1, 3]
+    assert ids("/books?sort=-price&genre=Non-fiction") == [5, 4]
+
+    # Unknown keys fall back to book_id order; an explicit sort overrides relevance
+    assert ids("/books?sort=bogus") == [1, 2, 3, 4, 5]
+    assert ids("/books?q=atlas%20recipes&sort=newest") == [5, 4]
+
+
+# Every sort with no filter or a genre; a price range is index-ordered only when sorting by price
+SORTED_LISTINGS = [
+    (filters, sort)
+    for filters in ({}, {"genre": "Fantasy"})
+    for sort in ("price", "-price", "title", "newest")
+] + [
+    (filters, sort)
+    for filters in ({"min_price": 5, "max_price": 20}, {"genre": "Fantasy", "min_price": 5})
+    for sort in ("price", "-price")
+]
+
+
+@pytest.mark.integration
+@pytest.mark.parametrize("filters, sort", SORTED_LISTINGS)
+def test_sorted_listing_reads_an_index_in_order(client, filters, sort):
+    import books.app as app_module
+    from books.model import db
+
+    with app_module.app.test_request_context():
+        query = app_module.apply_filters(Book.query, {**app_module.book_filters(), **filters})
+        query = app_module.seek(query.with_entities(Book.book_id), sort).limit(8)
+        sql = str(query.statement.compile(db.engine, compile_kwargs={"literal_binds": True}))
+        plan = " | ".join(row[-1] for row in db.session.execute(db.text(f"EXPLAIN QUERY PLAN {sql}")))
+
+    # A TEMP B-TREE is SQLite's filesort
+    assert "TEMP B-TREE" not in plan, plan
+    assert "INDEX" in plan or (sort == "newest" and not filters), plan
+
+
+@pytest.mark.integration
+def test_import_books_upserts_and_reports_rejects(client, tmp_path):
+    from books.app import app
+    from books.model import db
+
+    feed = tmp_path / "feed.csv"
+    feed.write_text(
+        "title,ISBN,authors,genre,price,quantity\n"
+        "New Book,978-0-00-000001-1,Ann,Fantasy,12.50,4\n"
+        "The Wizard of Oz (Reissue),111,L. Frank Baum,Fantasy,11.00,8\n"
+        "No Price,9780000000028,Bob,Fantasy,,1\n"
+        "Bad Quantity,9780000000035,Bob,Fantasy,5,-2\n"
+        "New Book (corrected),9780000000011,Ann,Fantasy,13.00,5\n"
+    )
+    rejects = tmp_path / "rejects.jsonl"
+
+    result = app.test_cli_runner().invoke(args=["import-books", str(feed), "--rejects", str(rejects)])
+    assert result.exit_code == 0, result.output
+    assert "Imported 2 books (1 duplicate ISBNs merged), rejected 2, read 5 records" in result.output
+
+    # Existing ISBNs are updated in place, and the last record for an ISBN wins
+    assert db.session.query(Book).count() == 6
+    oz = Book.query.filter_by(ISBN="111").one()
+    assert (oz.book_id, oz.title, oz.quantity) == (1, "The Wizard of Oz (Reissue)", 8)
+    new = Book.query.filter_by(ISBN="9780000000011").one()
+    assert (new.title, new.price) == ("New Book (corrected)", Decimal("13.00"))
+
+    logged = [json.loads(line) for line in rejects.read_text().splitlines()]
+    assert [(r["record"], r["reason"]) for r in logged] == [
+        (3, "price is required"), (4, "quantity must be a non-negative integer"),
+    ]
+    assert not (tmp_path / "feed.csv.checkpoint").exists()
+
+
+@pytest.mark.integration
+def test_running_service_sees_imported_books(client, tmp_path):
+    from books.app import app
+    from books.model import db
+
+    etag = client.get("/books/1").headers["ETag"]
+    assert client.get("/books?search=reissue").get_json()["data"] == []
+    assert client.get("/books/suggest?q=new").get_json()["data"] == []
+
+    feed = tmp_path / "feed.csv"
+    feed.write_text(
+        "title,ISBN,authors,genre,price,quantity\n"
+        "New Book,9780000000011,Ann,Fantasy,12.50,4\n"
+        "The Wizard of Oz (Reissue),111,L. Frank Baum,Fantasy,11.00,8\n"
+    )
+    result = app.test_cli_runner().invoke(args=["import-books", str(feed)])
+    assert result.exit_code == 0, result.output
+    # The fixture's app context keeps one session across requests; a real request starts with a fresh one
+    db.session.expire_all()
+
+    r = client.get("/books/1", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.get_json()["data"]["price"] == "11.00"
+    assert [b["book_id"] for b in client.get("/books?search=reissue").get_json()["data"]] == [1]
+    assert [b["title"] for b in client.get("/books/suggest?q=new").get_json()["data"]] == ["New Book"]
+
+
+@pytest.mark.integration
+def test_import_books_resumes_from_checkpoint(client, tmp_path, monkeypatch):
+    import books.importer as importer
+    from books.app import app
+    from books.model import db
+
+    feed = tmp_path / "feed.jsonl"
+    feed.write_text("\n".join(
+        json.dumps({"title": f"Book {i}", "ISBN": f"97800000{i:05d}", "genre": "Poetry", "price": 3, "quantity": i})
+        for i in range(1, 6)
+    ) + "\nnot json\n")
+    checkpoint = tmp_path / "feed.jsonl.checkpoint"
+
+    # The third batch fails to commit
+    commit, calls = db.session.commit, []
+    def flaky_commit():
+        calls.append(1)
+        if len(calls) == 3:
+            raise RuntimeError("connection lost")
+        commit()
+    monkeypatch.setattr(importer.db.session, "commit", flaky_commit)
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["import-books", str(feed), "--batch-size", "2"])
+    assert result.exit_code != 0
+    assert json.loads(checkpoint.read_text())["record"] == 4
+    assert db.session.query(Book).count() == 9
+
+    monkeypatch.undo()
+    result = runner.invoke(args=["import-books", str(feed), "--batch-size", "2"])
+    assert result.exit_code == 0, result.output
+    assert "Resuming after record 4" in result.output
+    assert "Imported 5 books" in result.output and "rejected 1" in result.output
+    assert db.session.query(Book).count() == 10
+    assert not checkpoint.exists()
+
+    # A checkpoint from another feed is refused rather than silently skipping records
+    checkpoint.write_text(json.dumps({"feed": ["elsewhere", 1, 1], "record": 3, "stats": {}}))
+    result = runner.invoke(args=["import-books", str(feed)])
+    assert result.exit_code != 0 and "--restart" in result.output
+    assert runner.invoke(args=["import-books", str(feed), "--restart"]).exit_code == 0
+
+
+@pytest.mark.integration
+def test_export_books_streams_ndjson_and_csv(client, monkeypatch):
+    import csv
+    import gzip
+    import io
+    import books.app as app_module
+
+    # Several small chunks, as a large catalog would produce
+    monkeypatch.setattr(app_module, "EXPORT_BATCH", 2)
+
+    res = client.get("/books/export")
+    assert res.status_code == 200 and res.is_streamed
+    assert res.mimetype == "application/x-ndjson"
+    rows = [json.loads(line) for line in res.get_data().splitlines()]
+    assert [r["book_id"] for r in rows] == [1, 2, 3, 4, 5]
+    assert rows[0] == client.get("/books/1").get_json()["data"]
+
+    res = client.get("/books/export?format=csv&fields=title,price&genre=Non-fiction")
+    assert res.mimetype == "text/csv" and "books.csv" in res.headers["Content-Disposition"]
+    assert list(csv.reader(io.StringIO(res.get_data(as_text=True)))) == [
+        ["book_id", "title", "price"], ["4", "Budget Cooking", "4.00"], ["5", "Premium Atlas", "99.99"],
+    ]
+    assert client.get("/books/export?format=csv&genre=None").get_data(as_text=True).startswith("book_id,title,")
+
+    # Compressed when the client accepts gzip
+    res = client.get("/books/export?in_stock=1", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["Content-Encoding"] == "gzip" and res.headers["Vary"] == "Accept-Encoding"
+    assert len(gzip.decompress(res.get_data()).splitlines()) == 5
+
+    res = client.get("/books/export?format=xml")
+    assert res.status_code == 400
+
+
+@pytest.mark.integration
+def test_export_books_reads_keyset_batches(client, monkeypatch):
+    from sqlalchemy import event as sa_event
+    import books.app as app_module
+    from books.model import db
+
+    monkeypatch.setattr(app_module, "EXPORT_BATCH", 2)
+    statements = []
+    capture = lambda conn, cursor, statement, parameters, *args: statements.append((statement, parameters))
+    sa_event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        res = client.get("/books/export?format=csv&fields=title")
+        rows = res.get_data(as_text=True).splitlines()
+    finally:
+        sa_event.remove(db.engine, "before_cursor_execute", capture)
+
+    assert rows[1:] == ["1,The Wizard of Oz", "2,Deep Space", "3,Detective Tales", "4,Budget Cooking", "5,Premium Atlas"]
+    # Every batch is its own bounded query, resuming after the last book_id sent
+    pages = [(statement, parameters) for statement, parameters in statements if "Books" in statement]
+    assert len(pages) == 3
+    assert all("LIMIT" in statement for statement, _ in pages)
+    assert [parameters[0] for _, parameters in pages[1:]] == [2, 4]
+
+
+@pytest.mark.integration
+def test_export_books_exception_path(monkeypatch, client):
+    import books.app as app_module
+    monkeypatch.setattr(app_module, "apply_filters", lambda *a, **k: (_ for _ in ()).throw(RuntimeError("boom")))
+    res = client.get("/books/export")
+    assert res.status_code == 500
+    assert "boom" in res.get_json()["message"]
+
+
+@pytest.mark.unit
+def test_related_index_counts_co_purchases(monkeypatch):
+    import books.related as related
+    from books.related import RelatedIndex
+
+    # (order_id, user_id, book_id): user 1 bought 1, 2, 3; user 2 bought 1, 2; user 3 bought 1, 4 (twice)
+    completed = [(1, 1, 1), (2, 1, 2), (3, 1, 3), (4, 2, 1), (5, 2, 2), (6, 3, 1), (7, 3, 4), (8, 3, 4)]
+    index = RelatedIndex(k=2)
+    index.build(completed, watermark=8)
+
+    assert index.related(1, 5) == [(2, 2), (3, 1)]  # k caps the table at 2
+    assert index.related(4, 5) == [(1, 1)]
+    assert index.related(99, 5) == []
+
+    # Incremental updates give what a rebuild would
+    later = [(9, 2, 3), (10, 4, 3), (11, 4, 2)]
+    assert index.apply(later, watermark=11) == 3
+    assert index.apply(later, watermark=11) == 0  # already counted
+    rebuilt = RelatedIndex(k=2)
+    rebuilt.build(completed + later, watermark=11)
+    for book_id in (1, 2, 3, 4):
+        assert index.related(book_id, 5) == rebuilt.related(book_id, 5)
+
+    # Folding the overlay into the arrays changes nothing
+    monkeypatch.setattr(related, "MERGE_AT", 1)
+    index.apply([(12, 5, 4), (13, 5, 2)], watermark=13)
+    rebuilt.build(completed + later + [(12, 5, 4), (13, 5, 2)], watermark=13)
+    assert not index.extra
+    for book_id in (1, 2, 3, 4):
+        assert index.related(book_id, 5) == rebuilt.related(book_id, 5)
+
+    # Huge baskets are left out of the counts
+    monkeypatch.setattr(related, "MAX_BASKET", 2)
+    index.build(completed, watermark=8)
+    assert index.related(3, 5) == []
+
+
+@pytest.mark.integration
+def test_get_related_books(client):
+    import books.app as app_module
+    from books.model import db, orders
+
+    def place(order_id, user_id, book_id, status="completed"):
+        db.session.execute(orders.insert().values(order_id=order_id, user_id=user_id, book_id=book_id, status=status))
+        db.session.commit()
+
+    for order in [(1, 1, 1), (2, 1, 2), (3, 2, 1), (4, 2, 2), (5, 2, 3)]:
+        place(*order)
+    place(6, 3, 1, "pending")
+    place(7, 3, 5)
+
+    body = client.get("/books/1/related").get_json()
+    assert [b["book_id"] for b in body["data"]] == [2, 3]
+    assert body["data"][0] == client.get("/books/2").get_json()["data"]
+    assert [b["book_id"] for b in client.get("/books/1/related?limit=1").get_json()["data"]] == [2]
+    assert client.get("/books/4/related").get_json()["data"] == []
+    assert client.get("/books/999/related").status_code == 404
+
+    # Order 6 completes after order 7 was counted; the watermark stayed below it, so it still counts
+    db.session.execute(orders.update().where(orders.c.order_id == 6).values(status="completed"))
+    db.session.commit()
+    place(8, 3, 4)
+    assert app_module.refresh_related() == 2
+    assert [b["book_id"] for b in client.get("/books/1/related").get_json()["data"]] == [2, 3, 4, 5]
+    assert app_module.refresh_related() == 0
+    assert client.get("/books/cache/stats").get_json()["data"]["related"]["watermark"] == 8
+
+
+@pytest.mark.integration
+def test_get_related_books_exception_path(monkeypatch, client):
+    import books.app as app_module
+    monkeypatch.setattr(app_module, "ensure_related_index", lambda: (_ for _ in ()).throw(RuntimeError("boom")))
+    res = client.get("/books/1/related")
+    assert res.status_code == 500
+    assert "boom" in res.get_json()["message"]
@@ -0,0 +1,130 @@
+# Purpose: For each migration, the query plans and latency of the queries it targets, before and after it is applied.
+# Run from backend/: python -m database.benchmarks.bench_migrations [orders]   (SQLite; books and users scale with orders)
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+
+from database.migrate import migrate, migrations
+
+GENRES = ["Fantasy", "Sci-Fi", "Mystery", "Non-fiction", "Romance", "Horror", "History", "Poetry"]
+STATUSES = ["completed", "completed", "completed", "pending", "failed"]
+
+# The tables of init.sql, in SQLite syntax
+BASE_SCHEMA = [
+    "CREATE TABLE Users (user_id INTEGER PRIMARY KEY, username VARCHAR(50) NOT NULL, email VARCHAR(100) NOT NULL, "
+    "password_hash TEXT NOT NULL, created_at DATETIME NOT NULL)",
+    "CREATE TABLE Books (book_id INTEGER PRIMARY KEY, title VARCHAR(255) NOT NULL, description TEXT, "
+    "ISBN VARCHAR(20) NOT NULL, authors TEXT, publishers VARCHAR(255), format VARCHAR(50), genre VARCHAR(50) NOT NULL, "
+    "price DECIMAL(10, 2) NOT NULL, quantity INT NOT NULL, url TEXT)",
+    "CREATE TABLE Orders (order_id INTEGER PRIMARY KEY, book_id INT NOT NULL, user_id INT NOT NULL, "
+    "price DECIMAL(10, 2) NOT NULL, quantity INT NOT NULL, status VARCHAR(20) NOT NULL, title VARCHAR(255) NOT NULL, "
+    "authors TEXT, url TEXT, order_date DATETIME NOT NULL)",
+]
+
+# migration version -> [(label, SQL, params(rng, sizes))] for the queries it is meant to speed up
+HOT_QUERIES = {
+    "001_books_sort_indexes": [
+        ("genre page by -price",
+         "SELECT book_id FROM Books WHERE genre = :genre ORDER BY price DESC, book_id DESC LIMIT 8",
+         lambda rng, n: {"genre": rng.choice(GENRES)}),
+        ("page 20 by title",
+         "SELECT book_id FROM Books ORDER BY title, book_id LIMIT 8 OFFSET 160",
+         lambda rng, n: {}),
+        ("genre page by title",
+         "SELECT book_id FROM Books WHERE genre = :genre ORDER BY title, book_id LIMIT 8",
+         lambda rng, n: {"genre": rng.choice(GENRES)}),
+    ],
+    "002_hot_query_indexes": [
+        ("login by email",
+         "SELECT user_id, password_hash FROM Users WHERE email = :email",
+         lambda rng, n: {"email": f"user{rng.randint(1, n['users'])}@example.com"}),
+        ("orders by user, newest first",
+         "SELECT order_id FROM Orders WHERE user_id = :user_id ORDER BY order_date DESC LIMIT 10",
+         lambda rng, n: {"user_id": rng.randint(1, n["users"])}),
+        ("pending order check",
+         "SELECT order_id FROM Orders WHERE user_id = :user_id AND status = 'pending' AND book_id = :book_id LIMIT 1",
+         lambda rng, n: {"user_id": rng.randint(1, n["users"]), "book_id": rng.randint(1, n["books"])}),
+        ("book by ISBN",
+         "SELECT book_id FROM Books WHERE ISBN = :isbn",
+         lambda rng, n: {"isbn": f"978{rng.randint(1, n['books']):010d}"}),
+    ],
+    "004_orders_pending_index": [
+        ("pending-order cache load",
+         "SELECT order_id, user_id, book_id FROM Orders WHERE status = 'pending'",
+         lambda rng, n: {}),
+    ],
+}
+
+def seed(engine, sizes, seed=7):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        for statement in BASE_SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(
+            text("INSERT INTO Users VALUES (:id, :name, :email, 'hash', :created)"),
+            [{"id": i, "name": f"user{i}", "email": f"user{i}@example.com", "created": start}
+             for i in range(1, sizes["users"] + 1)]
+        )
+        connection.execute(
+            text("INSERT INTO Books (book_id, title, ISBN, genre, price, quantity) "
+                 "VALUES (:id, :title, :isbn, :genre, :price, :quantity)"),
+            [{"id": i, "title": f"Title {rng.randrange(10**9):09d}", "isbn": f"978{i:010d}",
+              "genre": rng.choice(GENRES), "price": rng.randint(100, 9999) / 100, "quantity": rng.randint(0, 40)}
+             for i in range(1, sizes["books"] + 1)]
+        )
+        for chunk in range(0, sizes["orders"], 100_000):
+            connection.execute(
+                text("INSERT INTO Orders (book_id, user_id, price, quantity, status, title, order_date) "
+                     "VALUES (:book, :user, 9.99, 1, :status, 'Title', :date)"),
+                [{"book": rng.randint(1, sizes["books"]), "user": rng.randint(1, sizes["users"]),
+                  "status": rng.choice(STATUSES), "date": start + timedelta(minutes=rng.randrange(10**6))}
+                 for _ in range(min(100_000, sizes["orders"] - chunk))]
+            )
+
+def plan(connection, sql, params):
+    return " | ".join(row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params))
+
+def measure(engine, sizes, queries, repeat=200):
+    results = []
+    with engine.connect() as connection:
+        for label, sql, params in queries:
+            rng = random.Random(1)
+            latencies = []
+            for _ in range(repeat):
+                bound = params(rng, sizes)
+                start = time.perf_counter()
+                connection.execute(text(sql), bound).fetchall()
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies.sort()
+            results.append((label, plan(connection, sql, params(rng, sizes)), latencies[len(latencies) // 2]))
+    return results
+
+def run(orders):
+    sizes = {"orders": orders, "users": max(1, orders // 10), "books": max(1, orders // 5)}
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        seed(engine, sizes)
+        print(f"\n{sizes['orders']:,} orders, {sizes['books']:,} books, {sizes['users']:,} users")
+
+        for version, _ in migrations():
+            queries = HOT_QUERIES.get(version, [])
+            before = measure(engine, sizes, queries)
+            migrate(engine, target=version, log=lambda line: None)
+            after = measure(engine, sizes, queries)
+
+            print(f"\n  {version}")
+            for (label, old_plan, old_ms), (_, new_plan, new_ms) in zip(before, after):
+                print(f"    {label:<30} p50 {old_ms:>8.3f} ms -> {new_ms:>8.3f} ms")
+                print(f"      before: {old_plan}")
+                print(f"      after:  {new_plan}")
+        engine.dispose()
+
+if __name__ == "__main__":
+    for size in [int(a) for a in sys.argv[1:]] or [100_000, 1_000_000]:
+        run(size)
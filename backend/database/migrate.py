@@ -0,0 +1,128 @@
+# Purpose: Apply the numbered SQL migrations in database/migrations/ that a database hasn't had yet.
+# Run from backend/: python -m database.migrate [--plan]   (reads dbURL, like the services)
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import OperationalError
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+MIGRATION_FILE = re.compile(r"^(\d+)_\w+\.sql$")
+
+# Statements a partly applied migration may already have run; MySQL commits DDL as it goes,
+# so a migration that failed halfway can't be rolled back and is completed on the next run instead
+CREATE_INDEX = re.compile(r"^CREATE\s+(?:UNIQUE\s+)?INDEX\s+(\w+)\s+ON\s+(\w+)", re.IGNORECASE)
+ADD_COLUMN = re.compile(r"^ALTER\s+TABLE\s+(\w+)\s+ADD\s+(?:COLUMN\s+)?(\w+)", re.IGNORECASE)
+CREATE_TABLE = re.compile(r"^CREATE\s+TABLE\s+(\w+)", re.IGNORECASE)
+
+class MigrationError(RuntimeError):
+    pass
+
+def migrations(directory=MIGRATIONS_DIR):
+    """[(version, path)] in the order they apply; the version is the file name without .sql."""
+    found = {}
+    for path in Path(directory).iterdir():
+        match = MIGRATION_FILE.match(path.name)
+        if not match:
+            continue
+        number = int(match.group(1))
+        if number in found:
+            raise MigrationError(f"Two migrations are numbered {number}: {found[number].name}, {path.name}")
+        found[number] = path
+    return [(found[number].stem, found[number]) for number in sorted(found)]
+
+def statements(sql):
+    """The statements of a migration file, with -- comments removed. Migrations don't put ; inside strings."""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+def already_applied(connection, statement):
+    """True if `statement` creates an index, column or table that already exists."""
+    index = CREATE_INDEX.match(statement)
+    if index:
+        name, table = index.groups()
+        return any(existing["name"] == name for existing in inspect(connection).get_indexes(table))
+    column = ADD_COLUMN.match(statement)
+    if column:
+        table, name = column.groups()
+        return any(existing["name"] == name for existing in inspect(connection).get_columns(table))
+    table = CREATE_TABLE.match(statement)
+    if table:
+        return inspect(connection).has_table(table.group(1))
+    return False
+
+def applied_versions(connection):
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version VARCHAR(255) NOT NULL PRIMARY KEY, "
+        "applied_at DATETIME NOT NULL)"
+    ))
+    return {version for (version,) in connection.execute(text("SELECT version FROM schema_migrations"))}
+
+def pending(engine, directory=MIGRATIONS_DIR):
+    with engine.begin() as connection:
+        applied = applied_versions(connection)
+    return [(version, path) for version, path in migrations(directory) if version not in applied]
+
+def migrate(engine, directory=MIGRATIONS_DIR, target=None, log=print):
+    """
+    Apply pending migrations in order, up to and including `target` if given.
+    Each one is recorded in schema_migrations once all its statements have run,
+    so a failure stops the run and leaves that migration to be retried.
+    Returns the versions applied.
+    """
+    done = []
+    for version, path in pending(engine, directory):
+        started = time.perf_counter()
+        with engine.begin() as connection:
+            for statement in statements(path.read_text()):
+                if already_applied(connection, statement):
+                    log(f"  {version}: skipping, already present: {statement.splitlines()[0]}")
+                    continue
+                # Driver-level execution, so nothing in the SQL is taken for a bind parameter
+                connection.exec_driver_sql(statement)
+            connection.execute(
+                text("INSERT INTO schema_migrations (version, applied_at) VALUES (:version, :applied_at)"),
+                {"version": version, "applied_at": datetime.utcnow()}
+            )
+        log(f"Applied {version} in {time.perf_counter() - started:.2f} s")
+        done.append(version)
+        if version == target:
+            break
+    return done
+
+def wait_for_database(engine, timeout=120):
+    """Block until the database accepts connections; under Compose it may still be starting."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with engine.connect():
+                return
+        except OperationalError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(2)
+
+def main(argv):
+    engine = create_engine(os.environ["dbURL"])
+    wait_for_database(engine)
+
+    if "--plan" in argv:
+        for version, _ in pending(engine):
+            print(f"Pending {version}")
+        return 0
+
+    try:
+        applied = migrate(engine)
+    except Exception as e:
+        print(f"[!] Migration failed: {e}")
+        return 1
+    print(f"{len(applied)} migration(s) applied." if applied else "Schema is up to date.")
+    return 0
+
+if __name__ == "__main__": # pragma: no cover
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,9 @@
+-- Composite indexes behind GET /books?sort=price|-price|title|newest, with and without ?genre=.
+-- Each one ends in book_id, the sort's tie-breaker, so a sorted page is read in index order
+-- (forwards, or backwards for -price and newest) with no filesort.
+
+CREATE INDEX ix_books_genre_price ON Books (genre, price, book_id);
+CREATE INDEX ix_books_genre_title ON Books (genre, title, book_id);
+CREATE INDEX ix_books_genre_book ON Books (genre, book_id);
+CREATE INDEX ix_books_price ON Books (price, book_id);
+CREATE INDEX ix_books_title ON Books (title, book_id);
@@ -0,0 +1,12 @@
+-- Indexes for the queries every request path runs, plus the uniqueness the services assume.
+-- Users.email: looked up by every login and register (and must be unique for login to make sense).
+CREATE UNIQUE INDEX ux_users_email ON Users (email);
+
+-- Orders(user_id, order_date): GET /orders/user/<user_id>, newest first.
+CREATE INDEX ix_orders_user_date ON Orders (user_id, order_date);
+
+-- Orders(user_id, book_id, status): the pending-order check before placing an order.
+CREATE INDEX ix_orders_user_book_status ON Orders (user_id, book_id, status);
+
+-- Books.ISBN: one catalog entry per ISBN, and the key bulk imports upsert on.
+CREATE UNIQUE INDEX ux_books_isbn ON Books (ISBN);
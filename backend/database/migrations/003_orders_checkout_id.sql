@@ -0,0 +1,8 @@
+-- Orders.checkout_id, Orders.checkout_line: the lines of one multi-item checkout (POST /orders/batch), numbered from 0.
+-- Nullable, so orders placed one at a time, and every order placed before this migration, have neither.
+ALTER TABLE Orders ADD COLUMN checkout_id VARCHAR(36) NULL;
+ALTER TABLE Orders ADD COLUMN checkout_line SMALLINT NULL;
+
+-- Orders(checkout_id, checkout_line): reading a checkout's lines back after the bulk insert and replaying a retried
+-- checkout. Unique, so two concurrent retries can't both insert the lines; NULLs don't collide, so single orders are free.
+CREATE UNIQUE INDEX ux_orders_checkout ON Orders (checkout_id, checkout_line);
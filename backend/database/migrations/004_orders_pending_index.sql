@@ -0,0 +1,4 @@
+-- Orders(status, user_id, book_id): every pending order, which the Orders service reads when it loads its
+-- pending-order cache. Pending orders are few, so that is a short range of this index instead of a full scan,
+-- and as InnoDB entries also carry order_id it never touches the rows.
+CREATE INDEX ix_orders_status_user_book ON Orders (status, user_id, book_id);
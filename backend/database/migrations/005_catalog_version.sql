@@ -0,0 +1,10 @@
+-- CatalogVersion: one row, bumped by every catalog write other than a stock change, including the ones made by
+-- import-books and by other books replicas. Each books process reads it to tell that its ETags, caches and search
+-- indexes are out of date.
+CREATE TABLE CatalogVersion (
+    id INT NOT NULL PRIMARY KEY,
+    version BIGINT NOT NULL
+);
+
+-- Guarded like the statements the runner skips, so a re-run after a failure doesn't insert the row twice
+INSERT INTO CatalogVersion (id, version) SELECT 1, 0 WHERE NOT EXISTS (SELECT 1 FROM CatalogVersion);
@@ -0,0 +1,130 @@
+# Purpose: Cover the migration runner in database/migrate.py against SQLite.
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from database.migrate import MigrationError, migrate, migrations, pending, statements
+
+# The tables of init.sql, in SQLite syntax
+BASE_SCHEMA = [
+    "CREATE TABLE Users (user_id INTEGER PRIMARY KEY, username VARCHAR(50) NOT NULL, email VARCHAR(100) NOT NULL, "
+    "password_hash TEXT NOT NULL, created_at DATETIME NOT NULL)",
+    "CREATE TABLE Books (book_id INTEGER PRIMARY KEY, title VARCHAR(255) NOT NULL, description TEXT, "
+    "ISBN VARCHAR(20) NOT NULL, authors TEXT, publishers VARCHAR(255), format VARCHAR(50), genre VARCHAR(50) NOT NULL, "
+    "price DECIMAL(10, 2) NOT NULL, quantity INT NOT NULL, url TEXT)",
+    "CREATE TABLE Orders (order_id INTEGER PRIMARY KEY, book_id INT NOT NULL, user_id INT NOT NULL, "
+    "price DECIMAL(10, 2) NOT NULL, quantity INT NOT NULL, status VARCHAR(20) NOT NULL, title VARCHAR(255) NOT NULL, "
+    "authors TEXT, url TEXT, order_date DATETIME NOT NULL)",
+]
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'bookstore.db'}")
+    with engine.begin() as connection:
+        for statement in BASE_SCHEMA:
+            connection.execute(text(statement))
+    yield engine
+    engine.dispose()
+
+
+def index_names(engine, table):
+    return {index["name"] for index in inspect(engine).get_indexes(table)}
+
+
+@pytest.mark.unit
+def test_statements_drop_comments_and_blank_statements():
+    sql = "-- a comment; with a semicolon\nCREATE INDEX a ON T (x);\n\n  -- another\nCREATE INDEX b ON T (y);\n;"
+    assert statements(sql) == ["CREATE INDEX a ON T (x)", "CREATE INDEX b ON T (y)"]
+
+
+@pytest.mark.unit
+def test_migrations_are_numbered_and_ordered(tmp_path):
+    for name in ["010_later.sql", "002_second.sql", "notes.txt", "001_first.sql"]:
+        (tmp_path / name).write_text("")
+    assert [version for version, _ in migrations(tmp_path)] == ["001_first", "002_second", "010_later"]
+
+    (tmp_path / "2_duplicate.sql").write_text("")
+    with pytest.raises(MigrationError):
+        migrations(tmp_path)
+
+
+@pytest.mark.integration
+def test_migrate_applies_every_migration_once(engine):
+    logged = []
+    applied = migrate(engine, log=logged.append)
+
+    assert applied == [version for version, _ in migrations()]
+    assert {"ix_books_genre_price", "ix_books_title", "ux_books_isbn"} <= index_names(engine, "Books")
+    assert {"ix_orders_user_date", "ix_orders_user_book_status", "ux_orders_checkout", "ix_orders_status_user_book"} \
+        <= index_names(engine, "Orders")
+    assert {"checkout_id", "checkout_line"} <= {column["name"] for column in inspect(engine).get_columns("Orders")}
+    assert "ux_users_email" in index_names(engine, "Users")
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT id, version FROM CatalogVersion")).all() == [(1, 0)]
+    with engine.connect() as connection:
+        recorded = [version for (version,) in connection.execute(text("SELECT version FROM schema_migrations"))]
+    assert sorted(recorded) == applied
+
+    # Idempotent: a second deploy has nothing to do
+    assert pending(engine) == []
+    assert migrate(engine) == []
+
+
+@pytest.mark.integration
+def test_migrate_stops_at_target(engine):
+    first = migrations()[0][0]
+    assert migrate(engine, target=first, log=lambda line: None) == [first]
+    assert [version for version, _ in pending(engine)] == [version for version, _ in migrations()[1:]]
+
+
+@pytest.mark.integration
+def test_migrate_finishes_a_partly_applied_migration(engine):
+    # As if a previous run died after the first index of 002
+    with engine.begin() as connection:
+        connection.execute(text("CREATE UNIQUE INDEX ux_users_email ON Users (email)"))
+
+    logged = []
+    assert "002_hot_query_indexes" in migrate(engine, log=logged.append)
+    assert any("skipping" in line and "ux_users_email" in line for line in logged)
+    assert "ux_books_isbn" in index_names(engine, "Books")
+
+
+@pytest.mark.integration
+def test_migrate_skips_a_table_that_already_exists(engine):
+    # As if a previous run of 005 created the table, then failed before recording itself
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE CatalogVersion (id INT NOT NULL PRIMARY KEY, version BIGINT NOT NULL)"))
+
+    logged = []
+    assert "005_catalog_version" in migrate(engine, log=logged.append)
+    assert any("skipping" in line and "CatalogVersion" in line for line in logged)
+
+
+@pytest.mark.integration
+def test_failed_migration_is_not_recorded(engine, tmp_path):
+    (tmp_path / "001_ok.sql").write_text("CREATE INDEX ix_ok ON Books (genre);")
+    (tmp_path / "002_broken.sql").write_text("CREATE INDEX ix_broken ON Books (no_such_column);")
+    (tmp_path / "003_after.sql").write_text("CREATE INDEX ix_after ON Books (title);")
+
+    with pytest.raises(Exception):
+        migrate(engine, tmp_path, log=lambda line: None)
+    assert [version for version, _ in pending(engine, tmp_path)] == ["002_broken", "003_after"]
+    assert "ix_after" not in index_names(engine, "Books")
+
+    # Fixed and redeployed, it picks up where it stopped
+    (tmp_path / "002_broken.sql").write_text("CREATE INDEX ix_broken ON Books (price);")
+    assert migrate(engine, tmp_path, log=lambda line: None) == ["002_broken", "003_after"]
+
+
+@pytest.mark.integration
+def test_migrations_reject_duplicate_isbns(engine):
+    with engine.begin() as connection:
+        for isbn in ["111", "111"]:
+            connection.execute(text(
+                "INSERT INTO Books (title, ISBN, genre, price, quantity) VALUES ('t', :isbn, 'g', 1, 1)"
+            ), {"isbn": isbn})
+
+    # Duplicates must be cleaned up first; the runner stops instead of half-applying the schema
+    with pytest.raises(Exception):
+        migrate(engine, log=lambda line: None)
+    assert "002_hot_query_indexes" in [version for version, _ in pending(engine)]
@@ -5,10 +5,83 @@ from shared.rabbitmq import RabbitMQClient
 
 ORDERS_URL = "http://orders:5003/orders"
 BOOKS_URL = "http://books:5002/books"
+# Fanout exchange that place_order listens on to push status changes to the ordering user
+STATUS_EXCHANGE = "order_status"
+
+def announce(user_id, order_ids, status, checkout_id=None):
+    """Publish a status change once it is stored; a failure here never fails the order."""
+    try:
+        status_client.publish({
+            "user_id": user_id,
+            "checkout_id": checkout_id,
+            "orders": [{"order_id": order_id, "status": status} for order_id in order_ids]
+        })
+    except Exception as e:
+        print(f"Failed to announce status of orders {order_ids}: {e}")
+
+def set_statuses(order_ids, status):
+    """Set the status of every order of a checkout in one PUT /orders/status call."""
+    try:
+        update_res = requests.put(
+            f"{ORDERS_URL}/status",
+            json={"updates": [{"order_id": order_id, "status": status} for order_id in order_ids]}
+        )
+        if update_res.ok:
+            print(f"Orders {order_ids} updated to '{status}'.")
+            return True
+        print(f"Failed to update order statuses.")
+    except Exception as e:
+        print(f"Failed to update order statuses: {e}")
+    return False
+
+def still_pending(order_id):
+    """True if the order is waiting to be processed; a checkout's lines are settled together, so one line tells."""
+    res = requests.get(f"{ORDERS_URL}/{order_id}")
+    return res.ok and res.json()["data"]["status"] == "pending"
+
+def settle_checkout(checkout, order_ids, status):
+    if set_statuses(order_ids, status):
+        announce(checkout.get("user_id"), order_ids, status, checkout.get("checkout_id"))
+
+def process_checkout(checkout):
+    """Settle every line of a multi-item checkout together: all stock is taken, or none is."""
+    orders = checkout["orders"]
+    order_ids = [order["order_id"] for order in orders]
+    try:
+        print(f"Processing checkout {checkout['checkout_id']} ({len(orders)} orders)...")
+
+        time.sleep(5)
+
+        # A retried checkout may be published twice; only the first message takes the stock
+        if not still_pending(order_ids[0]):
+            print(f"Checkout {checkout['checkout_id']} is already settled; skipping.")
+            return
+
+        # Step 1: Decrement every book's quantity in one all-or-nothing call
+        decrement_res = requests.post(
+            f"{BOOKS_URL}/decrement",
+            json={"items": [{"book_id": order["book_id"], "quantity_ordered": order["quantity"]} for order in orders]}
+        )
+
+        if decrement_res.status_code != 200:
+            print(f"Error: {decrement_res.json().get('message')}")
+            settle_checkout(checkout, order_ids, "failed")
+            return
+
+        # Step 2: Update every order's status to completed
+        settle_checkout(checkout, order_ids, "completed")
+
+    except Exception as e:
+        print(f"Error processing checkout: {e}")
+        settle_checkout(checkout, order_ids, "failed")
 
 def process_order(ch, method, properties, body):
     try:
         order = json.loads(body)
+        if "orders" in order:
+            process_checkout(order)
+            return
+
         order_id = order["order_id"]
         book_id = order["book_id"]
         quantity_ordered = order["quantity"]
@@ -28,6 +101,7 @@ def process_order(ch, method, properties, body):
             update_res = requests.put(f"{ORDERS_URL}/{order_id}", json={"status": f"failed"})
             if update_res.ok:
                 print(f"Order {order_id} updated to 'failed'.")
+                announce(order.get("user_id"), [order_id], "failed")
             else:
                 print(f"Failed to update order status.")
             return
@@ -37,6 +111,7 @@ def process_order(ch, method, properties, body):
 
         if update_res.ok:
             print(f"Order {order_id} completed successfully.")
+            announce(order.get("user_id"), [order_id], "completed")
         else:
             print(f"Failed to update order status.")
 
@@ -45,6 +120,7 @@ def process_order(ch, method, properties, body):
         update_res = requests.put(f"{ORDERS_URL}/{order_id}", json={"status": f"failed"})
         if update_res.ok:
             print(f"Order {order_id} updated to 'failed'.")
+            announce(order.get("user_id"), [order_id], "failed")
         else:
             print(f"Failed to update order status.")
 
@@ -52,6 +128,7 @@ def process_order(ch, method, properties, body):
         ch.basic_ack(delivery_tag=method.delivery_tag)
 
 client = RabbitMQClient()
+status_client = RabbitMQClient(exchange=STATUS_EXCHANGE, exchange_type="fanout", queue=None)
 
 if __name__ == "__main__":
     client.consume(process_order)
\ No newline at end of file
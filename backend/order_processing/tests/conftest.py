@@ -10,9 +10,12 @@ rabbitmq_mod = types.ModuleType("shared.rabbitmq")
 class DummyRabbitMQClient:
     def __init__(self, *_, **__):
         self.consumed = None
+        self.published = []
     def consume(self, handler):
         # record the handler
         self.consumed = handler
+    def publish(self, payload):
+        self.published.append(payload)
 
 rabbitmq_mod.RabbitMQClient = DummyRabbitMQClient
 shared_pkg.rabbitmq = rabbitmq_mod
@@ -29,6 +32,12 @@ def no_sleep(monkeypatch):
     monkeypatch.setattr(op_app.time, "sleep", lambda *_: None, raising=True)
 
 
+@pytest.fixture(autouse=True)
+def no_announcements():
+    """Start every test with no status events published."""
+    op_app.status_client.published.clear()
+
+
 @pytest.fixture()
 def module():
     """Expose the imported module."""
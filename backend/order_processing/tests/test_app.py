@@ -125,3 +125,112 @@ def test_exception_path_marks_failed_and_acks(module, monkeypatch, fake_ch_metho
     assert len(calls) == 2
     # always ack
     assert ch.acks == [method.delivery_tag]
+
+
+def _checkout_body(lines=((1, 101, 2), (2, 102, 1))):
+    return json.dumps({
+        "checkout_id": "c-1",
+        "user_id": 42,
+        "orders": [{"order_id": oid, "book_id": bid, "quantity": qty} for oid, bid, qty in lines],
+    }).encode()
+
+
+def _order_status(status):
+    """A GET /orders/<id> stand-in answering with the given status."""
+    return lambda url: FakeResp(200, payload={"code": 200, "data": {"order_id": int(url.rsplit("/", 1)[1]), "status": status}})
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("decrement_status, expected", [(200, "completed"), (409, "failed")])
+def test_checkout_settles_every_line_in_two_calls(module, monkeypatch, fake_ch_method, decrement_status, expected):
+    ch, method = fake_ch_method
+    calls = []
+
+    def fake_post(url, json=None):
+        calls.append(("POST", url, json))
+        return FakeResp(decrement_status, payload={"code": decrement_status, "message": "x"})
+
+    def fake_put(url, json=None):
+        calls.append(("PUT", url, json))
+        return FakeResp(200)
+
+    monkeypatch.setattr(module.requests, "post", fake_post, raising=True)
+    monkeypatch.setattr(module.requests, "put", fake_put, raising=True)
+    monkeypatch.setattr(module.requests, "get", _order_status("pending"), raising=True)
+
+    module.process_order(ch, method, None, _checkout_body())
+
+    # One all-or-nothing decrement, then one bulk status update for every line
+    assert calls == [
+        ("POST", f"{module.BOOKS_URL}/decrement",
+         {"items": [{"book_id": 101, "quantity_ordered": 2}, {"book_id": 102, "quantity_ordered": 1}]}),
+        ("PUT", f"{module.ORDERS_URL}/status",
+         {"updates": [{"order_id": 1, "status": expected}, {"order_id": 2, "status": expected}]}),
+    ]
+    assert ch.acks == [method.delivery_tag]
+
+
+@pytest.mark.unit
+def test_checkout_exception_marks_every_line_failed_and_acks(module, monkeypatch, fake_ch_method):
+    ch, method = fake_ch_method
+    puts = []
+
+    def boom(*_, **__):
+        raise RuntimeError("network down")
+
+    monkeypatch.setattr(module.requests, "post", boom, raising=True)
+    monkeypatch.setattr(module.requests, "put", lambda url, json=None: puts.append((url, json)) or FakeResp(200))
+    monkeypatch.setattr(module.requests, "get", _order_status("pending"), raising=True)
+
+    module.process_order(ch, method, None, _checkout_body())
+
+    assert puts == [(f"{module.ORDERS_URL}/status",
+                     {"updates": [{"order_id": 1, "status": "failed"}, {"order_id": 2, "status": "failed"}]})]
+    assert ch.acks == [method.delivery_tag]
+
+
+@pytest.mark.unit
+def test_stored_status_changes_are_announced_to_the_owner(module, monkeypatch, fake_ch_method):
+    ch, method = fake_ch_method
+    monkeypatch.setattr(module.requests, "put", lambda url, json=None: FakeResp(200), raising=True)
+    monkeypatch.setattr(module.requests, "post", lambda url, json=None: FakeResp(200), raising=True)
+    monkeypatch.setattr(module.requests, "get", _order_status("pending"), raising=True)
+
+    body = json.loads(_body(order_id=4, book_id=101, qty=1))
+    module.process_order(ch, method, None, json.dumps({**body, "user_id": 42}).encode())
+    module.process_order(ch, method, None, _checkout_body())
+
+    assert module.status_client.published == [
+        {"user_id": 42, "checkout_id": None, "orders": [{"order_id": 4, "status": "completed"}]},
+        {"user_id": 42, "checkout_id": "c-1",
+         "orders": [{"order_id": 1, "status": "completed"}, {"order_id": 2, "status": "completed"}]},
+    ]
+
+
+@pytest.mark.unit
+def test_unstored_status_change_is_not_announced(module, monkeypatch, fake_ch_method):
+    ch, method = fake_ch_method
+    # Stock taken, but the status update fails: listeners must not hear "completed"
+    monkeypatch.setattr(module.requests, "put", lambda url, json=None: FakeResp(
+        200 if url.endswith("/decrement") else 500), raising=True)
+
+    module.process_order(ch, method, None, _body(order_id=5, book_id=101, qty=1))
+
+    assert module.status_client.published == []
+    assert ch.acks == [method.delivery_tag]
+
+
+@pytest.mark.unit
+def test_duplicate_checkout_message_is_skipped_once_settled(module, monkeypatch, fake_ch_method):
+    ch, method = fake_ch_method
+    calls = []
+    monkeypatch.setattr(module.requests, "get", _order_status("completed"), raising=True)
+    monkeypatch.setattr(module.requests, "post", lambda url, json=None: calls.append(url) or FakeResp(200))
+    monkeypatch.setattr(module.requests, "put", lambda url, json=None: calls.append(url) or FakeResp(200))
+
+    module.process_order(ch, method, None, _checkout_body())
+
+    # No second decrement, no status change, nothing announced
+    assert calls == []
+    assert module.status_client.published == []
+    assert ch.acks == [method.delivery_tag]
@@ -1,8 +1,18 @@
-from flask import Flask, request, jsonify
+import base64
+import functools
+import json
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import chain
+
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from os import environ
 from .model import db, Order
-from sqlalchemy import desc
+from .pending import PendingOrders
+from sqlalchemy import bindparam, case, desc, insert, tuple_, update
+from sqlalchemy.exc import IntegrityError
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = environ.get('dbURL')
@@ -10,6 +20,21 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 CORS(app)
 db.init_app(app)
 
+# Answers the pending-order check from memory; set to 0 when several Orders processes write the same database,
+# since each one only sees its own writes
+PENDING_CACHE = environ.get('ORDERS_PENDING_CACHE', '1') != '0'
+pending_orders = PendingOrders()
+
+def ensure_pending_orders():
+    if PENDING_CACHE and not pending_orders.loaded:
+        # Read through ix_orders_status_user_book (database/migrations/004_orders_pending_index.sql)
+        pending_orders.load(
+            lambda: db.session.query(Order.order_id, Order.user_id, Order.book_id).filter(Order.status == "pending")
+        )
+
+def track_status(order):
+    pending_orders.track(order.order_id, order.user_id, order.book_id, order.status)
+
 @app.post("/orders")
 def create_order():
     try:
@@ -26,6 +51,7 @@ def create_order():
         )
         db.session.add(order)
         db.session.commit()
+        track_status(order)
 
         return jsonify(
             {
@@ -43,6 +69,131 @@ def create_order():
         ), 500
 
 
+MAX_CHECKOUT_LINES = 100
+CHECKOUT_ID_LENGTH = Order.checkout_id.type.length
+# Prices are stored to the cent, so a retried line is compared at that precision
+PRICE_PLACES = Decimal(1).scaleb(-Order.price.type.scale)
+
+def valid_price(price):
+    if isinstance(price, bool) or not isinstance(price, (int, float, str)):
+        return False
+    try:
+        price = Decimal(str(price))
+    except InvalidOperation:
+        return False
+    return price.is_finite() and price >= 0
+
+def valid_line(item):
+    return (
+        isinstance(item, dict)
+        and isinstance(item.get("book_id"), int)
+        and not isinstance(item.get("book_id"), bool)
+        and isinstance(item.get("quantity"), int)
+        and not isinstance(item.get("quantity"), bool)
+        and item["quantity"] > 0
+        and valid_price(item.get("price"))
+        and isinstance(item.get("title"), str)
+        and 0 < len(item["title"]) <= Order.title.type.length
+        and all(item.get(field) is None or isinstance(item[field], str) for field in ("authors", "url"))
+    )
+
+def line_values(order):
+    return (order.book_id, order.quantity, order.price, order.title, order.authors, order.url)
+
+def item_values(item):
+    price = Decimal(str(item["price"])).quantize(PRICE_PLACES)
+    return (item["book_id"], item["quantity"], price, item["title"], item.get("authors"), item.get("url"))
+
+def replayed_checkout(checkout_id, existing, user_id, items):
+    """The response to a checkout_id that is already stored: its orders if this is the same checkout, else 409."""
+    if (
+        any(order.user_id != user_id for order in existing)
+        or [line_values(order) for order in existing] != [item_values(item) for item in items]
+    ):
+        return jsonify(
+            {
+                "code": 409,
+                "message": "checkout_id is already used by a different checkout."
+            }
+        ), 409
+
+    return jsonify(
+        {
+            "code": 200,
+            "data": {"checkout_id": checkout_id, "orders": [order.json() for order in existing]}
+        }
+    ), 200
+
+@app.post("/orders/batch")
+def create_orders_batch():
+    try:
+        data = request.get_json(silent=True)
+        data = data if isinstance(data, dict) else {}
+        items = data.get("items")
+        user_id, status = data.get("user_id"), data.get("status")
+        checkout_id = data.get("checkout_id") or str(uuid.uuid4())
+
+        if (
+            not isinstance(user_id, int) or isinstance(user_id, bool)
+            or not isinstance(status, str) or not 0 < len(status) <= Order.status.type.length
+            or not isinstance(checkout_id, str) or len(checkout_id) > CHECKOUT_ID_LENGTH
+            or not isinstance(items, list) or not items or len(items) > MAX_CHECKOUT_LINES
+            or not all(valid_line(item) for item in items)
+        ):
+            return jsonify(
+                {
+                    "code": 400,
+                    "message": f"Expected user_id, status, an optional checkout_id of up to {CHECKOUT_ID_LENGTH} characters "
+                               f"and 1 to {MAX_CHECKOUT_LINES} items of {{book_id, price, quantity (more than 0), title, authors, url}}."
+                }
+            ), 400
+
+        lines = Order.query.filter_by(checkout_id=checkout_id).order_by(Order.checkout_line)
+
+        # A retried checkout gets the orders it already created instead of a second copy
+        existing = lines.all()
+        if existing:
+            return replayed_checkout(checkout_id, existing, user_id, items)
+
+        # One multi-row INSERT for the whole checkout, then its ids read back through ux_orders_checkout.
+        # A concurrent retry that inserted first makes this one fail on that unique index instead of doubling the lines.
+        order_date = datetime.utcnow()
+        try:
+            db.session.execute(insert(Order.__table__).values([
+                {
+                    "book_id": item["book_id"], "user_id": user_id, "price": Decimal(str(item["price"])),
+                    "quantity": item["quantity"], "status": status, "title": item["title"],
+                    "authors": item.get("authors"), "url": item.get("url"),
+                    "order_date": order_date, "checkout_id": checkout_id, "checkout_line": line
+                }
+                for line, item in enumerate(items)
+            ]))
+        except IntegrityError:
+            db.session.rollback()
+            return replayed_checkout(checkout_id, lines.all(), user_id, items)
+        orders = [order.json() for order in lines.all()]
+        db.session.commit()
+        # From the JSON, since the committed objects would each be reloaded to read them
+        for order in orders:
+            pending_orders.track(order["order_id"], order["user_id"], order["book_id"], order["status"])
+
+        return jsonify(
+            {
+                "code": 201,
+                "data": {"checkout_id": checkout_id, "orders": orders}
+            }
+        ), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify(
+            {
+                "code": 500,
+                "message": f"An error occurred: {str(e)}"
+            }
+        ), 500
+
+
 @app.put("/orders/<int:order_id>")
 def update_order_status(order_id):
     try:
@@ -59,6 +210,7 @@ def update_order_status(order_id):
 
         order.status = data['status']
         db.session.commit()
+        track_status(order)
 
         return jsonify(
             {
@@ -75,6 +227,97 @@ def update_order_status(order_id):
             }
         ), 500
 
+MAX_STATUS_UPDATES = 10_000
+# Orders per UPDATE ... CASE statement, which keeps each statement's bound parameters well under driver limits
+STATUS_CHUNK = 1000
+STATUS_LENGTH = Order.status.type.length
+
+def valid_status_update(item):
+    return (
+        isinstance(item, dict)
+        and isinstance(item.get("order_id"), int)
+        and not isinstance(item.get("order_id"), bool)
+        and isinstance(item.get("status"), str)
+        and 0 < len(item["status"]) <= STATUS_LENGTH
+    )
+
+@functools.lru_cache(maxsize=16)
+def status_update_statement(size):
+    """
+    UPDATE Orders SET status = CASE WHEN order_id = :o0 THEN :s0 ... END WHERE order_id IN (:o0, ...)
+    for `size` orders. Building the expression dominates the cost of a large update, so it is built
+    once per chunk size and only the parameters change.
+    """
+    orders = Order.__table__
+    ids = [bindparam(f"o{i}", type_=orders.c.order_id.type) for i in range(size)]
+    statuses = [bindparam(f"s{i}", type_=orders.c.status.type) for i in range(size)]
+    return (
+        update(orders)
+        .where(orders.c.order_id.in_(ids))
+        .values(status=case(*[(orders.c.order_id == order_id, status) for order_id, status in zip(ids, statuses)]))
+    )
+
+@app.put("/orders/status")
+def update_order_statuses():
+    try:
+        data = request.get_json(silent=True)
+        updates = data.get("updates") if isinstance(data, dict) else None
+
+        if (
+            not isinstance(updates, list) or not updates or len(updates) > MAX_STATUS_UPDATES
+            or not all(valid_status_update(item) for item in updates)
+        ):
+            return jsonify(
+                {
+                    "code": 400,
+                    "message": f"updates must be a list of 1 to {MAX_STATUS_UPDATES} {{order_id, status}} "
+                               f"with a status of 1 to {STATUS_LENGTH} characters."
+                }
+            ), 400
+
+        # The last status given for an order wins
+        wanted = {item["order_id"]: item["status"] for item in updates}
+        order_ids = sorted(wanted)
+
+        # One transaction for every chunk; rows are touched in order_id order so concurrent calls can't deadlock
+        found = {}  # order_id -> (user_id, book_id)
+        for start in range(0, len(order_ids), STATUS_CHUNK):
+            chunk = order_ids[start:start + STATUS_CHUNK]
+            rows = db.session.query(Order.order_id, Order.user_id, Order.book_id).filter(Order.order_id.in_(chunk))
+            existing = {order_id: (user_id, book_id) for order_id, user_id, book_id in rows}
+            if existing:
+                params = {}
+                for i, order_id in enumerate(existing):
+                    params[f"o{i}"], params[f"s{i}"] = order_id, wanted[order_id]
+                db.session.execute(status_update_statement(len(existing)), params)
+            found.update(existing)
+        db.session.commit()
+        for order_id, (user_id, book_id) in found.items():
+            pending_orders.track(order_id, user_id, book_id, wanted[order_id])
+
+        results = []
+        for order_id in order_ids:
+            if order_id in found:
+                results.append({"order_id": order_id, "status": wanted[order_id], "code": 200, "message": "Status updated."})
+            else:
+                results.append({"order_id": order_id, "status": wanted[order_id], "code": 404, "message": "Order not found."})
+
+        return jsonify(
+            {
+                "code": 200,
+                "data": results
+            }
+        ), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify(
+            {
+                "code": 500,
+                "message": f"An error occurred: {str(e)}"
+            }
+        ), 500
+
 @app.get("/orders/<int:order_id>")
 def get_order(order_id):
     try:
@@ -102,42 +345,167 @@ def get_order(order_id):
             }
         ), 500
 
+class InvalidParameter(ValueError):
+    pass
+
+def parse_date(name, value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise InvalidParameter(f"{name} must be an ISO 8601 date or date-time.")
+
+def date_range(query):
+    """Apply ?from= (inclusive) and ?to= (exclusive; a bare date includes that whole day)."""
+    start, end = request.args.get('from'), request.args.get('to')
+    if start:
+        query = query.filter(Order.order_date >= parse_date("from", start))
+    if end:
+        bound = parse_date("to", end)
+        if len(end) == 10:
+            bound += timedelta(days=1)
+        query = query.filter(Order.order_date < bound)
+    return query
+
+def encode_cursor(order):
+    raw = json.dumps([order.order_date.isoformat(), order.order_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        order_date, order_id = json.loads(raw)
+        return datetime.fromisoformat(order_date), int(order_id)
+    except Exception:
+        raise InvalidParameter("Invalid cursor.")
+
+def newest_first(query, before=None):
+    """
+    Order by (order_date, order_id) descending and, if given, start right after the
+    (order_date, order_id) pair. Together with the user_id filter this walks
+    ix_orders_user_date, whose entries also carry the primary key.
+    """
+    if before is not None:
+        # A row comparison, which both MySQL and SQLite turn into one index range; the
+        # equivalent OR of two conditions makes them scan the user's orders from the newest
+        query = query.filter(tuple_(Order.order_date, Order.order_id) < tuple_(*before))
+    return query.order_by(desc(Order.order_date), desc(Order.order_id))
+
+STREAM_BATCH = 500
+
+def stream_orders(query):
+    """
+    The {"code": 200, "data": [...]} body in chunks of STREAM_BATCH orders, newest first.
+    Each chunk is its own keyset query resuming after the last (order_date, order_id)
+    sent, since mysqlconnector buffers a whole result even when read with yield_per.
+    """
+    batch = newest_first(query).limit(STREAM_BATCH).all()
+    yield b'{"code":200,"data":['
+    first = True
+    while batch:
+        chunk = b",".join(app.json.dumps(order.json()).encode() for order in batch)
+        yield chunk if first else b"," + chunk
+        first = False
+        if len(batch) < STREAM_BATCH:
+            break
+        last = batch[-1]
+        batch = newest_first(query, (last.order_date, last.order_id)).limit(STREAM_BATCH).all()
+    yield b"]}\n"
+
 @app.get("/orders/user/<int:user_id>")
 def get_orders_by_user(user_id):
     try:
-        base_query = Order.query.filter_by(user_id=user_id).order_by(desc(Order.order_date))
+        # Date range (e.g., ?from=2025-01-01&to=2025-01-31)
+        base_query = date_range(Order.query.filter_by(user_id=user_id))
 
         page = request.args.get('page', type=int)
         limit = request.args.get('limit', type=int)
 
+        # Keyset pagination (e.g., ?before=<next_cursor>&limit=4); the first page is ?before=
+        if 'before' in request.args:
+            limit = 4 if limit is None else limit
+            if limit < 1:
+                return jsonify(
+                    {
+                        "code": 400,
+                        "message": "limit must be at least 1."
+                    }
+                ), 400
+            cursor = request.args.get('before')
+            before = decode_cursor(cursor) if cursor else None
+
+            # One extra row tells whether another page exists; there is no COUNT(*) in this mode
+            rows = newest_first(base_query, before).limit(limit + 1).all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+
+            return jsonify(
+                {
+                    "code": 200,
+                    "data": [order.json() for order in rows],
+                    "pagination": {
+                        "limit": limit,
+                        "next_cursor": encode_cursor(rows[-1]) if has_more else None,
+                        "has_more": has_more
+                    }
+                }
+            ), 200
+
+        history = base_query
+        base_query = newest_first(base_query)
+
         if page is not None or limit is not None:
             page = page or 1
             limit = limit or 4
             offset = (page - 1) * limit
 
-            total_orders = base_query.count()
-            paginated_orders = base_query.offset(offset).limit(limit).all()
+            # Total count (e.g., ?count=none for "load more" lists). There are no per-user
+            # statistics to estimate from, so estimate counts exactly.
+            count = request.args.get('count', 'exact')
+            if count not in ('exact', 'estimate', 'none'):
+                count = 'exact'
+
+            if count == 'none':
+                # One extra row tells whether another page exists, without a COUNT(*)
+                paginated_orders = base_query.offset(offset).limit(limit + 1).all()
+                has_more = len(paginated_orders) > limit
+                paginated_orders = paginated_orders[:limit]
+                pagination = {
+                    "page": page,
+                    "limit": limit,
+                    "has_more": has_more
+                }
+            else:
+                total_orders = base_query.count()
+                paginated_orders = base_query.offset(offset).limit(limit).all()
+                pagination = {
+                    "page": page,
+                    "limit": limit,
+                    "total": total_orders,
+                    "has_more": offset + limit < total_orders
+                }
+                if count == 'estimate':
+                    pagination["total_estimated"] = False
 
             return jsonify(
                 {
                     "code": 200,
                     "data": [order.json() for order in paginated_orders],
-                    "pagination": {
-                        "page": page,
-                        "limit": limit,
-                        "total": total_orders,
-                        "has_more": offset + limit < total_orders
-                    }
+                    "pagination": pagination
                 }
             ), 200
 
-        orders = base_query.all()
+        # The whole history is streamed rather than loaded at once; the first page is read before the first chunk
+        chunks = stream_orders(history)
+        first = next(chunks)
+        return Response(stream_with_context(chain([first], chunks)), mimetype="application/json"), 200
+
+    except InvalidParameter as e:
         return jsonify(
             {
-                "code": 200,
-                "data": [order.json() for order in orders]
+                "code": 400,
+                "message": str(e)
             }
-        ), 200
+        ), 400
 
     except Exception as e:
         return jsonify(
@@ -150,7 +518,14 @@ def get_orders_by_user(user_id):
 @app.get("/orders/user/<int:user_id>/book/<int:book_id>")
 def get_pending_order_by_user_and_book(user_id, book_id):
     try:
-        order = Order.query.filter_by(user_id=user_id, status="pending", book_id=book_id).first()
+        ensure_pending_orders()
+
+        # Most pairs have nothing pending and never reach the database; the rest are confirmed
+        # through ix_orders_user_book_status, so an entry left behind by racing updates costs a query
+        if PENDING_CACHE and not pending_orders.has_pending(user_id, book_id):
+            order = None
+        else:
+            order = Order.query.filter_by(user_id=user_id, status="pending", book_id=book_id).first()
 
         if not order:
             return jsonify(
@@ -0,0 +1,41 @@
+# Purpose: Time to record a cart of N books with one POST /orders per line against one POST /orders/batch.
+# Run from backend/: python -m orders.benchmarks.bench_checkout [lines...]   (on a SQLite file, so every commit is a real one)
+import os
+import sys
+import tempfile
+import time
+
+os.environ["dbURL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'orders.db')}"
+
+from orders.app import app    # noqa: E402
+from orders.model import db  # noqa: E402
+
+CHECKOUTS = 200
+
+def cart(n):
+    return [{"book_id": i + 1, "price": "12.50", "quantity": 1, "title": f"Title {i}", "authors": "Author", "url": f"/img/{i}.jpg"}
+            for i in range(n)]
+
+def run(client, n):
+    items = cart(n)
+
+    start = time.perf_counter()
+    for _ in range(CHECKOUTS):
+        for item in items:
+            assert client.post("/orders", json={**item, "user_id": 1, "status": "pending"}).status_code == 201
+    single = (time.perf_counter() - start) / CHECKOUTS * 1000
+
+    start = time.perf_counter()
+    for _ in range(CHECKOUTS):
+        assert client.post("/orders/batch", json={"user_id": 1, "status": "pending", "items": items}).status_code == 201
+    batch = (time.perf_counter() - start) / CHECKOUTS * 1000
+
+    print(f"{n:>4} lines   one POST each {single:>7.2f} ms ({n} commits)   POST /orders/batch {batch:>6.2f} ms (1 commit)   {single / batch:>5.1f}x")
+
+if __name__ == "__main__":
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    print(f"mean per checkout over {CHECKOUTS} checkouts")
+    for size in [int(a) for a in sys.argv[1:]] or [1, 3, 10, 50, 100]:
+        run(client, size)
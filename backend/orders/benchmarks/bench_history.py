@@ -0,0 +1,96 @@
+# Purpose: Latency of deep OFFSET pages against ?before= keyset pages for a heavy buyer, and memory of the full-history response.
+# Run from backend/: python -m orders.benchmarks.bench_history [orders...]   (each size in its own process, on SQLite)
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+LIMIT = 20
+DEPTHS = [1, 100, 1000, 5000]
+
+def peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def seed(n):
+    """n orders for user 1 plus as many spread over other users, several orders per timestamp."""
+    from orders.model import db, Order
+
+    db.create_all()
+    start = datetime(2020, 1, 1)
+    for first in range(0, 2 * n, 10_000):
+        db.session.execute(Order.__table__.insert(), [
+            {"book_id": i % 5000 + 1, "user_id": 1 if i % 2 else i % 1000 + 2, "price": "9.99", "quantity": 1,
+             "status": "completed", "title": f"Title {i}", "authors": "Author", "url": f"/images/books/{i}.jpg",
+             "order_date": start + timedelta(minutes=i // 3)}
+            for i in range(first, min(first + 10_000, 2 * n))
+        ])
+    db.session.commit()
+
+def timed(client, url, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = client.get(url).get_json()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, body
+
+def seed_only(database, n):
+    os.environ["dbURL"] = f"sqlite:///{database}"
+    from orders.app import app
+
+    with app.app_context():
+        seed(n)
+
+def measure(database, n):
+    os.environ["dbURL"] = f"sqlite:///{database}"
+    from orders.app import app
+    from orders.model import Order
+
+    client = app.test_client()
+    print(f"\n{n:>9,} orders for one user")
+
+    # Walk the keyset pages once to collect the cursor at each depth
+    cursors, cursor, page = {}, "", 1
+    while page <= max(DEPTHS) and cursor is not None:
+        if page in DEPTHS:
+            cursors[page] = cursor
+        body = client.get(f"/orders/user/1?before={cursor}&limit={LIMIT}").get_json()
+        cursor, page = body["pagination"]["next_cursor"], page + 1
+
+    for depth, cursor in cursors.items():
+        offset_ms, _ = timed(client, f"/orders/user/1?page={depth}&limit={LIMIT}&count=none")
+        keyset_ms, _ = timed(client, f"/orders/user/1?before={cursor}&limit={LIMIT}")
+        print(f"  page {depth:>5,}   OFFSET {offset_ms:>8.2f} ms   keyset {keyset_ms:>6.2f} ms")
+
+    before = peak_mb()
+    start = time.perf_counter()
+    res = client.get("/orders/user/1")
+    size = sum(len(chunk) for chunk in res.response)
+    elapsed = time.perf_counter() - start
+    print(f"  full history, streamed    {size / 2**20:>6,.1f} MB in {elapsed:>5.2f} s   peak RSS +{peak_mb() - before:,.0f} MB")
+
+    # What the endpoint did before: load every order, then encode one document (peak RSS only grows, so this runs last)
+    before = peak_mb()
+    start = time.perf_counter()
+    with app.test_request_context():
+        orders = Order.query.filter_by(user_id=1).order_by(Order.order_date.desc()).all()
+        size = len(app.json.response({"code": 200, "data": [order.json() for order in orders]}).get_data())
+    elapsed = time.perf_counter() - start
+    print(f"  full history, with .all() {size / 2**20:>6,.1f} MB in {elapsed:>5.2f} s   peak RSS +{peak_mb() - before:,.0f} MB")
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--seed"]:
+        seed_only(sys.argv[2], int(sys.argv[3]))
+    elif sys.argv[1:2] == ["--child"]:
+        measure(sys.argv[2], int(sys.argv[3]))
+    else:
+        for size in [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 500_000]:
+            # Seeding and measuring each run in a fresh process, so peak memory belongs to the requests
+            with tempfile.TemporaryDirectory() as tmp:
+                database = os.path.join(tmp, "orders.db")
+                for step in ("--seed", "--child"):
+                    subprocess.run([sys.executable, "-m", "orders.benchmarks.bench_history", step, database, str(size)], check=True)
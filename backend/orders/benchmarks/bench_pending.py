@@ -0,0 +1,70 @@
+# Purpose: Latency of GET /orders/user/<user_id>/book/<book_id> answered by the database against the pending-order cache.
+# Run from backend/: python -m orders.benchmarks.bench_pending [orders...]   (each size on its own SQLite file)
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+CHECKS = 5_000
+USERS, BOOKS = 20_000, 5_000
+# One order in this many is still being processed; they settle within seconds, so few are pending at once
+PENDING_EVERY = 2_000
+
+def seed(n):
+    from orders.model import db, Order
+
+    rng = random.Random(1)
+    db.create_all()
+    for first in range(0, n, 10_000):
+        db.session.execute(Order.__table__.insert(), [
+            {"book_id": rng.randint(1, BOOKS), "user_id": rng.randint(1, USERS), "price": "9.99", "quantity": 1,
+             "status": "pending" if i % PENDING_EVERY == 0 else "completed",
+             "title": f"Title {i}", "authors": None, "url": None, "order_date": datetime(2025, 1, 1)}
+            for i in range(first, min(first + 10_000, n))
+        ])
+    db.session.commit()
+
+def timed(client, pairs):
+    latencies = []
+    for user_id, book_id in pairs:
+        start = time.perf_counter()
+        assert client.get(f"/orders/user/{user_id}/book/{book_id}").status_code == 200
+        latencies.append((time.perf_counter() - start) * 1_000_000)
+    return statistics.median(latencies)
+
+def run(n):
+    os.environ["dbURL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'orders.db')}"
+    import orders.app as app_module
+    from orders.app import app, pending_orders
+
+    with app.app_context():
+        seed(n)
+    client = app.test_client()
+    rng = random.Random(7)
+    # What the book page asks: mostly pairs with nothing pending
+    pairs = [(rng.randint(1, USERS), rng.randint(1, BOOKS)) for _ in range(CHECKS)]
+
+    app_module.PENDING_CACHE = False
+    database = timed(client, pairs)
+
+    app_module.PENDING_CACHE = True
+    start = time.perf_counter()
+    with app.app_context():
+        app_module.ensure_pending_orders()
+    load = (time.perf_counter() - start) * 1000
+    cached = timed(client, pairs)
+
+    print(f"{n:>9,} orders ({len(pending_orders.pairs):,} pending pairs)   database p50 {database:>6.0f} µs"
+          f"   cache p50 {cached:>6.0f} µs   cache load {load:>6.1f} ms")
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        run(int(sys.argv[2]))
+    else:
+        import subprocess
+        for size in [int(a) for a in sys.argv[1:]] or [100_000, 1_000_000]:
+            # A fresh process per size, since the app binds its database URL on import
+            subprocess.run([sys.executable, "-m", "orders.benchmarks.bench_pending", "--child", str(size)], check=True)
@@ -0,0 +1,58 @@
+# Purpose: Time to apply N order status changes with one PUT /orders/<id> each against one PUT /orders/status.
+# Run from backend/: python -m orders.benchmarks.bench_status [updates...]   (on a SQLite file, so every commit is a real one)
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+os.environ["dbURL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'orders.db')}"
+
+from orders.app import app, MAX_STATUS_UPDATES  # noqa: E402
+from orders.model import db, Order              # noqa: E402
+
+ORDERS = 200_000
+# One-at-a-time updates take a commit each, so the largest sizes are only timed in bulk
+MAX_SINGLE = 2_000
+
+def seed():
+    with app.app_context():
+        db.create_all()
+        for first in range(0, ORDERS, 10_000):
+            db.session.execute(Order.__table__.insert(), [
+                {"book_id": i % 5000 + 1, "user_id": i % 20_000 + 1, "price": "9.99", "quantity": 1, "status": "pending",
+                 "title": f"Title {i}", "authors": None, "url": None, "order_date": datetime(2025, 1, 1)}
+                for i in range(first, first + 10_000)
+            ])
+        db.session.commit()
+
+def run(client, n, rng):
+    updates = [{"order_id": order_id, "status": rng.choice(["completed", "failed"])}
+               for order_id in rng.sample(range(1, ORDERS + 1), n)]
+
+    line = f"{n:>7,} updates"
+    if n <= MAX_SINGLE:
+        start = time.perf_counter()
+        for item in updates:
+            assert client.put(f"/orders/{item['order_id']}", json={"status": item["status"]}).status_code == 200
+        single = time.perf_counter() - start
+        line += f"   one PUT each {single * 1000:>9,.1f} ms"
+
+    start = time.perf_counter()
+    for first in range(0, n, MAX_STATUS_UPDATES):
+        res = client.put("/orders/status", json={"updates": updates[first:first + MAX_STATUS_UPDATES]})
+        assert res.status_code == 200
+    bulk = time.perf_counter() - start
+    line += f"   PUT /orders/status {bulk * 1000:>8,.1f} ms   {n / bulk:>9,.0f} updates/s"
+    if n <= MAX_SINGLE:
+        line += f"   ({single / bulk:,.0f}x)"
+    print(line)
+
+if __name__ == "__main__":
+    seed()
+    client = app.test_client()
+    rng = random.Random(7)
+    print(f"{ORDERS:,} orders")
+    for size in [int(a) for a in sys.argv[1:]] or [10, 100, 1_000, 10_000, 50_000]:
+        run(client, size, rng)
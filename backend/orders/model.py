@@ -16,8 +16,24 @@ class Order(db.Model):
     authors = db.Column(db.Text, nullable=True)
     url = db.Column(db.Text, nullable=True)
     order_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Shared by the lines of one multi-item checkout, numbered from 0 by checkout_line
+    # (see database/migrations/003_orders_checkout_id.sql)
+    checkout_id = db.Column(db.String(36), nullable=True)
+    checkout_line = db.Column(db.SmallInteger, nullable=True)
 
-    def __init__(self, book_id, user_id, price, quantity, status, title, authors, url):
+    # See database/migrations/002_hot_query_indexes.sql
+    __table_args__ = (
+        # Orders by user, newest first; entries also carry order_id, the keyset tie-breaker
+        db.Index("ix_orders_user_date", "user_id", "order_date"),
+        # The pending-order check
+        db.Index("ix_orders_user_book_status", "user_id", "book_id", "status"),
+        # Every pending order, read when the pending-order cache loads (see database/migrations/004_orders_pending_index.sql)
+        db.Index("ix_orders_status_user_book", "status", "user_id", "book_id"),
+        # A checkout's lines, each stored once however many times the checkout is retried
+        db.Index("ux_orders_checkout", "checkout_id", "checkout_line", unique=True),
+    )
+
+    def __init__(self, book_id, user_id, price, quantity, status, title, authors, url, checkout_id=None):
         self.book_id = book_id
         self.user_id = user_id
         self.price = price
@@ -26,6 +42,7 @@ class Order(db.Model):
         self.title = title
         self.authors = authors
         self.url = url
+        self.checkout_id = checkout_id
 
     def json(self):
         return {
@@ -38,7 +55,8 @@ class Order(db.Model):
             "title": self.title,
             "authors": self.authors,
             "url": self.url,
-            "order_date": self.order_date
+            "order_date": self.order_date,
+            "checkout_id": self.checkout_id
         }
     
     def __repr__(self):
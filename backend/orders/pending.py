@@ -0,0 +1,83 @@
+import threading
+
+SHIFT = 32
+
+def pair_key(user_id, book_id):
+    return (user_id << SHIFT) | book_id
+
+class PendingOrders:
+    """
+    The pending orders of every (user, book) pair, so the book page's "is an order
+    already processing?" check is answered from memory.
+
+    Pairs are kept as user << 32 | book keys mapping to the ids of their pending
+    orders. It is loaded from the database once, then kept current by the
+    endpoints that write orders: `track()` is called after each commit with an
+    order's new status, adding or removing that order id, so it is idempotent and
+    doesn't need the old status. A pair that isn't here has no pending order;
+    one that is gets confirmed against the database by the caller, so a stale
+    entry costs a query, never a wrong answer.
+
+    Changes tracked while the load's query runs are replayed on top of what it
+    read, so a commit made during the load is not lost. Only this process's
+    writes are seen, which is why the cache can be turned off when several
+    processes write the same table.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.loaded = False
+            self.pairs = {}      # user << 32 | book -> set of pending order ids
+            self.journal = None  # changes tracked while a load runs
+
+    def load(self, rows):
+        """Load from `rows()`, an iterable of (order_id, user_id, book_id) of every pending order; once per process."""
+        with self.load_lock:
+            if self.loaded:
+                return
+            with self.lock:
+                self.journal = []
+            try:
+                found = list(rows())
+            except Exception:
+                with self.lock:
+                    self.journal = None
+                raise
+
+            pairs = {}
+            for order_id, user_id, book_id in found:
+                pairs.setdefault(pair_key(user_id, book_id), set()).add(order_id)
+            with self.lock:
+                self.pairs = pairs
+                for change in self.journal:
+                    self._apply(*change)
+                self.journal = None
+                self.loaded = True
+
+    def track(self, order_id, user_id, book_id, status):
+        """Record an order's status after it has been committed."""
+        change = (order_id, pair_key(user_id, book_id), status == "pending")
+        with self.lock:
+            if self.journal is not None:
+                self.journal.append(change)
+            if self.loaded:
+                self._apply(*change)
+
+    def _apply(self, order_id, key, pending):
+        if pending:
+            self.pairs.setdefault(key, set()).add(order_id)
+        else:
+            orders = self.pairs.get(key)
+            if orders is not None:
+                orders.discard(order_id)
+                if not orders:
+                    del self.pairs[key]
+
+    def has_pending(self, user_id, book_id):
+        with self.lock:
+            return pair_key(user_id, book_id) in self.pairs
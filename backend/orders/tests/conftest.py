@@ -6,7 +6,7 @@ from datetime import datetime, timedelta
 # Use an in-memory DB for tests
 os.environ["dbURL"] = "sqlite:///:memory:"
 
-from orders.app import app as flask_app  # noqa: E402
+from orders.app import app as flask_app, pending_orders  # noqa: E402
 from orders.model import db, Order       # noqa: E402
 
 
@@ -14,6 +14,8 @@ from orders.model import db, Order       # noqa: E402
 def client():
     with flask_app.app_context():
         db.create_all()
+        # Every test starts from an empty database, so the pending-order cache is reloaded too
+        pending_orders.clear()
         try:
             yield flask_app.test_client()
         finally:
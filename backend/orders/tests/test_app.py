@@ -1,7 +1,7 @@
 import json
 import pytest
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timedelta
 from sqlalchemy import desc
 
 from orders.app import app as flask_app
@@ -33,6 +33,7 @@ def test_order_json_includes_all_fields_and_values():
         "authors": "Anon",
         "url": "/img/x.png",
         "order_date": datetime(2024, 3, 4, 5, 6, 7),
+        "checkout_id": None,
     }
 
 
@@ -61,6 +62,53 @@ def test_create_order_exception_path(client, monkeypatch):
     assert "An error occurred" in r.get_json()["message"]
 
 
+@pytest.mark.unit
+def test_update_order_statuses_validation_and_exception(client, seed_orders, monkeypatch):
+    for body in [None, {}, {"updates": []}, {"updates": [{"order_id": "1", "status": "completed"}]},
+                 {"updates": [{"order_id": True, "status": "completed"}]},
+                 {"updates": [{"order_id": 1, "status": ""}]}, {"updates": [{"order_id": 1, "status": "x" * 21}]}]:
+        r = client.put("/orders/status", json=body)
+        assert r.status_code == 400
+        assert "updates must be a list" in r.get_json()["message"]
+
+    import orders.app as app_module
+    monkeypatch.setattr(app_module, "MAX_STATUS_UPDATES", 2)
+    updates = [{"order_id": o["order_id"], "status": "completed"} for o in seed_orders[:3]]
+    assert client.put("/orders/status", json={"updates": updates}).status_code == 400
+
+    # A failed commit rolls every chunk back
+    monkeypatch.setattr(db.session, "commit", lambda *a, **k: (_ for _ in ()).throw(RuntimeError("boom")))
+    r = client.put("/orders/status", json={"updates": updates[:1]})
+    assert r.status_code == 500
+    assert "boom" in r.get_json()["message"]
+    assert db.session.get(Order, seed_orders[0]["order_id"]).status == "pending"
+
+
+@pytest.mark.unit
+def test_create_orders_batch_validation_and_exception(client, monkeypatch):
+    line = {"book_id": 1, "price": "9.99", "quantity": 1, "title": "T", "authors": None, "url": None}
+    for body in [
+        {"status": "pending", "items": [line]},                                  # no user_id
+        {"user_id": 1, "items": [line]},                                         # no status
+        {"user_id": 1, "status": "pending", "items": []},
+        {"user_id": 1, "status": "pending", "items": [{**line, "quantity": 0}]},
+        {"user_id": 1, "status": "pending", "items": [{**line, "price": "abc"}]},
+        {"user_id": 1, "status": "pending", "items": [{**line, "price": -1}]},
+        {"user_id": 1, "status": "pending", "items": [{**line, "title": ""}]},
+        {"user_id": 1, "status": "pending", "checkout_id": "x" * 37, "items": [line]},
+    ]:
+        r = client.post("/orders/batch", json=body)
+        assert r.status_code == 400
+    assert Order.query.count() == 0
+
+    # All or nothing: a failed commit leaves no line behind
+    monkeypatch.setattr(db.session, "commit", lambda *a, **k: (_ for _ in ()).throw(RuntimeError("boom")))
+    r = client.post("/orders/batch", json={"user_id": 1, "status": "pending", "items": [line, line]})
+    assert r.status_code == 500
+    assert "boom" in r.get_json()["message"]
+    assert Order.query.count() == 0
+
+
 @pytest.mark.unit
 def test_get_order_by_id_exception_path(client, monkeypatch):
     import orders.app as app_module
@@ -148,6 +196,30 @@ def test_get_pending_order_by_user_and_book_true_false_and_exception(client, see
     assert "An error occurred" in r3.get_json()["message"]
 
 
+@pytest.mark.unit
+def test_pending_orders_keep_changes_made_while_loading():
+    from orders.pending import PendingOrders
+
+    pending = PendingOrders()
+    pending.track(1, 7, 70, "pending")  # before the load starts: left to the load's query
+    assert not pending.has_pending(7, 70)
+
+    def rows():
+        # Committed while the query runs: one it already read, one it missed
+        pending.track(2, 8, 80, "completed")
+        pending.track(3, 9, 90, "pending")
+        return [(1, 7, 70), (2, 8, 80)]
+
+    pending.load(rows)
+    assert pending.loaded
+    assert pending.has_pending(7, 70) and pending.has_pending(9, 90)
+    assert not pending.has_pending(8, 80)
+
+    pending.track(1, 7, 70, "completed")
+    pending.track(1, 7, 70, "completed")  # idempotent
+    assert not pending.has_pending(7, 70)
+
+
 # ------------------------
 # Integration tests
 # ------------------------
@@ -224,6 +296,168 @@ def test_create_order_bad_json_and_missing_fields(client):
     assert r.status_code == 500
 
 
+@pytest.mark.integration
+def test_update_order_statuses_in_bulk(client, seed_orders, monkeypatch):
+    import orders.app as app_module
+    from sqlalchemy import event
+
+    ids = [o["order_id"] for o in seed_orders]
+    updates = [
+        {"order_id": ids[0], "status": "completed"},
+        {"order_id": ids[1], "status": "failed"},
+        {"order_id": 999999, "status": "completed"},
+        {"order_id": ids[3], "status": "pending"},
+        {"order_id": ids[3], "status": "completed"},  # the last one for an order wins
+    ]
+
+    # Chunks of two orders: one SELECT and one UPDATE ... CASE per chunk, whatever the number of orders
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    monkeypatch.setattr(app_module, "STATUS_CHUNK", 2)
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        r = client.put("/orders/status", json={"updates": updates})
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+    assert r.status_code == 200
+    assert r.get_json()["data"] == [
+        {"order_id": ids[0], "status": "completed", "code": 200, "message": "Status updated."},
+        {"order_id": ids[1], "status": "failed", "code": 200, "message": "Status updated."},
+        {"order_id": ids[3], "status": "completed", "code": 200, "message": "Status updated."},
+        {"order_id": 999999, "status": "completed", "code": 404, "message": "Order not found."},
+    ]
+    updates_sent = [statement for statement in statements if statement.lstrip().upper().startswith("UPDATE")]
+    assert len(updates_sent) == 2
+    assert all("CASE" in statement for statement in updates_sent)
+
+    db.session.expire_all()
+    assert [db.session.get(Order, order_id).status for order_id in ids] == ["completed", "failed", "failed", "completed"]
+
+
+@pytest.mark.integration
+def test_create_orders_batch_inserts_every_line_at_once(client, monkeypatch):
+    from sqlalchemy import event
+
+    items = [
+        {"book_id": 10 + i, "price": f"{i + 1}.50", "quantity": i + 1, "title": f"Book {i}",
+         "authors": "A", "url": f"/img/{i}.png"}
+        for i in range(5)
+    ]
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        r = client.post("/orders/batch", json={"user_id": 8, "status": "pending", "checkout_id": "c-1", "items": items})
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+    assert r.status_code == 201
+    data = r.get_json()["data"]
+    assert data["checkout_id"] == "c-1"
+    orders = data["orders"]
+    # Every generated id comes back, in the items' order
+    assert [o["book_id"] for o in orders] == [10, 11, 12, 13, 14]
+    assert [o["order_id"] for o in orders] == sorted(o["order_id"] for o in orders)
+    assert all(o["user_id"] == 8 and o["status"] == "pending" and o["checkout_id"] == "c-1" for o in orders)
+    assert len({o["order_date"] for o in orders}) == 1
+    assert len([s for s in statements if s.lstrip().upper().startswith("INSERT")]) == 1
+
+    # A retried checkout returns the same orders instead of inserting them again
+    r2 = client.post("/orders/batch", json={"user_id": 8, "status": "pending", "checkout_id": "c-1", "items": items})
+    assert r2.status_code == 200
+    assert [o["order_id"] for o in r2.get_json()["data"]["orders"]] == [o["order_id"] for o in orders]
+    assert Order.query.count() == 5
+
+    # Without a checkout_id one is generated
+    r3 = client.post("/orders/batch", json={"user_id": 8, "status": "pending", "items": items[:1]})
+    assert r3.status_code == 201
+    assert len(r3.get_json()["data"]["checkout_id"]) == 36
+
+
+@pytest.mark.integration
+def test_create_orders_batch_rejects_a_checkout_id_used_by_another_checkout(client, monkeypatch):
+    from sqlalchemy.orm import Query
+
+    line = {"book_id": 1, "price": "12.5", "quantity": 1, "title": "T", "authors": None, "url": None}
+    r = client.post("/orders/batch", json={"user_id": 1, "status": "pending", "checkout_id": "abc", "items": [line]})
+    assert r.status_code == 201
+    first = r.get_json()["data"]["orders"]
+
+    # Another user's cart, or a different cart, under the same id is refused, not answered with these orders
+    for user_id, items in [(2, [line]), (2, [{**line, "book_id": 2}]), (1, [line, {**line, "book_id": 2}])]:
+        r = client.post("/orders/batch", json={"user_id": user_id, "status": "pending", "checkout_id": "abc", "items": items})
+        assert r.status_code == 409
+        assert r.get_json()["message"] == "checkout_id is already used by a different checkout."
+    assert Order.query.count() == 1
+
+    # The same cart is a retry, whatever the price's formatting
+    r = client.post("/orders/batch", json={"user_id": 1, "status": "pending", "checkout_id": "abc",
+                                           "items": [{**line, "price": 12.50}]})
+    assert r.status_code == 200 and r.get_json()["data"]["orders"] == first
+
+    # A concurrent retry that stored the lines after this one looked for them: the unique index catches it
+    real_all = Query.all
+    looked = []
+    def stale_first_read(self):
+        looked.append(self)
+        return [] if len(looked) == 1 else real_all(self)
+    monkeypatch.setattr(Query, "all", stale_first_read)
+    r = client.post("/orders/batch", json={"user_id": 1, "status": "pending", "checkout_id": "abc", "items": [line]})
+    monkeypatch.undo()
+    assert r.status_code == 200 and r.get_json()["data"]["orders"] == first
+    assert Order.query.count() == 1
+
+
+@pytest.mark.integration
+def test_pending_order_check_is_answered_from_memory(client, seed_orders):
+    from sqlalchemy import event
+
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    def check(user_id, book_id):
+        statements.clear()
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            r = client.get(f"/orders/user/{user_id}/book/{book_id}")
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+        assert r.status_code == 200
+        return r.get_json()["hasPending"], len(statements)
+
+    # The first check loads the cache; after that, pairs with nothing pending never reach the database
+    assert check(1, 102)[0] is False
+    assert check(1, 102) == (False, 0)
+    assert check(3, 101) == (False, 0)
+    assert check(1, 101) == (True, 1)
+
+    line = {"book_id": 555, "user_id": 3, "price": "5.00", "quantity": 1, "status": "pending", "title": "T"}
+    order_id = client.post("/orders", json=line).get_json()["data"]["order_id"]
+    assert check(3, 555) == (True, 1)
+    client.put(f"/orders/{order_id}", json={"status": "completed"})
+    assert check(3, 555) == (False, 0)
+
+    client.put("/orders/status", json={"updates": [{"order_id": seed_orders[0]["order_id"], "status": "failed"}]})
+    assert check(1, 101) == (False, 0)
+
+    client.post("/orders/batch", json={"user_id": 3, "status": "pending", "items": [line, {**line, "book_id": 556}]})
+    assert check(3, 555)[0] is True and check(3, 556)[0] is True
+
+
+@pytest.mark.integration
+def test_pending_order_check_without_the_cache(client, seed_orders, monkeypatch):
+    import orders.app as app_module
+
+    monkeypatch.setattr(app_module, "PENDING_CACHE", False)
+    assert client.get("/orders/user/1/book/101").get_json()["hasPending"] is True
+    assert client.get("/orders/user/1/book/102").get_json()["hasPending"] is False
+    assert not app_module.pending_orders.loaded
+
+
 @pytest.mark.integration
 def test_get_order_found_and_not_found(client, seed_orders):
     # pick an existing seeded order id
@@ -316,6 +550,141 @@ def test_get_orders_by_user_with_pagination_and_defaults(client, seed_orders):
     assert len(b3["data"]) == 1
 
 
+@pytest.mark.integration
+def test_get_orders_by_user_count_modes(client, seed_orders, monkeypatch):
+    import orders.app as app_module
+
+    # count=none never counts; has_more comes from fetching one extra row
+    def no_count(self):
+        raise AssertionError("COUNT(*) should not run")
+
+    with monkeypatch.context() as m:
+        m.setattr(app_module.db.Query, "count", no_count)
+        b1 = client.get("/orders/user/1?limit=2&count=none").get_json()
+        b2 = client.get("/orders/user/1?limit=2&page=2&count=none").get_json()
+    assert b1["pagination"] == {"page": 1, "limit": 2, "has_more": True}
+    assert len(b1["data"]) == 2
+    assert b2["pagination"] == {"page": 2, "limit": 2, "has_more": False}
+    assert len(b2["data"]) == 1
+
+    # estimate falls back to the exact count
+    b3 = client.get("/orders/user/1?limit=2&count=estimate").get_json()
+    assert b3["pagination"]["total"] == 3
+    assert b3["pagination"]["total_estimated"] is False
+
+
+def seed_history(n=9):
+    """n orders for user 3, two per timestamp (ties broken by order_id), in 2024-03-01..; plus one for user 4."""
+    with flask_app.app_context():
+        t0 = datetime(2024, 3, 1, 9, 0, 0)
+        for i in range(n):
+            o = Order(book_id=300 + i, user_id=3, price=Decimal("5.00"), quantity=1, status="completed",
+                      title=f"History {i}", authors=None, url=None)
+            o.order_date = t0 + timedelta(days=i // 2)
+            db.session.add(o)
+        other = Order(book_id=400, user_id=4, price=Decimal("5.00"), quantity=1, status="completed",
+                      title="Other user", authors=None, url=None)
+        other.order_date = t0
+        db.session.add(other)
+        db.session.commit()
+
+
+@pytest.mark.integration
+def test_get_orders_by_user_keyset_pages_walk_history_once(client):
+    seed_history()
+    expected = [o["order_id"] for o in client.get("/orders/user/3?limit=100").get_json()["data"]]
+
+    seen, cursor = [], ""
+    while True:
+        body = client.get(f"/orders/user/3?before={cursor}&limit=2").get_json()
+        assert body["pagination"]["limit"] == 2
+        assert "total" not in body["pagination"]
+        seen += [o["order_id"] for o in body["data"]]
+        if not body["pagination"]["has_more"]:
+            assert body["pagination"]["next_cursor"] is None
+            break
+        cursor = body["pagination"]["next_cursor"]
+
+    # Newest first, ties by order_id descending, no order twice or missed
+    assert seen == expected
+    assert len(seen) == 9
+    assert seen[:2] == sorted(seen[:2], reverse=True)
+
+    # Bad cursors and limits are client errors
+    assert client.get("/orders/user/3?before=not-a-cursor").status_code == 400
+    assert client.get("/orders/user/3?before=&limit=0").status_code == 400
+
+
+@pytest.mark.integration
+def test_get_orders_by_user_date_range(client):
+    seed_history()
+
+    def titles(query):
+        r = client.get(f"/orders/user/3?{query}")
+        assert r.status_code == 200
+        return {o["title"] for o in r.get_json()["data"]}
+
+    # Orders 0-1 are on 03-01, 2-3 on 03-02, 4-5 on 03-03, ...
+    assert titles("from=2024-03-02&to=2024-03-03") == {"History 2", "History 3", "History 4", "History 5"}
+    assert titles("to=2024-03-02T00:00:00") == {"History 0", "History 1"}
+    assert titles("from=2024-03-05") == {"History 8"}
+    # The range applies to every mode
+    body = client.get("/orders/user/3?from=2024-03-02&before=&limit=3").get_json()
+    assert [o["title"] for o in body["data"]] == ["History 8", "History 7", "History 6"]
+    assert client.get("/orders/user/3?from=2024-03-02&page=1&limit=2").get_json()["pagination"]["total"] == 7
+
+    r = client.get("/orders/user/3?from=yesterday")
+    assert r.status_code == 400
+    assert r.get_json()["message"] == "from must be an ISO 8601 date or date-time."
+
+
+@pytest.mark.integration
+def test_get_orders_by_user_keyset_reads_the_index_in_order(client):
+    seed_history()
+    import orders.app as app_module
+
+    with flask_app.test_request_context():
+        query = app_module.newest_first(Order.query.filter_by(user_id=3), (datetime(2024, 3, 3), 5)).limit(5)
+        sql = str(query.statement.compile(db.engine, compile_kwargs={"literal_binds": True}))
+        plan = " | ".join(row[-1] for row in db.session.execute(db.text(f"EXPLAIN QUERY PLAN {sql}")))
+    assert "ix_orders_user_date" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+@pytest.mark.integration
+def test_get_orders_by_user_streams_full_history(client, seed_orders, monkeypatch):
+    from sqlalchemy import event
+    import orders.app as app_module
+
+    # One bounded keyset query per chunk, not one result read through a cursor
+    statements = []
+    def record(conn, cursor, statement, parameters, *args):
+        statements.append((statement, parameters))
+    with monkeypatch.context() as m:
+        m.setattr(app_module, "STREAM_BATCH", 2)
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            r = client.get("/orders/user/1")
+            assert r.is_streamed
+            chunks = list(r.response)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+    assert len(chunks) == 4  # opening, two batches, closing
+    body = json.loads(b"".join(chunks))
+    assert body["code"] == 200
+    assert [o["book_id"] for o in body["data"]] == [103, 102, 101]
+    pages = [(statement, parameters) for statement, parameters in statements if "FROM \"Orders\"" in statement]
+    assert len(pages) == 2
+    assert all("LIMIT" in statement for statement, _ in pages)
+    assert body["data"][1]["order_id"] in pages[1][1]
+
+    # A failing query is still a 500, because the first page is read before the first chunk is sent
+    monkeypatch.setattr(app_module.db.Query, "all", lambda *a, **k: (_ for _ in ()).throw(RuntimeError("boom")))
+    r2 = client.get("/orders/user/1")
+    assert r2.status_code == 500
+    assert "boom" in r2.get_json()["message"]
+
+
 # ------------------------
 # Tiny E2E flow (single service)
 # ------------------------
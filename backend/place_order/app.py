@@ -1,13 +1,32 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+import json
+import queue
 import requests
-from shared.auth import jwt_required
+import uuid
+from shared.auth import jwt_required, jwt_required_query
 from shared.rabbitmq import RabbitMQClient
+from .events import StatusEvents
 
 app = Flask(__name__)
 CORS(app)
 
 ORDERS_URL = "http://orders:5003/orders"
+# Fanout exchange order_processing publishes status changes to
+STATUS_EXCHANGE = "order_status"
+# Seconds between keep-alive comments on an idle stream, which also detect closed connections
+STREAM_HEARTBEAT = 15
+# Orders a stream can catch up on when it connects (?order_id=...)
+MAX_STREAM_ORDERS = 20
+
+status_events = StatusEvents()
+
+def status_listener():
+    # A private queue per process, so every process hears every change and keeps those of its own connections
+    return RabbitMQClient(exchange=STATUS_EXCHANGE, exchange_type="fanout", queue="")
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 @app.route('/health')  
 def health():
@@ -53,6 +72,52 @@ def place_order():
             }
         ), 500
     
+@app.post("/checkout")
+@jwt_required
+def checkout():
+    try:
+        data = request.get_json(silent=True)
+        data = data if isinstance(data, dict) else {}
+
+        # Every line goes to Orders in one call; a client retrying with the same checkout_id gets the same orders
+        batch_payload = {
+            "user_id": int(request.user["sub"]),
+            "status": "pending",
+            "checkout_id": data.get("checkout_id") or str(uuid.uuid4()),
+            "items": data.get("items")
+        }
+
+        response = requests.post(f"{ORDERS_URL}/batch", json=batch_payload)
+        if response.status_code not in (200, 201):
+            return jsonify(response.json()), response.status_code
+
+        checkout_data = response.json()["data"]
+
+        # A 200 means an earlier attempt stored the checkout; it may have failed before publishing, so while its
+        # lines are still pending the message goes out again. The worker skips a checkout that is already settled.
+        if response.status_code == 201 or any(order["status"] == "pending" for order in checkout_data["orders"]):
+            # One message for the whole checkout, so the worker settles its lines together
+            client = RabbitMQClient()
+            client.publish({
+                "checkout_id": checkout_data["checkout_id"],
+                "user_id": batch_payload["user_id"],
+                "orders": checkout_data["orders"]
+            })
+
+        return jsonify(
+            {
+                "code": response.status_code,
+                "data": checkout_data
+            }
+        ), response.status_code
+
+    except Exception as e:
+        return jsonify(
+            {
+                "code": 500, "message": f"An error occurred: {str(e)}"
+            }
+        ), 500
+
 @app.get("/checkorder/<int:order_id>")
 @jwt_required
 def check_order_status(order_id):
@@ -84,6 +149,59 @@ def check_order_status(order_id):
             }
         ), 500
     
+@app.get("/orders/stream")
+@jwt_required_query
+def stream_order_status():
+    try:
+        user_id = int(request.user["sub"])
+        # Orders the client is waiting on (e.g., ?order_id=11&order_id=12); ones already settled are sent first
+        order_ids = request.args.getlist("order_id", type=int)[:MAX_STREAM_ORDERS]
+
+        status_events.start(status_listener)
+        # Subscribe before reading current statuses, so a change made in between is not missed
+        events = status_events.subscribe(user_id)
+        try:
+            settled = []
+            for order_id in order_ids:
+                res = requests.get(f"{ORDERS_URL}/{order_id}")
+                if res.status_code != 200:
+                    continue
+                order = res.json()["data"]
+                if order["user_id"] == user_id and order["status"] != "pending":
+                    settled.append({"order_id": order_id, "status": order["status"], "checkout_id": order.get("checkout_id")})
+        except Exception:
+            status_events.unsubscribe(user_id, events)
+            raise
+
+        def stream():
+            try:
+                yield "retry: 3000\n\n"
+                for event in settled:
+                    yield sse("status", event)
+                while True:
+                    try:
+                        event = events.get(timeout=STREAM_HEARTBEAT)
+                    except queue.Empty:
+                        yield ": keep-alive\n\n"
+                        continue
+                    yield sse("status", event)
+            finally:
+                # Runs when the client goes away and the next write fails
+                status_events.unsubscribe(user_id, events)
+
+        return Response(
+            stream(), mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        ), 200
+
+    except Exception as e:
+        return jsonify(
+            {
+                "code": 500,
+                "message": f"An error occurred: {str(e)}"
+            }
+        ), 500
+
 @app.get("/pendingorder/<int:book_id>")
 @jwt_required
 def get_my_pending_book_order(book_id):
@@ -0,0 +1,60 @@
+# Purpose: Cost of N idle GET /orders/stream subscribers and the latency of pushing one status change to one of them,
+#          against the request load the same clients put on Orders by polling /checkorder every 2 seconds.
+# Run from backend/: python -m place_order.benchmarks.bench_stream [connections...]
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+from place_order.events import StatusEvents
+
+POLL_INTERVAL = 2
+PUSHES = 200
+
+def run(n):
+    events = StatusEvents()
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    queues = [(user_id, events.subscribe(user_id)) for user_id in range(n)]
+    per_connection = (tracemalloc.get_traced_memory()[0] - before) / n
+    tracemalloc.stop()
+
+    # Every connection blocks on its queue the way the stream generator does between events
+    received = {}
+    def wait(user_id, q):
+        while True:
+            event = q.get()
+            if event is None:
+                return
+            received[event["order_id"]] = time.perf_counter()
+
+    threads = [threading.Thread(target=wait, args=item, daemon=True) for item in queues]
+    for thread in threads:
+        thread.start()
+
+    latencies = []
+    for order_id in range(PUSHES):
+        user_id = order_id * 7919 % n
+        sent = time.perf_counter()
+        events.dispatch({"user_id": user_id, "checkout_id": None, "orders": [{"order_id": order_id, "status": "completed"}]})
+        while order_id not in received:
+            time.sleep(0)
+        latencies.append((received[order_id] - sent) * 1_000_000)
+
+    for user_id, q in queues:
+        q.put(None)
+        events.unsubscribe(user_id, q)
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    print(f"{n:>6,} idle streams   {per_connection:>5,.0f} B each   push p50 {statistics.median(latencies):>6,.0f} µs"
+          f"   p99 {latencies[int(len(latencies) * 0.99)]:>6,.0f} µs"
+          f"   polling instead: {n / POLL_INTERVAL:>7,.0f} req/s to Orders")
+
+if __name__ == "__main__":
+    print("streams wait in threads here; under gunicorn's gevent workers each one is a greenlet")
+    for size in [int(a) for a in sys.argv[1:]] or [100, 1_000, 4_000]:
+        run(size)
@@ -0,0 +1,86 @@
+import json
+import queue
+import threading
+import time
+
+class StatusEvents:
+    """
+    Fans order status changes out to the open GET /orders/stream connections of
+    this process.
+
+    Each connection subscribes with its user id and gets a small queue. One
+    listener thread per process consumes the status exchange and puts every
+    order's change into the queues of its owner only, so an idle connection
+    costs a queue and a waiting greenlet (or thread), and nothing polls.
+    A connection that stops reading is sent no more once its queue is full;
+    it catches up from Orders when it reconnects.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.subscribers = {}  # user_id -> set of queues
+        self.started = False
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, user_id):
+        events = queue.Queue(maxsize=self.queue_size)
+        with self.lock:
+            self.subscribers.setdefault(user_id, set()).add(events)
+        return events
+
+    def unsubscribe(self, user_id, events):
+        with self.lock:
+            listeners = self.subscribers.get(user_id)
+            if listeners is not None:
+                listeners.discard(events)
+                if not listeners:
+                    del self.subscribers[user_id]
+
+    def dispatch(self, message):
+        """Deliver one status-exchange message ({user_id, checkout_id, orders}) to its user's connections."""
+        with self.lock:
+            listeners = list(self.subscribers.get(message.get("user_id"), ()))
+        for order in message.get("orders", []):
+            event = {"order_id": order["order_id"], "status": order["status"], "checkout_id": message.get("checkout_id")}
+            for events in listeners:
+                try:
+                    events.put_nowait(event)
+                    self.delivered += 1
+                except queue.Full:
+                    self.dropped += 1
+
+    def start(self, client_factory):
+        """Start the listener once per process; `client_factory()` returns a RabbitMQClient bound to the status exchange."""
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+
+        def on_message(ch, method, properties, body):
+            try:
+                self.dispatch(json.loads(body))
+            except Exception as e:
+                print(f"[!] Bad status event: {e}")
+            finally:
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+
+        def listen():
+            while True:
+                try:
+                    client_factory().consume(on_message, prefetch_count=100)
+                except Exception as e:
+                    print(f"[!] Status listener stopped: {e}; retrying in 2 seconds")
+                    time.sleep(2)
+
+        threading.Thread(target=listen, name="status-events", daemon=True).start()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "users": len(self.subscribers),
+                "connections": sum(len(listeners) for listeners in self.subscribers.values()),
+                "delivered": self.delivered,
+                "dropped": self.dropped,
+            }
@@ -170,6 +170,168 @@ class TestPlaceOrder:
         assert r.status_code == 500
 
 
+class TestCheckout:
+
+    ITEMS = [
+        {"book_id": 1, "price": 9.99, "quantity": 2, "title": "A", "authors": "X", "url": "/a"},
+        {"book_id": 2, "price": 5.00, "quantity": 1, "title": "B", "authors": "Y", "url": "/b"},
+    ]
+
+    def checkout(self, monkeypatch, post, payload):
+        monkeypatch.setattr(app_module.requests, "post", post, raising=True)
+        rmq = DummyRMQ()
+        monkeypatch.setattr(app_module, "RabbitMQClient", lambda: rmq, raising=True)
+        with flask_app.test_request_context(
+            "/checkout", method="POST",
+            data=json.dumps(payload), content_type="application/json"
+        ):
+            request.user = {"sub": "7", "name": "carol"}
+            resp, status = app_module.checkout.__wrapped__()
+        return resp, status, rmq
+
+    @pytest.mark.integration
+    def test_success_creates_all_lines_in_one_call_and_publishes_once(self, monkeypatch):
+        seen = []
+        def fake_post(url, json=None):
+            seen.append((url, json))
+            orders = [{"order_id": 50 + i, **item, "user_id": 7, "status": "pending",
+                       "checkout_id": json["checkout_id"]} for i, item in enumerate(json["items"])]
+            return DummyResp(201, {"code": 201, "data": {"checkout_id": json["checkout_id"], "orders": orders}})
+
+        resp, status, rmq = self.checkout(monkeypatch, fake_post, {"items": self.ITEMS})
+
+        assert status == 201
+        data = resp.get_json()["data"]
+        assert [o["order_id"] for o in data["orders"]] == [50, 51]
+        assert len(seen) == 1
+        url, sent = seen[0]
+        assert url == f"{app_module.ORDERS_URL}/batch"
+        assert sent["user_id"] == 7 and sent["status"] == "pending" and sent["items"] == self.ITEMS
+        assert len(sent["checkout_id"]) == 36
+        assert rmq.published == [{"checkout_id": sent["checkout_id"], "user_id": 7, "orders": data["orders"]}]
+
+    @pytest.mark.integration
+    def test_retry_republishes_only_while_lines_are_pending(self, monkeypatch):
+        # The first attempt stored the lines but may have failed before publishing, so a pending replay publishes
+        pending = {"code": 200, "data": {"checkout_id": "c-9", "orders": [{"order_id": 1, "status": "pending"}]}}
+        resp, status, rmq = self.checkout(monkeypatch, lambda url, json=None: DummyResp(200, pending),
+                                          {"checkout_id": "c-9", "items": self.ITEMS})
+        assert status == 200 and resp.get_json() == pending
+        assert rmq.published == [{"checkout_id": "c-9", "user_id": 7, "orders": pending["data"]["orders"]}]
+
+        settled = {"code": 200, "data": {"checkout_id": "c-9", "orders": [{"order_id": 1, "status": "completed"}]}}
+        resp, status, rmq = self.checkout(monkeypatch, lambda url, json=None: DummyResp(200, settled),
+                                          {"checkout_id": "c-9", "items": self.ITEMS})
+        assert status == 200 and resp.get_json() == settled
+        assert rmq.published == []
+
+    @pytest.mark.integration
+    def test_rejection_is_forwarded_without_publishing(self, monkeypatch):
+        for code in (400, 409):
+            rejected = {"code": code, "message": "x"}
+            resp, status, rmq = self.checkout(monkeypatch, lambda url, json=None: DummyResp(code, rejected), {"items": []})
+            assert status == code and resp.get_json() == rejected
+            assert rmq.published == []
+
+    @pytest.mark.integration
+    def test_exception_returns_500_and_no_publish(self, monkeypatch):
+        def boom(*_, **__):
+            raise RuntimeError("network down")
+        resp, status, rmq = self.checkout(monkeypatch, boom, {"items": self.ITEMS})
+        assert status == 500
+        assert "network down" in resp.get_json()["message"]
+        assert rmq.published == []
+
+    @pytest.mark.integration
+    def test_requires_auth(self, client):
+        r = client.post("/checkout", json={"items": self.ITEMS})
+        assert r.status_code == 401
+
+
+class TestOrderStream:
+
+    @pytest.fixture()
+    def events(self, monkeypatch):
+        """A fresh in-process hub whose RabbitMQ listener never starts."""
+        from place_order.events import StatusEvents
+        hub = StatusEvents(queue_size=2)
+        hub.started = True
+        monkeypatch.setattr(app_module, "status_events", hub, raising=True)
+        return hub
+
+    @pytest.fixture()
+    def token(self, monkeypatch):
+        import jwt
+        import shared.auth as auth
+        monkeypatch.setattr(auth, "SECRET_KEY", "test-secret", raising=True)
+        return jwt.encode({"sub": "42", "type": "access"}, "test-secret", algorithm="HS256")
+
+    @pytest.mark.unit
+    def test_events_reach_only_the_owner_and_full_queues_drop(self, events):
+        mine, other = events.subscribe(42), events.subscribe(7)
+        events.dispatch({"user_id": 42, "checkout_id": "c-1",
+                         "orders": [{"order_id": 1, "status": "completed"}, {"order_id": 2, "status": "completed"}]})
+        events.dispatch({"user_id": 42, "checkout_id": None, "orders": [{"order_id": 3, "status": "failed"}]})
+
+        assert [mine.get_nowait()["order_id"] for _ in range(2)] == [1, 2]
+        assert mine.empty() and other.empty()
+        assert events.stats() == {"users": 2, "connections": 2, "delivered": 2, "dropped": 1}
+
+        events.unsubscribe(42, mine)
+        events.unsubscribe(7, other)
+        assert events.stats()["connections"] == 0 and events.subscribers == {}
+
+    @pytest.mark.integration
+    def test_stream_sends_settled_orders_then_pushed_changes(self, client, events, token, monkeypatch):
+        orders = {
+            11: {"order_id": 11, "user_id": 42, "status": "completed", "checkout_id": None},
+            12: {"order_id": 12, "user_id": 42, "status": "pending", "checkout_id": None},
+            13: {"order_id": 13, "user_id": 99, "status": "failed", "checkout_id": None},  # someone else's
+        }
+        monkeypatch.setattr(app_module.requests, "get",
+                            lambda url: DummyResp(200, {"data": orders[int(url.rsplit("/", 1)[-1])]}), raising=True)
+
+        r = client.get(f"/orders/stream?order_id=11&order_id=12&order_id=13&access_token={token}", buffered=False)
+        assert r.status_code == 200
+        assert r.mimetype == "text/event-stream"
+        chunks = iter(r.response)
+        assert next(chunks) == b"retry: 3000\n\n"
+        assert next(chunks) == b'event: status\ndata: {"order_id": 11, "status": "completed", "checkout_id": null}\n\n'
+
+        # Pushed as soon as the worker announces it; nothing is polled
+        assert events.stats()["connections"] == 1
+        events.dispatch({"user_id": 42, "checkout_id": None, "orders": [{"order_id": 12, "status": "completed"}]})
+        assert json.loads(next(chunks).decode().split("data: ", 1)[1]) == {"order_id": 12, "status": "completed", "checkout_id": None}
+
+        # Idle streams get keep-alive comments
+        monkeypatch.setattr(app_module, "STREAM_HEARTBEAT", 0.01)
+        events.dispatch({"user_id": 42, "checkout_id": None, "orders": [{"order_id": 14, "status": "completed"}]})
+        next(chunks)
+        assert next(chunks) == b": keep-alive\n\n"
+
+        r.close()
+        assert events.stats()["connections"] == 0
+
+    @pytest.mark.integration
+    def test_stream_requires_a_valid_token(self, client, events):
+        assert client.get("/orders/stream").status_code == 401
+        r = client.get("/orders/stream?access_token=not-a-jwt")
+        assert r.status_code == 401
+        assert r.get_json()["message"] == "Invalid token"
+        assert events.stats()["connections"] == 0
+
+    @pytest.mark.integration
+    def test_stream_catch_up_failure_returns_500_and_unsubscribes(self, client, events, token, monkeypatch):
+        def boom(*_, **__):
+            raise RuntimeError("orders down")
+        monkeypatch.setattr(app_module.requests, "get", boom, raising=True)
+
+        r = client.get(f"/orders/stream?order_id=1&access_token={token}")
+        assert r.status_code == 500
+        assert "orders down" in r.get_json()["message"]
+        assert events.stats()["connections"] == 0
+
+
 class TestCheckOrder:
 
     @pytest.mark.integration
@@ -48,4 +48,28 @@ def jwt_required(f):
         request.user = result
         return f(*args, **kwargs)
 
-    return decorated
\ No newline at end of file
+    return decorated
+
+def jwt_required_query(f):
+    """
+    Like jwt_required, but also accepts the token as ?access_token=. EventSource
+    can't send an Authorization header, so server-sent event streams use this.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        token = request.args.get("access_token")
+        if not token:
+            return jwt_required(f)(*args, **kwargs)
+
+        result = verify_jwt(token)
+        if isinstance(result, dict) and result.get("error"):
+            return jsonify(
+                {
+                    "code": 401, "message": result["error"]
+                }
+            ), 401
+
+        request.user = result
+        return f(*args, **kwargs)
+
+    return decorated
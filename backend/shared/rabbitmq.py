@@ -20,7 +20,9 @@ class RabbitMQClient:
         self.credentials = pika.PlainCredentials(username, password)
         self.exchange = exchange
         self.exchange_type = exchange_type
+        # None: publish only. "": a private, broker-named queue that is deleted with the connection
         self.queue = queue
+        self.queue_name = queue
         self.routing_key = routing_key
 
         self.connection = None
@@ -59,8 +61,10 @@ class RabbitMQClient:
 
                 # Declare exchange and queue
                 self.channel.exchange_declare(exchange=self.exchange, exchange_type=self.exchange_type, durable=True)
-                self.channel.queue_declare(queue=self.queue, durable=True)
-                self.channel.queue_bind(exchange=self.exchange, queue=self.queue, routing_key=self.routing_key)
+                if self.queue is not None:
+                    declared = self.channel.queue_declare(queue=self.queue, durable=bool(self.queue), exclusive=not self.queue)
+                    self.queue_name = declared.method.queue
+                    self.channel.queue_bind(exchange=self.exchange, queue=self.queue_name, routing_key=self.routing_key)
 
                 print("[✓] RabbitMQ setup complete.")
                 return  # Success
@@ -84,12 +88,12 @@ class RabbitMQClient:
         )
         print(f"[→] Sent: {payload}")
 
-    def consume(self, callback):
+    def consume(self, callback, prefetch_count=1):
         while True:
             try:
                 self.check_setup()
-                self.channel.basic_qos(prefetch_count=1)
-                self.channel.basic_consume(queue=self.queue, on_message_callback=callback)
+                self.channel.basic_qos(prefetch_count=prefetch_count)
+                self.channel.basic_consume(queue=self.queue_name, on_message_callback=callback)
                 print(" [*] Consumer waiting for messages...")
                 self.channel.start_consuming()
             except pika.exceptions.AMQPError as e:
@@ -12,6 +12,9 @@ class User(db.Model):
     password_hash = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
+    # Login and register look users up by email; see database/migrations/002_hot_query_indexes.sql
+    __table_args__ = (db.Index("ux_users_email", "email", unique=True),)
+
     def __init__(self, username, email, password_hash):
         self.username = username
         self.email = email
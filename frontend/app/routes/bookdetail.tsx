@@ -20,7 +20,7 @@ export default function BookDetail() {
   const { id } = useParams()
   const [book, setBook] = useState<any>(null)
   const [loading, setLoading] = useState(true)
-  const { user, fetchWithAuth } = useAuth()
+  const { user, token, fetchWithAuth } = useAuth()
   const navigate = useNavigate()
   const [openConfirm, setOpenConfirm] = useState(false)
   const [openPlaced, setOpenPlaced] = useState(false)
@@ -81,33 +81,56 @@ export default function BookDetail() {
 
   useEffect(() => {
     if (!orderId) return
-    const interval = setInterval(async () => {
-      try {
-        const res = await fetchWithAuth(`${SERVICE_URLS.PLACE_ORDER}/checkorder/${orderId}`)
-        const data = await res.json()
-        
-        if (res.ok && data.data.status === "completed") {
-          fetchBook()
-          setOpenPlaced(false)
-          clearInterval(interval)
-          setOrderId(null)
-          setHasPending(false)
-          setOrderCompleted(true)
-        } else if (data.data.status === "failed") {
-          fetchBook()
-          setOpenPlaced(false)
-          clearInterval(interval)
-          setOrderId(null)
-          setHasPending(false)
-          setValidationMessage("Your order could not be processed due to insufficient stock or a system error.")
-          setOpenValidationError(true)
-        }
-      } catch (err) {
-        console.error("Polling error:", err)
+    let interval: ReturnType<typeof setInterval> | undefined
+    let settled = false
+
+    const settle = (status: string) => {
+      if (settled || (status !== "completed" && status !== "failed")) return
+      settled = true
+      stream.close()
+      clearInterval(interval)
+      fetchBook()
+      setOpenPlaced(false)
+      setOrderId(null)
+      setHasPending(false)
+      if (status === "completed") {
+        setOrderCompleted(true)
+      } else {
+        setValidationMessage("Your order could not be processed due to insufficient stock or a system error.")
+        setOpenValidationError(true)
       }
-    }, 2000)
+    }
+
+    // Falls back to polling if the stream can't be kept open
+    const poll = () => {
+      interval = setInterval(async () => {
+        try {
+          const res = await fetchWithAuth(`${SERVICE_URLS.PLACE_ORDER}/checkorder/${orderId}`)
+          const data = await res.json()
+          if (res.ok) settle(data.data.status)
+        } catch (err) {
+          console.error("Polling error:", err)
+        }
+      }, 2000)
+    }
 
-    return () => clearInterval(interval)
+    // EventSource can't send headers, so the access token goes in the query string
+    const stream = new EventSource(
+      `${SERVICE_URLS.PLACE_ORDER}/orders/stream?order_id=${orderId}&access_token=${encodeURIComponent(token ?? "")}`
+    )
+    stream.addEventListener("status", (e) => {
+      const event = JSON.parse((e as MessageEvent).data)
+      if (String(event.order_id) === String(orderId)) settle(event.status)
+    })
+    stream.onerror = () => {
+      stream.close()
+      if (!settled && !interval) poll()
+    }
+
+    return () => {
+      stream.close()
+      clearInterval(interval)
+    }
   }, [orderId])
 
   useEffect(() => {